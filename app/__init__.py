@@ -34,8 +34,9 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = 'app/static/uploads'
     
-    # Configuration uploads - Pas de limite de taille
-    app.config['MAX_CONTENT_LENGTH'] = None  # Aucune limite de taille
+    # Configuration uploads - Limite de taille (requêtes plus grandes refusées en 413 avant lecture)
+    # Les fichiers reçus sont écrits dans un fichier temporaire au-delà de 500 Ko, jamais gardés en mémoire
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_SIZE_MB', 512)) * 1024 * 1024
     app.config['UPLOAD_EXTENSIONS'] = ['.pdf', '.png', '.jpg', '.jpeg', '.gif']
     
     # Configuration PostgreSQL avancée
@@ -45,6 +46,55 @@ def create_app():
         'pool_pre_ping': True
     }
     
+    # Durée de vie (secondes) du cache mémoire des prix crypto
+    app.config['CRYPTO_PRICE_CACHE_TTL'] = int(os.environ.get('CRYPTO_PRICE_CACHE_TTL', 60))
+    
+    # Cache LRU des contextes de l'assistant IA (nombre d'entrées et durée de vie en secondes)
+    app.config['RAG_QUERY_CACHE_SIZE'] = int(os.environ.get('RAG_QUERY_CACHE_SIZE', 256))
+    app.config['RAG_QUERY_CACHE_TTL'] = int(os.environ.get('RAG_QUERY_CACHE_TTL', 3600))
+    
+    # Durée de vie (secondes) du cache des KPIs du tableau de bord administrateur
+    app.config['ADMIN_STATS_CACHE_TTL'] = int(os.environ.get('ADMIN_STATS_CACHE_TTL', 60))
+    
+    # API chat-completions de l'assistant (surchargeable pour pointer vers un serveur de test local)
+    app.config['OPENAI_API_URL'] = os.environ.get('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
+    
+    # Recalcul patrimonial en arrière-plan (admin calculate-all)
+    app.config['PATRIMOINE_RECALC_WORKERS'] = int(os.environ.get('PATRIMOINE_RECALC_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['PATRIMOINE_RECALC_EXECUTOR'] = os.environ.get('PATRIMOINE_RECALC_EXECUTOR', 'process')  # 'process' ou 'thread'
+    
+    # Cache disque des PDF stockés sur Spaces (partagé par les workers) et cache navigateur des PDF
+    app.config['SPACES_CACHE_DIR'] = os.environ.get('SPACES_CACHE_DIR', os.path.join(app.root_path, 'cache', 'spaces'))
+    app.config['SPACES_CACHE_MAX_BYTES'] = int(os.environ.get('SPACES_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+    app.config['SPACES_CACHE_REVALIDATE_SECONDS'] = int(os.environ.get('SPACES_CACHE_REVALIDATE_SECONDS', 300))
+    app.config['PDF_CACHE_MAX_AGE'] = int(os.environ.get('PDF_CACHE_MAX_AGE', 3600))
+    
+    # Envoi des fichiers locaux : 'wsgi' (sendfile via gunicorn), 'x-sendfile' (Apache) ou 'x-accel' (nginx)
+    # X_ACCEL_MAPPINGS : "dossier=location interne;..." (locations nginx déclarées 'internal')
+    app.config['FILE_SERVING_BACKEND'] = os.environ.get('FILE_SERVING_BACKEND', 'wsgi').lower()
+    app.config['X_ACCEL_MAPPINGS'] = os.environ.get('X_ACCEL_MAPPINGS', ';'.join([
+        f"{os.path.join(app.root_path, 'static', 'uploads')}=/_protected/uploads",
+        f"{app.config['SPACES_CACHE_DIR']}=/_protected/spaces"
+    ]))
+    
+    # Upload multipart vers Spaces : taille des parties et nombre de parties envoyées en parallèle
+    app.config['SPACES_MULTIPART_CHUNK_SIZE'] = int(os.environ.get('SPACES_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+    app.config['SPACES_MULTIPART_CONCURRENCY'] = int(os.environ.get('SPACES_MULTIPART_CONCURRENCY', 4))
+    
+    # Index local des objets Spaces : préfixes indexés d'office et délai avant réconciliation avec le Space
+    app.config['SPACES_INDEX_PREFIXES'] = [
+        prefix.strip() for prefix in os.environ.get('SPACES_INDEX_PREFIXES', 'apprentissages/').split(',') if prefix.strip()
+    ]
+    app.config['SPACES_INDEX_TTL'] = int(os.environ.get('SPACES_INDEX_TTL', 900))
+    
+    # Miniatures carrées des images de formation générées à l'upload (côtés en pixels, qualité WebP/JPEG)
+    app.config['IMAGE_VARIANT_SIZES'] = os.environ.get('IMAGE_VARIANT_SIZES', '160,320')
+    app.config['IMAGE_VARIANT_QUALITY'] = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+    
+    # Lecture directe des PDF depuis Spaces via URL pré-signée (nécessite une règle CORS sur le Space)
+    app.config['SPACES_PDF_PRESIGNED_URLS'] = os.environ.get('SPACES_PDF_PRESIGNED_URLS', 'false').lower() == 'true'
+    app.config['SPACES_PDF_PRESIGNED_TTL'] = int(os.environ.get('SPACES_PDF_PRESIGNED_TTL', 300))
+    
     # Configuration anti-cache pour le développement - Templates ET fichiers statiques
     app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
     app.config['TEMPLATES_AUTO_RELOAD'] = True
@@ -72,8 +122,11 @@ def create_app():
         app.config['ENV'] = 'development'
     
     # Headers anti-cache pour le développement - Templates ET fichiers statiques
+    # (sauf réponses marquées 'private' qui gèrent leur propre cache, ex: PDF des formations)
     @app.after_request
     def after_request(response):
+        if response.cache_control.private:
+            return response
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
@@ -95,7 +148,11 @@ def create_app():
             from app.services.digitalocean_storage import init_spaces_service
             init_spaces_service(
                 access_key=access_key,
-                secret_key=secret_key
+                secret_key=secret_key,
+                multipart_chunksize=app.config['SPACES_MULTIPART_CHUNK_SIZE'],
+                max_concurrency=app.config['SPACES_MULTIPART_CONCURRENCY'],
+                index_ttl=app.config['SPACES_INDEX_TTL'],
+                index_prefixes=app.config['SPACES_INDEX_PREFIXES']
             )
             print("✅ DigitalOcean Spaces initialisé avec succès")
         else:
@@ -111,9 +168,13 @@ def create_app():
     from app.models.credit import Credit
     from app.models.apprentissage import Apprentissage
     from app.models.crypto_price import CryptoPrice
+    from app.models.crypto_price_history import CryptoPriceHistory
     from app.models.investment_action import InvestmentAction
     from app.models.compte_rendu import CompteRendu
     from app.models.password_reset_token import PasswordResetToken
+    from app.models.recalculation_job import RecalculationJob
+    from app.models.email_outbox import OutboxEmail
+    from app.models.patrimoine_snapshot import PatrimoineSnapshot
     
     # Configuration du user_loader pour Flask-Login
     @login_manager.user_loader
@@ -141,6 +202,14 @@ def create_app():
     app.register_blueprint(onboarding_bp)
     app.register_blueprint(stripe_bp)
     
+    # File d'envoi des emails : dispatcher en arrière-plan démarré dans chaque worker web
+    from app.services.email_outbox_service import EmailOutboxService
+    EmailOutboxService.init_app(app)
+    
+    # Envoi des fichiers locaux (délégation au serveur frontal selon FILE_SERVING_BACKEND)
+    from app.services.file_serving import FileServingBackend
+    FileServingBackend.init_app(app)
+    
     # API crypto intégrée dans les routes admin
     
     # Route racine redirige vers le site vitrine
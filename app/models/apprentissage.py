@@ -28,6 +28,7 @@ class Apprentissage(db.Model):
     
     image = db.Column(db.String(255), nullable=True)  # chemin local OU clé DigitalOcean
     image_url = db.Column(db.String(500), nullable=True)  # URL publique DigitalOcean
+    image_variants = db.Column(db.JSON, nullable=True)  # Miniatures {taille: {'webp': url, 'jpeg': url}}
     
     # Métadonnées pour DigitalOcean Spaces
     storage_type = db.Column(db.String(20), default='local')  # 'local' ou 'digitalocean'
@@ -58,6 +59,19 @@ class Apprentissage(db.Model):
             return f'/static/uploads/apprentissages/{self.image}'
         return None
     
+    def get_image_variant_url(self, size=160, fmt='jpeg'):
+        """Retourne l'URL de la plus petite miniature d'au moins `size` px (image d'origine à défaut)"""
+        sizes = sorted(int(s) for s, urls in (self.image_variants or {}).items() if fmt in urls)
+        if not sizes:
+            return self.get_image_url()
+        best = next((s for s in sizes if s >= size), sizes[-1])
+        return self.image_variants[str(best)][fmt]
+    
+    def get_image_srcset(self, fmt='jpeg'):
+        """Retourne l'attribut srcset des miniatures d'un format ('' si aucune)"""
+        sizes = sorted(int(s) for s, urls in (self.image_variants or {}).items() if fmt in urls)
+        return ', '.join(f"{self.image_variants[str(s)][fmt]} {s}w" for s in sizes)
+    
     def has_pdf(self):
         """Vérifie si la formation a un PDF"""
         return bool(self.fichier_pdf_url or self.fichier_pdf)
@@ -84,6 +98,7 @@ class Apprentissage(db.Model):
             'fichier_pdf_original': self.fichier_pdf_original,
             'image': self.image,
             'image_url': self.get_image_url(),
+            'image_variants': self.image_variants,
             'storage_type': self.storage_type,
             'date_creation': self.date_creation.isoformat() if self.date_creation else None,
             'date_modification': self.date_modification.isoformat() if self.date_modification else None,
@@ -0,0 +1,72 @@
+"""
+Modèle de l'historique des prix crypto.
+Une ligne par refresh (append-only) : les prix EUR de tous les symboles y sont stockés
+dans un tableau binaire compact, dans l'ordre de la liste de symboles de la ligne.
+"""
+
+from app import db
+from datetime import datetime
+from typing import Dict, List
+import numpy as np
+
+
+class CryptoPriceHistory(db.Model):
+    """
+    Photographie des prix crypto enregistrée à chaque refresh Binance.
+    Contrairement à CryptoPrice (dernier prix par symbole), les lignes ne sont jamais modifiées.
+    """
+    
+    __tablename__ = 'crypto_price_history'
+    
+    # Prix EUR packés en float64 little-endian
+    PRICE_DTYPE = np.dtype('<f8')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recorded_at = db.Column(db.DateTime, nullable=False, index=True, default=datetime.utcnow)  # Date du snapshot
+    usd_to_eur = db.Column(db.Float, nullable=False)  # Taux USD->EUR du snapshot
+    symbols = db.Column(db.Text, nullable=False)  # Symboles séparés par des virgules, ordre des prix
+    prices_eur = db.Column(db.LargeBinary, nullable=False)  # Tableau float64 des prix EUR
+    
+    def __repr__(self):
+        return f'<CryptoPriceHistory {self.recorded_at.isoformat() if self.recorded_at else None}: {self.symbol_count} prix>'
+    
+    @classmethod
+    def from_prices(cls, prices: Dict[str, float], usd_to_eur: float, recorded_at: datetime) -> 'CryptoPriceHistory':
+        """
+        Construit une ligne d'historique à partir de {symbol: price_eur}.
+        
+        Args:
+            prices: Prix EUR par symbole
+            usd_to_eur: Taux de change du snapshot
+            recorded_at: Date du snapshot
+        """
+        symbols = sorted(prices)
+        packed = np.array([prices[symbol] for symbol in symbols], dtype=cls.PRICE_DTYPE)
+        return cls(
+            recorded_at=recorded_at,
+            usd_to_eur=usd_to_eur,
+            symbols=','.join(symbols),
+            prices_eur=packed.tobytes()
+        )
+    
+    @property
+    def symbol_list(self) -> List[str]:
+        """Symboles de la ligne, dans l'ordre du tableau de prix."""
+        return self.symbols.split(',') if self.symbols else []
+    
+    @property
+    def symbol_count(self) -> int:
+        """Nombre de prix enregistrés."""
+        return len(self.prices_eur or b'') // self.PRICE_DTYPE.itemsize
+    
+    def price_array(self) -> np.ndarray:
+        """Prix EUR sous forme de tableau numpy (lecture seule, sans copie)."""
+        return np.frombuffer(self.prices_eur, dtype=self.PRICE_DTYPE)
+    
+    def to_dict(self):
+        """Convertit l'objet en dictionnaire."""
+        return {
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None,
+            'usd_to_eur': self.usd_to_eur,
+            'prices': dict(zip(self.symbol_list, self.price_array().tolist()))
+        }
@@ -0,0 +1,60 @@
+"""
+Modèle de la file d'envoi des emails (outbox).
+Les emails sont enregistrés en base dans la requête HTTP puis envoyés par le dispatcher
+en arrière-plan : aucun email n'est perdu si MailerSend est lent ou indisponible.
+"""
+
+from app import db
+from datetime import datetime
+
+
+class OutboxEmail(db.Model):
+    """
+    Email en attente d'envoi, en cours d'envoi, accepté dans un lot bulk (en attente de
+    confirmation MailerSend), envoyé ou définitivement en échec.
+    """
+    
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_ACCEPTED = 'accepted'  # Lot /bulk-email accepté (202), envoi pas encore confirmé
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False, index=True)
+    to_name = db.Column(db.String(255), nullable=True)
+    from_email = db.Column(db.String(255), nullable=False)
+    from_name = db.Column(db.String(255), nullable=True)
+    subject = db.Column(db.String(500), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)
+    text_content = db.Column(db.Text, nullable=True)
+    
+    # Suivi de l'envoi
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    provider_id = db.Column(db.String(100), nullable=True)  # X-Message-Id, ou '<bulk_email_id>#<index dans le lot>' MailerSend
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)  # Début de l'envoi (statut 'sending')
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status} {self.to_email}>'
+    
+    def to_mailersend_payload(self):
+        """Corps JSON attendu par MailerSend (/email ou élément de /bulk-email)."""
+        payload = {
+            'from': {'email': self.from_email, 'name': self.from_name},
+            'to': [{'email': self.to_email, 'name': self.to_name}],
+            'subject': self.subject,
+            'html': self.html_content
+        }
+        if self.text_content:
+            payload['text'] = self.text_content
+        return payload
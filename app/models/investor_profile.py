@@ -187,6 +187,7 @@ class InvestorProfile(db.Model):
     calculated_total_actifs = db.Column(db.Float, nullable=True, default=0.0)
     calculated_patrimoine_total_net = db.Column(db.Float, nullable=True, default=0.0)
     last_calculation_date = db.Column(db.DateTime, nullable=True)
+    calculation_hashes = db.Column(JSONB, nullable=True)  # Empreintes des entrées par catégorie {catégorie: [hash, total]}
     
     # Relations
     credits = db.relationship('Credit', backref='investor_profile', cascade='all, delete-orphan')
@@ -0,0 +1,71 @@
+"""
+Modèle de l'historique du patrimoine des clients.
+Une ligne par profil et par jour de changement : les totaux calculated_* du profil y sont
+stockés dans un tableau binaire de largeur fixe (un float64 par colonne de TOTAL_COLUMNS).
+"""
+
+from app import db
+from datetime import datetime
+from typing import Dict, Sequence
+import numpy as np
+
+
+class PatrimoineSnapshot(db.Model):
+    """
+    Totaux patrimoniaux d'un profil à une date.
+    Un jour sans changement n'a pas de ligne : la valeur est celle du dernier snapshot antérieur.
+    """
+    
+    __tablename__ = 'patrimoine_snapshots'
+    __table_args__ = (
+        # Sert aussi d'index pour les requêtes par plage de dates d'un profil
+        db.UniqueConstraint('investor_profile_id', 'snapshot_date', name='uq_patrimoine_snapshot_profile_date'),
+    )
+    
+    # Ordre des totaux dans le tableau (ne jamais réordonner : ajouter en fin de tuple)
+    TOTAL_COLUMNS = (
+        'calculated_total_liquidites',
+        'calculated_total_placements',
+        'calculated_total_immobilier_net',
+        'calculated_total_cryptomonnaies',
+        'calculated_total_autres_biens',
+        'calculated_total_credits_consommation',
+        'calculated_total_actifs',
+        'calculated_patrimoine_total_net'
+    )
+    TOTAL_DTYPE = np.dtype('<f8')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    investor_profile_id = db.Column(db.Integer, db.ForeignKey('investor_profiles.id', ondelete='CASCADE'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)  # Jour du calcul (UTC)
+    totals = db.Column(db.LargeBinary, nullable=False)  # float64[len(TOTAL_COLUMNS)]
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PatrimoineSnapshot profil {self.investor_profile_id} @ {self.snapshot_date}>'
+    
+    @classmethod
+    def pack(cls, values: Sequence[float]) -> bytes:
+        """Totaux (dans l'ordre de TOTAL_COLUMNS) -> tableau binaire."""
+        return np.array([value or 0.0 for value in values], dtype=cls.TOTAL_DTYPE).tobytes()
+    
+    @classmethod
+    def pack_profile(cls, profile) -> bytes:
+        """Tableau binaire des totaux calculated_* actuels d'un profil."""
+        return cls.pack([getattr(profile, column) for column in cls.TOTAL_COLUMNS])
+    
+    @classmethod
+    def pack_mapping(cls, mapping: Dict) -> bytes:
+        """Tableau binaire des totaux d'une ligne {colonne: valeur} (bulk_update_mappings)."""
+        return cls.pack([mapping.get(column) for column in cls.TOTAL_COLUMNS])
+    
+    def total_array(self) -> np.ndarray:
+        """Totaux sous forme de tableau numpy (lecture seule, sans copie)."""
+        return np.frombuffer(self.totals, dtype=self.TOTAL_DTYPE)
+    
+    def to_dict(self):
+        """Convertit l'objet en dictionnaire."""
+        return {
+            'date': self.snapshot_date.isoformat() if self.snapshot_date else None,
+            **{column: value for column, value in zip(self.TOTAL_COLUMNS, self.total_array().tolist())}
+        }
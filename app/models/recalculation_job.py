@@ -0,0 +1,77 @@
+"""
+Modèle pour suivre les jobs de recalcul patrimonial en arrière-plan.
+Stocké en base pour que tous les workers gunicorn puissent répondre au polling de l'admin.
+"""
+
+from app import db
+from datetime import datetime
+import uuid
+
+
+class RecalculationJob(db.Model):
+    """
+    Job de recalcul des totaux patrimoniaux de toute la base clients.
+    """
+    
+    __tablename__ = 'recalculation_jobs'
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    executor = db.Column(db.String(20), nullable=False, default='thread')  # 'thread' ou 'process'
+    workers = db.Column(db.Integer, nullable=False, default=1)
+    total_profiles = db.Column(db.Integer, nullable=False, default=0)
+    processed_profiles = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<RecalculationJob {self.id} {self.status} {self.processed_profiles}/{self.total_profiles}>'
+    
+    @property
+    def is_finished(self):
+        """True si le job est terminé (succès ou échec)."""
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+    
+    @property
+    def progress_percent(self):
+        """Avancement en pourcentage (0-100)."""
+        if not self.total_profiles:
+            return 100.0 if self.is_finished else 0.0
+        return round(min(self.processed_profiles, self.total_profiles) * 100.0 / self.total_profiles, 1)
+    
+    @property
+    def profiles_per_second(self):
+        """Débit moyen du job en profils par seconde."""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or datetime.utcnow()
+        duration = (end - self.started_at).total_seconds()
+        return round(self.processed_profiles / duration, 1) if duration > 0 else 0.0
+    
+    def to_dict(self):
+        """Convertit le job en dictionnaire pour l'API de polling."""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'executor': self.executor,
+            'workers': self.workers,
+            'total_profiles': self.total_profiles,
+            'processed_profiles': self.processed_profiles,
+            'error_count': self.error_count,
+            'error_message': self.error_message,
+            'progress_percent': self.progress_percent,
+            'profiles_per_second': self.profiles_per_second,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'is_finished': self.is_finished
+        }
@@ -2,7 +2,7 @@
 Routes pour l'interface administrateur de la plateforme.
 """
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from app import db
 from app.models.user import User
@@ -23,6 +23,7 @@ from app.services.credit_calculation import CreditCalculationService
 from app.services.patrimoine_calculation import PatrimoineCalculationService
 from app.services.user_deletion_service import UserDeletionService
 from app.services.digitalocean_storage import get_spaces_service
+from app.services.image_variants import ImageVariantService
 
 platform_admin_bp = Blueprint('platform_admin', __name__, url_prefix='/plateforme/admin')
 
@@ -37,110 +38,22 @@ def dashboard():
         flash('Accès non autorisé.', 'error')
         return redirect(url_for('site_pages.index'))
     
-    from datetime import datetime, timedelta
-    from sqlalchemy import func
+    from app.services.admin_dashboard_stats import AdminDashboardStatsService
     
-    # === STATISTIQUES DE BASE ===
-    total_users = User.query.filter_by(is_admin=False, is_prospect=False).count()
-    total_prospects = User.query.filter_by(is_prospect=True).count()
-    active_subscriptions = Subscription.query.filter_by(status='active').count()
-    completed_profiles = InvestorProfile.query.count()
+    # === KPIs (une requête d'agrégats SQL, cache mémoire de courte durée) ===
+    stats = dict(AdminDashboardStatsService.get_stats())
     
-    # === MRR SIMPLIFIÉ ===
-    try:
-        mrr_query = db.session.query(func.sum(Subscription.price)).filter(
-            Subscription.status == 'active'
-        ).scalar()
-        real_mrr = float(mrr_query) if mrr_query else 0.0
-        
-        initia_subs = Subscription.query.filter_by(status='active', tier='initia').count()
-        optima_subs = Subscription.query.filter_by(status='active', tier='optima').count()
-    except Exception as e:
-        print(f"Erreur MRR: {e}")
-        real_mrr = active_subscriptions * 25.0  # Fallback
-        initia_subs = active_subscriptions
-        optima_subs = 0
-    
-    # === CROISSANCE CE MOIS ===
-    try:
-        debut_mois = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        nouveaux_ce_mois = User.query.filter(
-            User.is_admin == False,
-            User.is_prospect == False,
-            User.date_created >= debut_mois
-        ).count()
-
-        # Nom du mois actuel
-        mois_actuel = datetime.now().strftime('%B %Y')
-        mois_fr = {
-            'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
-            'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
-            'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
-            'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
-        }
-        for en, fr in mois_fr.items():
-            mois_actuel = mois_actuel.replace(en, fr)
-    except Exception as e:
-        print(f"Erreur croissance: {e}")
-        nouveaux_ce_mois = 0
-        mois_actuel = "Janvier 2026"
-    
-    # === PATRIMOINE MOYEN ===
-    try:
-        avg_query = db.session.query(func.avg(InvestorProfile.calculated_patrimoine_total_net)).filter(
-            InvestorProfile.calculated_patrimoine_total_net.isnot(None),
-            InvestorProfile.calculated_patrimoine_total_net > 0
-        ).scalar()
-        avg_patrimoine = float(avg_query) if avg_query else 0.0
-    except Exception as e:
-        print(f"Erreur patrimoine: {e}")
-        avg_patrimoine = 0.0
-
-    # === TOTAL ENCOURS CONSEILLÉS (Placements + Crypto) ===
-    try:
-        # Somme des placements financiers + crypto de tous les clients
-        total_encours = 0.0
-
-        # Récupérer les profils investisseurs des vrais clients uniquement
-        all_profiles = db.session.query(InvestorProfile).join(User).filter(
-            User.is_admin == False,
-            User.is_prospect == False
-        ).all()
-
-        print(f"🔍 Calcul encours conseillés pour {len(all_profiles)} clients")
-
-        for profile in all_profiles:
-            # Utiliser les colonnes calculées déjà sauvegardées en base
-            placements = float(profile.calculated_total_placements or 0)
-            crypto = float(profile.calculated_total_cryptomonnaies or 0)
-
-            profile_encours = placements + crypto
-            total_encours += profile_encours
-
-            if profile_encours > 0:
-                print(f"  - User {profile.user_id}: Placements={placements:,.0f}€ + Crypto={crypto:,.0f}€ = {profile_encours:,.0f}€")
-
-        print(f"✅ Total encours conseillés: {total_encours:,.0f}€")
-
-    except Exception as e:
-        print(f"❌ Erreur calcul encours: {e}")
-        import traceback
-        traceback.print_exc()
-        total_encours = 0.0
-
-    stats = {
-        'total_users': total_users,
-        'total_prospects': total_prospects,
-        'active_subscriptions': active_subscriptions,
-        'completed_profiles': completed_profiles,
-        'real_mrr': real_mrr,
-        'initia_subs': initia_subs,
-        'optima_subs': optima_subs,
-        'nouveaux_ce_mois': nouveaux_ce_mois,
-        'mois_actuel': mois_actuel,
-        'avg_patrimoine': avg_patrimoine,
-        'total_encours': total_encours
+    # Nom du mois actuel
+    mois_actuel = datetime.now().strftime('%B %Y')
+    mois_fr = {
+        'January': 'Janvier', 'February': 'Février', 'March': 'Mars',
+        'April': 'Avril', 'May': 'Mai', 'June': 'Juin',
+        'July': 'Juillet', 'August': 'Août', 'September': 'Septembre',
+        'October': 'Octobre', 'November': 'Novembre', 'December': 'Décembre'
     }
+    for en, fr in mois_fr.items():
+        mois_actuel = mois_actuel.replace(en, fr)
+    stats['mois_actuel'] = mois_actuel
     
     # Utilisateurs récents
     recent_users = User.query.filter_by(is_admin=False, is_prospect=False)\
@@ -164,7 +77,15 @@ def rag_management():
         flash('Accès non autorisé.', 'error')
         return redirect(url_for('site_pages.index'))
     
-    return render_template('platform/admin/rag_management.html')
+    # Statistiques du cache des requêtes de l'assistant (propres à ce worker)
+    query_cache_stats = None
+    try:
+        from app.services.atlas_rag_service import get_atlas_rag_service
+        query_cache_stats = get_atlas_rag_service().query_cache.stats()
+    except Exception as e:
+        print(f"⚠️ Statistiques du cache RAG indisponibles: {e}")
+    
+    return render_template('platform/admin/rag_management.html', query_cache_stats=query_cache_stats)
 
 @platform_admin_bp.route('/utilisateurs')
 @login_required
@@ -342,10 +263,9 @@ def user_detail(user_id):
         try:
             from app.services.patrimony_calculation_engine import PatrimonyCalculationEngine
             
-            # Recalcul complet avec le nouveau service
+            # Recalcul incrémental avec le nouveau service (catégories modifiées uniquement)
             totaux = PatrimonyCalculationEngine.calculate_and_save_all(
                 user.investor_profile,
-                force_recalculate=True,
                 save_to_db=True
             )
             
@@ -881,10 +801,9 @@ def update_user_data(user_id):
         try:
             from app.services.patrimony_calculation_engine import PatrimonyCalculationEngine
             
-            # Recalculer TOUS les totaux patrimoniaux avec le nouveau service
+            # Recalculer les totaux patrimoniaux dont les données ont changé
             totaux = PatrimonyCalculationEngine.calculate_and_save_all(
                 profile,
-                force_recalculate=True,
                 save_to_db=True
             )
             
@@ -1525,13 +1444,25 @@ def calculate_credit_api():
             capital_rembourse = 0
             total_cost = (monthly_payment * int(data['duree_mois'])) - float(data['montant_initial'])
         
-        return jsonify({
+        response = {
             'success': True,
             'monthly_payment': monthly_payment,
             'remaining_capital': remaining_capital,
             'capital_rembourse': capital_rembourse if 'capital_rembourse' in locals() else 0,
             'total_cost': total_cost
-        })
+        }
+        
+        # Tableau d'amortissement complet à la demande (moteur vectorisé)
+        if data.get('include_schedule') and data.get('date_debut'):
+            from app.services.credit_amortization_engine import CreditAmortizationEngine
+            response['schedule'] = CreditAmortizationEngine.schedule(
+                float(data['montant_initial']),
+                float(data['taux_interet']),
+                int(data['duree_mois']),
+                CreditCalculationService._parse_date(data['date_debut'])
+            ).to_list(iso_dates=True)
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({'error': f'Erreur de calcul: {str(e)}'}), 500
@@ -1600,25 +1531,56 @@ def calculate_patrimoine_totaux(user_id):
 @login_required
 def calculate_all_patrimoine():
     """
-    Calcule et sauvegarde les totaux patrimoniaux pour tous les utilisateurs.
+    Lance en arrière-plan le recalcul des totaux patrimoniaux de tous les utilisateurs.
+    Retourne immédiatement l'identifiant du job à suivre via l'endpoint de statut.
     """
     if not current_user.is_admin:
         return jsonify({'error': 'Accès non autorisé'}), 403
     
     try:
-        # Mise à jour pour tous les utilisateurs
-        PatrimoineCalculationService.update_all_users_patrimoine()
+        from flask import current_app
+        from app.services.patrimoine_recalculation_jobs import PatrimoineRecalculationJobService
+        
+        job = PatrimoineRecalculationJobService.start_job(
+            current_app._get_current_object(),
+            created_by_id=current_user.id,
+            workers=request.args.get('workers', type=int),
+            executor=request.args.get('executor')
+        )
         
         return jsonify({
             'success': True,
-            'message': 'Tous les totaux patrimoniaux ont été recalculés pour tous les utilisateurs'
-        })
-        
+            'message': 'Recalcul des totaux patrimoniaux lancé en arrière-plan',
+            'job_id': job.id,
+            'status_url': url_for('platform_admin.patrimoine_job_status', job_id=job.id),
+            'job': job.to_dict()
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Erreur calcul patrimoine global: {e}")
         return jsonify({'error': f'Erreur lors du calcul global: {str(e)}'}), 500
 
 
+@platform_admin_bp.route('/api/patrimoine/jobs/<job_id>', methods=['GET'])
+@login_required
+def patrimoine_job_status(job_id):
+    """
+    Statut d'un job de recalcul patrimonial (pollé par la page admin).
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    from app.services.patrimoine_recalculation_jobs import PatrimoineRecalculationJobService
+    
+    job = PatrimoineRecalculationJobService.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job introuvable'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
 # ==========================================
 # ROUTES APPRENTISSAGE / FORMATIONS
 # ==========================================
@@ -1662,6 +1624,7 @@ def apprentissage_create():
             # Variables pour les fichiers
             image_url = None
             image_key = None
+            image_variants = None
             pdf_url = None
             pdf_key = None
             pdf_original_name = None
@@ -1686,6 +1649,7 @@ def apprentissage_create():
                             if result['success']:
                                 image_url = result['url']
                                 image_key = result['key']
+                                image_variants = ImageVariantService.store_in_spaces(image_file, image_key, spaces_service)
                                 print(f"✅ Image uploadée: {image_url}")
                             else:
                                 print(f"❌ Erreur upload image: {result['error']}")
@@ -1700,6 +1664,9 @@ def apprentissage_create():
                             image_path = os.path.join(upload_dir, image_filename)
                             image_file.save(image_path)
                             image_key = image_filename
+                            image_variants = ImageVariantService.store_locally(
+                                image_file, image_filename, upload_dir, '/static/uploads/apprentissages'
+                            )
                             storage_type = 'local'
                             print(f"✅ Image sauvée localement: {image_filename}")
                     else:
@@ -1754,6 +1721,7 @@ def apprentissage_create():
                 categorie=categorie,
                 image=image_key,
                 image_url=image_url,
+                image_variants=image_variants or None,
                 fichier_pdf=pdf_key,
                 fichier_pdf_url=pdf_url,
                 fichier_pdf_original=pdf_original_name,
@@ -1819,10 +1787,13 @@ def apprentissage_edit(id):
                         if apprentissage.storage_type == 'digitalocean' and spaces_service and apprentissage.image:
                             print(f"🗑️ Suppression ancienne image: {apprentissage.image}")
                             spaces_service.delete_file(apprentissage.image)
+                            ImageVariantService.delete(apprentissage.image_variants, spaces_service=spaces_service)
                         elif apprentissage.storage_type == 'local' and apprentissage.image:
                             old_path = os.path.join('app', 'static', 'uploads', 'apprentissages', apprentissage.image)
                             if os.path.exists(old_path):
                                 os.remove(old_path)
+                            ImageVariantService.delete(apprentissage.image_variants, upload_dir=os.path.dirname(old_path))
+                        apprentissage.image_variants = None
                         
                         # Upload nouvelle image
                         if spaces_service:
@@ -1834,6 +1805,9 @@ def apprentissage_edit(id):
                             if result['success']:
                                 apprentissage.image = result['key']
                                 apprentissage.image_url = result['url']
+                                apprentissage.image_variants = ImageVariantService.store_in_spaces(
+                                    image_file, result['key'], spaces_service
+                                ) or None
                                 apprentissage.storage_type = 'digitalocean'
                                 print(f"✅ Nouvelle image uploadée: {result['url']}")
                             else:
@@ -1849,6 +1823,9 @@ def apprentissage_edit(id):
                             image_file.save(image_path)
                             apprentissage.image = image_filename
                             apprentissage.image_url = None
+                            apprentissage.image_variants = ImageVariantService.store_locally(
+                                image_file, image_filename, upload_dir, '/static/uploads/apprentissages'
+                            ) or None
                             apprentissage.storage_type = 'local'
                     else:
                         flash('Format d\'image non supporté. Utilisez PNG, JPG, JPEG ou GIF.', 'error')
@@ -1974,6 +1951,14 @@ def apprentissage_delete(id):
                     print(f"✅ Image locale supprimée: {local_image_path}")
                 except Exception as e:
                     errors.append(f"Image locale: {e}")
+            
+            # Miniatures générées à l'upload
+            if apprentissage.image_variants:
+                ImageVariantService.delete(
+                    apprentissage.image_variants,
+                    spaces_service=spaces_service if apprentissage.storage_type == 'digitalocean' else None,
+                    upload_dir=os.path.dirname(local_image_path)
+                )
         
         # 2. Supprimer le PDF
         if apprentissage.fichier_pdf:
@@ -2043,8 +2028,11 @@ def apprentissage_preview(id):
         return redirect(url_for('platform_admin.apprentissages'))
     
     try:
-        pdf_path = os.path.join('app', 'static', 'uploads', 'apprentissages', apprentissage.fichier_pdf)
-        return send_file(pdf_path, mimetype='application/pdf')
+        from flask import current_app
+        from app.services.file_serving import FileServingBackend
+        
+        pdf_path = os.path.join(current_app.root_path, 'static', 'uploads', 'apprentissages', apprentissage.fichier_pdf)
+        return FileServingBackend.send(pdf_path, mimetype='application/pdf')
         
     except FileNotFoundError:
         flash('Fichier PDF introuvable.', 'error')
@@ -2086,6 +2074,20 @@ def get_crypto_prices():
         return jsonify({'error': 'Erreur serveur'}), 500
 
 
+@platform_admin_bp.route('/api/http-metrics')
+@login_required
+def http_metrics():
+    """Latence des appels HTTP sortants par hôte (worker courant)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    from app.services.http_client import HttpClient
+    return jsonify({
+        'pid': os.getpid(),
+        'hosts': HttpClient.metrics()
+    })
+
+
 # ===== ROUTES PLAN D'INVESTISSEMENT =====
 
 @platform_admin_bp.route('/api/utilisateur/<int:user_id>/plan-investissement')
@@ -2368,176 +2370,22 @@ def send_first_appointment_email(user_id):
         return jsonify({'success': False, 'message': 'Utilisateur introuvable'}), 404
     
     try:
-        from app.services.email_service import MailerSendService
+        from app.services.email_outbox_service import EmailOutboxService
+        from app.services.email_templates import EmailTemplateRenderer
         
         # Récupérer l'API token depuis les variables d'environnement
         api_token = os.getenv('MAILERSEND_API_TOKEN')
         if not api_token:
             return jsonify({'success': False, 'message': 'Configuration email manquante'}), 500
         
-        mailer = MailerSendService(api_token)
-        
         # Construire l'URL pour le rendez-vous (Cal.com)
         appointment_url = "https://app.cal.eu/contact-atlas/suivi-patrimonial-atlas"
         
-        # Contenu HTML de l'email de première prise de RDV avec couleurs Atlas corrigées
-        email_html = f"""
-<!doctype html>
-<html lang="fr">
-<head>
-  <meta charset="utf-8" />
-  <meta name="viewport" content="width=device-width,initial-scale=1" />
-  <meta name="x-apple-disable-message-reformatting" />
-  <title>Atlas</title>
-</head>
-
-<body style="margin:0;padding:0;background:#f2f4f5;">
-  <!-- Preheader -->
-  <div style="display:none;max-height:0;overflow:hidden;opacity:0;color:transparent;">
-    Votre recommandation d'investissement Atlas est en préparation.
-  </div>
-
-  <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="background:#f2f4f5;">
-    <tr>
-      <td align="center" style="padding:28px 16px;">
-        <table role="presentation" width="640" cellpadding="0" cellspacing="0" style="max-width:640px;background:#ffffff;border-radius:18px;overflow:hidden;">
-
-          <!-- Header -->
-          <tr>
-            <td align="center" style="background:#137C8B;padding:18px;">
-              <div style="font-family:Arial,sans-serif;font-size:22px;font-weight:700;color:#ffffff;">
-                Atlas
-              </div>
-            </td>
-          </tr>
-
-          <!-- Body -->
-          <tr>
-            <td style="padding:34px;">
-              <div style="font-family:Arial,sans-serif;font-size:18px;line-height:28px;color:#3a3a3a;">
-
-                <div style="font-weight:700;margin-bottom:16px;">
-                  Bonjour {user.first_name},
-                </div>
-
-                <div style="margin-bottom:20px;font-size:20px;font-weight:700;">
-                  Ton profil investisseur est bien complété 👍
-                </div>
-
-                <div style="margin-bottom:22px;">
-                  À partir de ces informations, nous allons analyser ta situation et préparer une première
-                  <strong>recommandation d'investissement adaptée</strong> à ton <strong>profil de risque</strong> et à tes <strong>objectifs</strong>.
-                </div>
-
-                <div style="margin-bottom:18px;">
-                  La prochaine étape est simple 👇
-                </div>
-
-                <!-- CTA -->
-                <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="margin:22px 0 26px 0;">
-                  <tr>
-                    <td align="center">
-                      <!--[if mso]>
-                      <v:roundrect xmlns:v="urn:schemas-microsoft-com:vml" href="{appointment_url}" style="height:74px;v-text-anchor:middle;width:380px;" arcsize="50%" stroke="f" fillcolor="#137C8B">
-                        <w:anchorlock/>
-                        <center style="color:#ffffff;font-family:Arial,sans-serif;font-size:18px;font-weight:bold;">
-                          👉 Choisir un créneau de rendez-vous
-                        </center>
-                      </v:roundrect>
-                      <![endif]-->
-                      <!--[if !mso]><!-- -->
-                      <a href="{appointment_url}"
-                        style="display:inline-block;background:#137C8B;color:#ffffff;text-decoration:none;font-family:Arial,sans-serif;font-size:18px;font-weight:700;padding:18px 30px;border-radius:999px;text-align:center;">
-                        👉 Choisir un créneau de rendez-vous<br>
-                        <span style="font-size:14px;font-style:italic;font-weight:400;">
-                          (téléphonique ou visio – 30 min)
-                        </span>
-                      </a>
-                      <!--<![endif]-->
-                    </td>
-                  </tr>
-                </table>
-
-                <div style="margin-bottom:12px;font-weight:700;">
-                  Ce rendez-vous nous permettra de :
-                </div>
-
-                <ul style="margin:0 0 22px 18px;padding:0;font-size:18px;line-height:28px;">
-                  <li>te présenter la <strong>stratégie retenue</strong></li>
-                  <li>t'expliquer les <strong>choix effectués</strong></li>
-                  <li>répondre à tes <strong>questions</strong></li>
-                  <li>valider les <strong>prochaines étapes</strong></li>
-                </ul>
-
-                <div style="margin-bottom:26px;">
-                  Les créneaux sont disponibles à partir de <strong>J+2</strong>, le temps pour nous de travailler sur ton dossier.
-                </div>
-
-                <div style="font-family:Arial,sans-serif;font-size:18px;line-height:28px;color:#3a3a3a;font-style:italic;">
-                  À très vite,
-                </div>
-                <div style="font-family:Arial,sans-serif;font-size:18px;line-height:28px;color:#3a3a3a;font-weight:700;margin-bottom:20px;">
-                  L'équipe Atlas
-                </div>
-
-              </div>
-            </td>
-          </tr>
-
-          <!-- Footer -->
-          <tr>
-            <td style="padding:0 34px 30px 34px;">
-              <a href="https://atlas-invest.fr" style="font-family:Arial,sans-serif;color:#137C8B;text-decoration:underline;">
-                https://atlas-invest.fr
-              </a>
-
-              <div style="margin-top:12px;">
-                <img src="https://atlas-invest.fr/static/img/logo-atlas.png" alt="Atlas" style="height:32px;width:auto;vertical-align:middle;margin-right:12px;">
-                <span style="display:inline-block;background:#137C8B;color:#ffffff;font-family:Arial,sans-serif;font-size:14px;font-weight:700;padding:10px 14px;border-radius:10px;vertical-align:middle;">
-                  Atlas – le conseil financier clair et indépendant
-                </span>
-              </div>
-
-              <div style="margin-top:20px;font-family:Arial,sans-serif;font-size:12px;color:#8a8a8a;">
-                Cet email a été envoyé automatiquement, merci de ne pas y répondre.
-              </div>
-            </td>
-          </tr>
-
-        </table>
-      </td>
-    </tr>
-  </table>
-</body>
-</html>
-        """
-        
-        # Version texte
-        email_text = f"""
-        Bonjour {user.first_name},
-        
-        Ton profil investisseur est bien complété !
-        
-        À partir de ces informations, nous allons analyser ta situation et préparer une première recommandation d'investissement adaptée à ton profil de risque et à tes objectifs.
-        
-        La prochaine étape est simple : choisir un créneau de rendez-vous.
+        # Contenu de l'email de première prise de RDV (templates emails/prise_rdv.html et .txt)
+        email_html, email_text = EmailTemplateRenderer.render('prise_rdv', user=user, appointment_url=appointment_url)
         
-        Lien pour réserver : {appointment_url}
-        
-        Ce rendez-vous nous permettra de :
-        - te présenter la stratégie retenue
-        - t'expliquer les choix effectués  
-        - répondre à tes questions
-        - valider les prochaines étapes
-        
-        Les créneaux sont disponibles à partir de J+2, le temps pour nous de travailler sur ton dossier.
-        
-        À très vite,
-        L'équipe Atlas
-        """
-        
-        # Envoyer l'email
-        success = mailer.send_email(
+        # Mettre l'email en file d'envoi (envoyé en arrière-plan par le dispatcher)
+        success = EmailOutboxService.enqueue(
             to_email=user.email,
             to_name=f"{user.first_name} {user.last_name}",
             subject="🌱 Ton premier investissement commence ici",
@@ -2548,12 +2396,12 @@ def send_first_appointment_email(user_id):
         if success:
             return jsonify({
                 'success': True,
-                'message': f'Email de prise de RDV envoyé avec succès à {user.email}'
+                'message': f'Email de prise de RDV mis en file d\'envoi pour {user.email}'
             })
         else:
             return jsonify({
                 'success': False,
-                'message': 'Erreur lors de l\'envoi de l\'email'
+                'message': 'Erreur lors de la mise en file de l\'email'
             })
             
     except Exception as e:
@@ -2579,197 +2427,22 @@ def send_post_appointment_email(user_id):
         return jsonify({'success': False, 'message': 'Utilisateur introuvable'}), 404
     
     try:
-        from app.services.email_service import MailerSendService
+        from app.services.email_outbox_service import EmailOutboxService
+        from app.services.email_templates import EmailTemplateRenderer
         
         # Récupérer l'API token depuis les variables d'environnement
         api_token = os.getenv('MAILERSEND_API_TOKEN')
         if not api_token:
             return jsonify({'success': False, 'message': 'Configuration email manquante'}), 500
         
-        mailer = MailerSendService(api_token)
-        
         # URL vers l'espace client (section Mon Plan)
         plan_url = "https://atlas-invest.fr/plateforme/plan-investissement"
         
-        # Contenu HTML de l'email post-RDV avec couleurs Atlas corrigées
-        email_html = f"""
-<!doctype html>
-<html lang="fr">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width,initial-scale=1" />
-    <meta name="x-apple-disable-message-reformatting" />
-    <title>Atlas</title>
-  </head>
-
-  <body style="margin:0;padding:0;background:#f2f4f5;">
-    <!-- Preheader (hidden) -->
-    <div style="display:none;max-height:0;overflow:hidden;opacity:0;color:transparent;">
-      Les étapes de mise en œuvre de ton investissement sont disponibles dans « Mon Plan ».
-    </div>
-
-    <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%" style="background:#f2f4f5;">
-      <tr>
-        <td align="center" style="padding:28px 16px;">
-          <!-- Container -->
-          <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="640" style="width:640px;max-width:640px;background:#ffffff;border-radius:18px;overflow:hidden;">
-            <!-- Header -->
-            <tr>
-              <td align="center" style="background:#137C8B;padding:18px 20px;">
-                <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:22px;line-height:26px;font-weight:700;color:#ffffff;">
-                  Atlas
-                </div>
-              </td>
-            </tr>
-
-            <!-- Body -->
-            <tr>
-              <td style="padding:34px 34px 16px 34px;">
-                <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;color:#3a3a3a;font-size:18px;line-height:28px;">
-                  <div style="margin:0 0 16px 0;font-weight:700;">Bonjour {user.first_name},</div>
-
-                  <div style="margin:0 0 16px 0;">Merci pour notre échange.</div>
-
-                  <div style="margin:0 0 22px 0;">
-                    Suite à notre rendez-vous, nous avons formalisé les étapes de mise en œuvre de ton investissement.
-                  </div>
-
-                  <div style="margin:0 0 20px 0;">
-                    <span style="font-weight:700;">👉</span> Tu peux retrouver l'ensemble des éléments concrets, ainsi que les supports d'investissement préconisés,
-                    dans la rubrique <span style="font-weight:700;">« Mon Plan »</span> de ton espace client.
-                  </div>
-
-                  <!-- Button -->
-                  <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%" style="margin:22px 0 26px 0;">
-                    <tr>
-                      <td align="center">
-                        <!--[if mso]>
-                          <v:roundrect xmlns:v="urn:schemas-microsoft-com:vml" href="{plan_url}" style="height:54px;v-text-anchor:middle;width:320px;" arcsize="50%" stroke="f" fillcolor="#137C8B">
-                            <w:anchorlock/>
-                            <center style="color:#ffffff;font-family:Arial,sans-serif;font-size:18px;font-weight:bold;">
-                              👉 Accéder à mon plan
-                            </center>
-                          </v:roundrect>
-                        <![endif]-->
-                        <!--[if !mso]><!-- -->
-                        <a href="{plan_url}"
-                          style="display:inline-block;background:#137C8B;color:#ffffff;text-decoration:none;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:18px;line-height:22px;font-weight:700;padding:16px 28px;border-radius:999px;">
-                          👉 Accéder à mon plan
-                        </a>
-                        <!--<![endif]-->
-                      </td>
-                    </tr>
-                  </table>
-
-                  <div style="margin:0 0 18px 0;">
-                    Pour les prochaines semaines, l'idée est simple : prendre le temps de te familiariser avec ce placement
-                    et de comprendre son fonctionnement.
-                  </div>
-
-                  <div style="margin:0 0 10px 0;">
-                    <span style="font-weight:700;">👉</span> Tu peux t'appuyer sur :
-                  </div>
-
-                  <!-- Bullets -->
-                  <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%" style="margin:8px 0 20px 0;">
-                    <tr>
-                      <td style="padding-left:18px;">
-                        <ul style="margin:0;padding-left:18px;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;color:#3a3a3a;font-size:18px;line-height:28px;">
-                          <li><span style="font-weight:700;">ton tableau de bord</span> pour suivre tes avancées</li>
-                          <li><span style="font-weight:700;">les ressources pédagogiques</span> disponibles dans ton espace client</li>
-                          <li>
-                            notre accompagnement, si tu as la moindre question
-                            <span style="font-style:italic;">(via WhatsApp pour une réponse rapide)</span>
-                          </li>
-                        </ul>
-                      </td>
-                    </tr>
-                  </table>
-
-                  <div style="margin:0 0 18px 0;">
-                    Nous nous reparlerons dans environ <span style="font-weight:700;">3 mois</span> pour faire le point et, si c'est pertinent,
-                    envisager la mise en place d'un autre investissement.
-                  </div>
-
-                  <div style="margin:0 0 22px 0;">
-                    Atlas s'inscrit dans une logique progressive : on avance étape par étape, au bon rythme.
-                  </div>
-
-                  <div style="margin:0 0 6px 0;">À bientôt,</div>
-                  <div style="margin:0 0 18px 0;font-weight:700;">L'équipe Atlas</div>
-                </div>
-              </td>
-            </tr>
-
-            <!-- Signature / Footer band -->
-            <tr>
-              <td style="padding:10px 34px 30px 34px;">
-                <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%">
-                  <tr>
-                    <td style="padding:10px 0 6px 0;">
-                      <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:16px;line-height:22px;">
-                        <a href="https://atlas-invest.fr" style="color:#137C8B;text-decoration:underline;">https://atlas-invest.fr</a>
-                      </div>
-                    </td>
-                  </tr>
-
-                  <tr>
-                    <td style="padding-top:10px;">
-                      <img src="https://atlas-invest.fr/static/img/logo-atlas.png" alt="Atlas" style="height:32px;width:auto;vertical-align:middle;margin-right:12px;">
-                      <span style="display:inline-block;background:#137C8B;color:#ffffff;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:14px;line-height:18px;font-weight:700;padding:10px 14px;border-radius:10px;vertical-align:middle;">
-                        Atlas – le conseil financier clair et indépendant
-                      </span>
-                    </td>
-                  </tr>
-
-                  <tr>
-                    <td style="padding-top:22px;">
-                      <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:12px;line-height:18px;color:#8a8a8a;">
-                        Cet email a été envoyé automatiquement, merci de ne pas y répondre.
-                      </div>
-                    </td>
-                  </tr>
-                </table>
-              </td>
-            </tr>
-          </table>
-          <!-- /Container -->
-        </td>
-      </tr>
-    </table>
-  </body>
-</html>
-        """
-        
-        # Version texte
-        email_text = f"""
-        Bonjour {user.first_name},
-        
-        Merci pour notre échange.
-        
-        Suite à notre rendez-vous, nous avons formalisé les étapes de mise en œuvre de ton investissement.
-        
-        Tu peux retrouver l'ensemble des éléments concrets, ainsi que les supports d'investissement préconisés, dans la rubrique « Mon Plan » de ton espace client.
-        
-        Lien vers ton plan : {plan_url}
-        
-        Pour les prochaines semaines, l'idée est simple : prendre le temps de te familiariser avec ce placement et de comprendre son fonctionnement.
+        # Contenu de l'email post-RDV (templates emails/suivi_post_rdv.html et .txt)
+        email_html, email_text = EmailTemplateRenderer.render('suivi_post_rdv', user=user, plan_url=plan_url)
         
-        Tu peux t'appuyer sur :
-        - ton tableau de bord pour suivre tes avancées
-        - les ressources pédagogiques disponibles dans ton espace client
-        - notre accompagnement, si tu as la moindre question (via WhatsApp pour une réponse rapide)
-        
-        Nous nous reparlerons dans environ 3 mois pour faire le point et, si c'est pertinent, envisager la mise en place d'un autre investissement.
-        
-        Atlas s'inscrit dans une logique progressive : on avance étape par étape, au bon rythme.
-        
-        À bientôt,
-        L'équipe Atlas
-        """
-        
-        # Envoyer l'email
-        success = mailer.send_email(
+        # Mettre l'email en file d'envoi (envoyé en arrière-plan par le dispatcher)
+        success = EmailOutboxService.enqueue(
             to_email=user.email,
             to_name=f"{user.first_name} {user.last_name}",
             subject="🎯 Ton plan d'investissement est en place",
@@ -2780,12 +2453,12 @@ def send_post_appointment_email(user_id):
         if success:
             return jsonify({
                 'success': True,
-                'message': f'Email de suivi post-RDV envoyé avec succès à {user.email}'
+                'message': f'Email de suivi post-RDV mis en file d\'envoi pour {user.email}'
             })
         else:
             return jsonify({
                 'success': False,
-                'message': 'Erreur lors de l\'envoi de l\'email'
+                'message': 'Erreur lors de la mise en file de l\'email'
             })
             
     except Exception as e:
@@ -2811,156 +2484,22 @@ def send_generic_follow_up_email(user_id):
         return jsonify({'success': False, 'message': 'Utilisateur introuvable'}), 404
     
     try:
-        from app.services.email_service import MailerSendService
+        from app.services.email_outbox_service import EmailOutboxService
+        from app.services.email_templates import EmailTemplateRenderer
         
         # Récupérer l'API token depuis les variables d'environnement
         api_token = os.getenv('MAILERSEND_API_TOKEN')
         if not api_token:
             return jsonify({'success': False, 'message': 'Configuration email manquante'}), 500
         
-        mailer = MailerSendService(api_token)
-        
         # URL vers l'espace client principal
         dashboard_url = "https://atlas-invest.fr/plateforme/dashboard"
         
-        # Contenu HTML de l'email générique de suivi avec couleurs Atlas
-        email_html = f"""
-<!doctype html>
-<html lang="fr">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width,initial-scale=1" />
-    <meta name="x-apple-disable-message-reformatting" />
-    <title>Atlas</title>
-  </head>
-
-  <body style="margin:0;padding:0;background:#f2f4f5;">
-    <!-- Preheader (hidden) -->
-    <div style="display:none;max-height:0;overflow:hidden;opacity:0;color:transparent;">
-      Votre accompagnement Atlas se poursuit.
-    </div>
-
-    <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%" style="background:#f2f4f5;">
-      <tr>
-        <td align="center" style="padding:28px 16px;">
-          <!-- Container -->
-          <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="640" style="width:640px;max-width:640px;background:#ffffff;border-radius:18px;overflow:hidden;">
-
-            <!-- Header -->
-            <tr>
-              <td align="center" style="background:#268190;padding:18px 20px;">
-                <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:22px;line-height:26px;font-weight:700;color:#ffffff;">
-                  Atlas
-                </div>
-              </td>
-            </tr>
-
-            <!-- Body -->
-            <tr>
-              <td style="padding:28px 26px 10px 26px;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:14px;line-height:1.6;color:#111827;">
-
-                <p style="margin:0 0 14px 0;">Bonjour {user.first_name},</p>
-
-                <p style="margin:0 0 14px 0;">
-                  Merci pour notre échange et pour <strong>la confiance que vous accordez à Atlas</strong>.
-                </p>
-
-                <p style="margin:0 0 14px 0;">
-                  👉 Votre accompagnement Atlas se poursuit, vous pouvez consulter à tout moment votre <strong>espace client</strong> pour :
-                </p>
-
-                <ul style="margin:0 0 18px 18px;padding:0;">
-                  <li style="margin:0 0 8px 0;">suivre l'évolution de <strong>votre patrimoine</strong></li>
-                  <li style="margin:0 0 8px 0;">consulter votre <strong>plan d'investissement</strong></li>
-                  <li style="margin:0 0 8px 0;">accéder aux <strong>ressources pédagogiques</strong></li>
-                </ul>
-
-                <!-- CTA -->
-                <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="margin:18px 0 22px 0;">
-                  <tr>
-                    <td align="center">
-                      <a href="{dashboard_url}" target="_blank"
-                        style="display:inline-block;background:#268190;color:#ffffff;text-decoration:none;font-weight:700;
-                               padding:14px 22px;border-radius:12px;font-size:14px;">
-                        👉 Accéder à mon espace Atlas
-                      </a>
-                    </td>
-                  </tr>
-                </table>
-
-                <p style="margin:0 0 14px 0;">
-                  Si vous avez la moindre question ou si vous souhaitez ajuster un point de votre stratégie, nous restons à votre disposition.
-                </p>
-
-                <p style="margin:0;">
-                  À très bientôt,<br />
-                  <strong>L'équipe Atlas</strong>
-                </p>
-
-              </td>
-            </tr>
-
-            <!-- Signature / Footer band -->
-            <tr>
-              <td style="padding:10px 34px 30px 34px;">
-                <table role="presentation" cellpadding="0" cellspacing="0" border="0" width="100%">
-                  <tr>
-                    <td style="padding:10px 0 6px 0;">
-                      <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:16px;line-height:22px;">
-                        <a href="https://atlas-invest.fr" style="color:#3f7f88;text-decoration:underline;">https://atlas-invest.fr</a>
-                      </div>
-                    </td>
-                  </tr>
-
-                  <tr>
-                    <td style="padding-top:10px;">
-                      <img src="https://atlas-invest.fr/static/img/logo-atlas.png" alt="Atlas" style="height:32px;width:auto;vertical-align:middle;margin-right:12px;">
-                      <span style="display:inline-block;background:#3f7f88;color:#ffffff;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:14px;line-height:18px;font-weight:700;padding:10px 14px;border-radius:10px;vertical-align:middle;">
-                        Atlas – le conseil financier clair et indépendant
-                      </span>
-                    </td>
-                  </tr>
-
-                  <tr>
-                    <td style="padding-top:22px;">
-                      <div style="font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,Arial,sans-serif;font-size:12px;line-height:18px;color:#8a8a8a;">
-                        Cet email a été envoyé automatiquement, merci de ne pas y répondre.
-                      </div>
-                    </td>
-                  </tr>
-                </table>
-              </td>
-            </tr>
-          </table>
-          <!-- /Container -->
-        </td>
-      </tr>
-    </table>
-  </body>
-</html>
-        """
-        
-        # Version texte
-        email_text = f"""
-        Bonjour {user.first_name},
-
-        Merci pour notre échange et pour la confiance que vous accordez à Atlas.
-
-        Votre accompagnement Atlas se poursuit, vous pouvez consulter à tout moment votre espace client pour :
-        - suivre l'évolution de votre patrimoine
-        - consulter votre plan d'investissement
-        - accéder aux ressources pédagogiques
-
-        Lien vers votre espace Atlas : {dashboard_url}
-
-        Si vous avez la moindre question ou si vous souhaitez ajuster un point de votre stratégie, nous restons à votre disposition.
-
-        À très bientôt,
-        L'équipe Atlas
-        """
+        # Contenu de l'email de suivi générique (templates emails/suivi_generique.html et .txt)
+        email_html, email_text = EmailTemplateRenderer.render('suivi_generique', user=user, dashboard_url=dashboard_url)
 
-        # Envoyer l'email
-        success = mailer.send_email(
+        # Mettre l'email en file d'envoi (envoyé en arrière-plan par le dispatcher)
+        success = EmailOutboxService.enqueue(
             to_email=user.email,
             to_name=f"{user.first_name} {user.last_name}",
             subject="Suite à notre échange – votre accompagnement Atlas",
@@ -2971,12 +2510,12 @@ def send_generic_follow_up_email(user_id):
         if success:
             return jsonify({
                 'success': True,
-                'message': f'Email de suivi générique envoyé avec succès à {user.email}'
+                'message': f'Email de suivi générique mis en file d\'envoi pour {user.email}'
             })
         else:
             return jsonify({
                 'success': False,
-                'message': 'Erreur lors de l\'envoi de l\'email'
+                'message': 'Erreur lors de la mise en file de l\'email'
             })
             
     except Exception as e:
@@ -2,7 +2,7 @@
 Routes pour l'interface investisseur de la plateforme.
 """
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, make_response, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, make_response, send_file, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from functools import wraps
 from app import db
@@ -13,7 +13,9 @@ from app.models.payment_method import PaymentMethod
 from app.models.apprentissage import Apprentissage
 from app.models.investment_plan import InvestmentPlan, InvestmentPlanLine, AVAILABLE_ENVELOPES
 from app.services.investment_actions_service import InvestmentActionsService
+from app.services.http_client import HttpClient
 import json
+import os
 import re
 import logging
 from datetime import datetime, timedelta
@@ -346,6 +348,83 @@ def get_single_crypto_price(symbol):
             'error': 'Erreur serveur'
         }), 500
 
+def _history_period_from_request():
+    """Intervalle et période demandés (?interval=1h|1d|1w&days=N, 30 jours par défaut)."""
+    interval = request.args.get('interval', '1d')
+    days = min(max(request.args.get('days', 30, type=int) or 30, 1), 3650)
+    return interval, datetime.utcnow() - timedelta(days=days)
+
+@platform_investor_bp.route('/api/crypto-history')
+@login_required
+def get_crypto_price_history():
+    """
+    Séries de prix sous-échantillonnées pour les graphiques de tendance.
+    ?symbols=bitcoin,ethereum&interval=1d&days=30
+    """
+    from app.services.crypto_price_history_service import CryptoPriceHistoryService
+    
+    symbols = [symbol.strip() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()]
+    if not symbols:
+        return jsonify({'success': False, 'error': 'Paramètre symbols requis'}), 400
+    
+    interval, start = _history_period_from_request()
+    try:
+        series = CryptoPriceHistoryService.get_price_series(symbols, interval=interval, start=start)
+        return jsonify({'success': True, **series})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Erreur historique prix crypto: {e}")
+        return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
+
+@platform_investor_bp.route('/api/crypto-history/portfolio')
+@login_required
+def get_crypto_portfolio_history():
+    """
+    Valeur du portefeuille crypto de l'utilisateur dans le temps (quantités actuelles).
+    ?interval=1d&days=30
+    """
+    from app.services.crypto_price_history_service import CryptoPriceHistoryService
+    
+    profile = current_user.investor_profile
+    holdings = CryptoPriceHistoryService.holdings_from_profile(profile) if profile else {}
+    
+    interval, start = _history_period_from_request()
+    try:
+        series = CryptoPriceHistoryService.get_portfolio_value_series(holdings, interval=interval, start=start)
+        return jsonify({'success': True, **series})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Erreur historique portefeuille crypto: {e}")
+        return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
+
+@platform_investor_bp.route('/api/patrimoine/history')
+@login_required
+def get_patrimoine_history():
+    """
+    Évolution du patrimoine de l'utilisateur (graphique du tableau de bord).
+    ?days=365&fill=1 (fill=1 : une valeur par jour, sinon seulement les jours de changement)
+    """
+    from app.services.patrimoine_snapshot_service import PatrimoineSnapshotService
+    
+    profile = current_user.investor_profile
+    if not profile:
+        return jsonify({'success': False, 'error': 'Profil investisseur introuvable'}), 404
+    
+    days = min(max(request.args.get('days', 365, type=int) or 365, 1), 3650)
+    fill_days = request.args.get('fill', '0') in ('1', 'true')
+    try:
+        history = PatrimoineSnapshotService.get_history(
+            profile.id,
+            start=datetime.utcnow().date() - timedelta(days=days),
+            fill_days=fill_days
+        )
+        return jsonify({'success': True, **history})
+    except Exception as e:
+        print(f"❌ Erreur historique patrimoine: {e}")
+        return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
+
 @platform_investor_bp.route('/apprentissages')
 @login_required
 @require_active_subscription
@@ -425,11 +504,11 @@ def investor_data():
     # Vérifier si on est en mode édition
     edit_mode = request.args.get('edit') == 'true'
     
-    # Recalcul complet des totaux patrimoniaux avec PatrimonyCalculationEngine V2.0
+    # Recalcul incrémental des totaux patrimoniaux (seules les catégories modifiées sont recalculées)
     if current_user.investor_profile:
         try:
             from app.services.patrimony_calculation_engine import PatrimonyCalculationEngine
-            PatrimonyCalculationEngine.calculate_and_save_all(current_user.investor_profile, force_recalculate=True, save_to_db=True)
+            PatrimonyCalculationEngine.calculate_and_save_all(current_user.investor_profile, save_to_db=True)
             db.session.refresh(current_user.investor_profile)
             db.session.refresh(current_user)
         except Exception as calc_error:
@@ -1252,7 +1331,7 @@ def chat_api():
     try:
         # Importer le service RAG Atlas
         from app.services.atlas_rag_service import get_atlas_rag_service
-        import requests
+        from app.services.assistant_chat_service import AssistantChatService
         from datetime import datetime
         import os
         import json
@@ -1265,40 +1344,14 @@ def chat_api():
         # Récupérer le service RAG
         rag_service = get_atlas_rag_service()
         
-        # Récupérer le system prompt depuis assistant_atlas.md
-        system_prompt = rag_service.get_system_prompt()
-        
-        # Rechercher le contexte pertinent dans la base de connaissance
-        context = rag_service.get_context_for_query(user_message, max_context_length=1500)
-        
-        # Construire le message utilisateur avec le contexte
-        user_message_with_context = user_message
-        if context:
-            user_message_with_context = f"{context}\n\nQUESTION CLIENT: {user_message}"
+        # System prompt (assistant_atlas.md) + contexte pertinent de la base de connaissance
+        messages = AssistantChatService.build_messages(user_message, rag_service)
         
-        # Appel direct à l'API OpenAI via requests
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Modèle plus puissant pour une meilleure compréhension du contexte
-        model = 'gpt-4o-mini'  # Peut être 'gpt-4' si disponible
-        
-        data = {
-            'model': model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_message_with_context}
-            ],
-            'max_tokens': 1000,
-            'temperature': 0.7
-        }
-        
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers=headers,
-            json=data,
+        # Appel à l'API OpenAI via la session HTTP partagée (connexion keep-alive)
+        response = HttpClient.session().post(
+            AssistantChatService.get_api_url(),
+            headers=AssistantChatService.build_headers(api_key),
+            json=AssistantChatService.build_payload(messages),
             timeout=30
         )
         
@@ -1340,6 +1393,73 @@ def chat_api():
             'timestamp': datetime.now().strftime('%H:%M')
         })
 
+@platform_investor_bp.route('/api/chat/stream', methods=['POST'])
+@login_required
+def chat_stream_api():
+    """
+    Variante streaming de /api/chat : relaie la réponse du modèle token par token
+    en server-sent events (événements delta, puis done ou error).
+    """
+    if current_user.is_admin:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    if not current_user.can_access_platform():
+        return jsonify({'error': 'Abonnement expiré'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'Message vide'}), 400
+    
+    from app.services.atlas_rag_service import get_atlas_rag_service
+    from app.services.assistant_chat_service import AssistantChatService
+    import os
+    
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        return jsonify({'error': 'Configuration OpenAI manquante'}), 500
+    
+    try:
+        # Contexte RAG et ouverture du flux avant de répondre : les erreurs restent en JSON
+        messages = AssistantChatService.build_messages(user_message, get_atlas_rag_service())
+        upstream = AssistantChatService.open_stream(messages, api_key)
+    except Exception as e:
+        print(f"🚨 Erreur chatbot (stream): {e}")
+        return jsonify({'error': 'Désolé, je rencontre un problème technique. Veuillez réessayer dans quelques instants.'}), 502
+    
+    if upstream.status_code != 200:
+        print(f"❌ Erreur OpenAI {upstream.status_code}: {upstream.text}")
+        upstream.close()
+        if upstream.status_code == 401:
+            return jsonify({
+                'error': '🔧 Assistant temporairement indisponible (clé API invalide). Veuillez contacter le support.',
+                'details': 'Configuration OpenAI à mettre à jour'
+            }), 500
+        return jsonify({'error': f'Erreur API OpenAI: {upstream.status_code}'}), 500
+    
+    def generate():
+        try:
+            for content in AssistantChatService.iter_deltas(upstream):
+                yield AssistantChatService.format_sse('delta', {'content': content})
+            yield AssistantChatService.format_sse('done', {'timestamp': datetime.now().strftime('%H:%M')})
+        except Exception as e:
+            print(f"🚨 Erreur chatbot (stream): {e}")
+            yield AssistantChatService.format_sse('error', {
+                'error': 'La réponse a été interrompue. Veuillez réessayer dans quelques instants.'
+            })
+        finally:
+            upstream.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Pas de mise en tampon par nginx
+        }
+    )
+
 @platform_investor_bp.route('/api/rag/rebuild', methods=['POST'])
 @login_required
 def rebuild_rag_index():
@@ -1352,12 +1472,17 @@ def rebuild_rag_index():
     try:
         from app.services.atlas_rag_service import get_atlas_rag_service
         
+        # Par défaut seuls les fichiers modifiés sont re-vectorisés ; {"full": true} pour tout reconstruire
+        data = request.get_json(silent=True) or {}
+        full = bool(data.get('full', False))
+        
         rag_service = get_atlas_rag_service()
-        rag_service.rebuild_index()
+        stats = rag_service.rebuild_index(full=full)
         
         return jsonify({
             'success': True,
-            'message': 'Index RAG reconstruit avec succès'
+            'message': 'Index RAG reconstruit avec succès' if full else 'Index RAG mis à jour avec succès',
+            'stats': stats
         })
         
     except Exception as e:
@@ -1390,7 +1515,7 @@ def test_rag_search():
         
         return jsonify({
             'query': query,
-            'results': results,
+            'results': [result.to_dict() for result in results],
             'context': context,
             'total_documents': len(rag_service.documents) if rag_service.documents else 0
         })
@@ -2403,10 +2528,15 @@ def learning_pdf(id):
 @login_required
 def pdf_proxy(formation_id):
     """
-    Route proxy pour servir les PDFs depuis DigitalOcean sans problèmes CORS
+    Route proxy pour servir les PDFs depuis DigitalOcean sans problèmes CORS.
+    Le fichier est servi depuis le disque (cache local des objets Spaces) avec support
+    des requêtes Range (206) pour que PDF.js ne charge que les pages affichées,
+    et validation ETag / Last-Modified avec cache navigateur privé.
+    Le transfert est délégué au serveur frontal si FILE_SERVING_BACKEND le permet.
     """
-    from flask import Response
     import requests
+    from app.services.file_serving import FileServingBackend
+    from app.services.spaces_file_cache import SpacesFileCache
     
     # Vérifier les permissions
     if not current_user.is_admin:
@@ -2419,56 +2549,54 @@ def pdf_proxy(formation_id):
         if not apprentissage or not apprentissage.has_pdf():
             return "Formation non trouvée", 404
         
-        print(f"📤 Proxy PDF request for: {apprentissage.nom} (Storage: {apprentissage.storage_type})")
+        # Nettoyer le nom du fichier pour éviter les erreurs d'encodage
+        safe_filename = re.sub(r'[^\w\s-]', '', apprentissage.nom).strip()
+        safe_filename = re.sub(r'[-\s]+', '-', safe_filename)
         
         if apprentissage.storage_type == 'digitalocean':
-            # Récupérer depuis DigitalOcean Spaces
-            pdf_url = apprentissage.get_pdf_url()
-            if not pdf_url:
+            # Clé de l'objet dans le Space (ou déduite de l'URL publique pour les anciennes formations)
+            key = apprentissage.fichier_pdf or SpacesFileCache.key_from_url(apprentissage.fichier_pdf_url)
+            if not key:
                 return "PDF non disponible", 404
             
-            print(f"🌐 Fetching from DigitalOcean: {pdf_url}")
-            response = requests.get(pdf_url, stream=True, timeout=30)
-            response.raise_for_status()
+            # Option : lecture directe depuis Spaces via une URL pré-signée de courte durée
+            if current_app.config.get('SPACES_PDF_PRESIGNED_URLS'):
+                presigned_url = SpacesFileCache.presigned_url(
+                    key, f"{safe_filename}.pdf",
+                    expires_in=current_app.config.get('SPACES_PDF_PRESIGNED_TTL', 300)
+                )
+                if presigned_url:
+                    return redirect(presigned_url)
             
-            def generate():
-                for chunk in response.iter_content(chunk_size=8192):
-                    yield chunk
-                    
+            cached = SpacesFileCache.get(key, apprentissage.get_pdf_url())
+            response = FileServingBackend.send(
+                cached.path,
+                mimetype='application/pdf',
+                download_name=f"{safe_filename}.pdf",
+                etag=cached.etag,
+                last_modified=cached.last_modified
+            )
         else:
             # Récupérer depuis fichier local
-            import os
-            pdf_path = os.path.join('app', 'static', 'uploads', 'apprentissages', apprentissage.fichier_pdf)
+            pdf_path = os.path.abspath(os.path.join('app', 'static', 'uploads', 'apprentissages', apprentissage.fichier_pdf))
             if not os.path.exists(pdf_path):
                 return "Fichier local non trouvé", 404
-                
-            print(f"💾 Serving local file: {pdf_path}")
             
-            def generate():
-                with open(pdf_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)
-                        if not chunk:
-                            break
-                        yield chunk
-        
-        print(f"✅ PDF proxy serving: {apprentissage.nom}")
-        
-        # Nettoyer le nom du fichier pour éviter les erreurs d'encodage
-        import re
-        safe_filename = re.sub(r'[^\w\s-]', '', apprentissage.nom).strip()
-        safe_filename = re.sub(r'[-\s]+', '-', safe_filename)
-        
-        return Response(
-            generate(),
-            content_type='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{safe_filename}.pdf"',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
+            response = FileServingBackend.send(
+                pdf_path,
+                mimetype='application/pdf',
+                download_name=f"{safe_filename}.pdf"
+            )
+        
+        # Annoncé dès la première réponse : PDF.js passe alors en chargement par plages
+        response.headers['Accept-Ranges'] = 'bytes'
+        
+        # Cache navigateur privé (contenu réservé aux abonnés), revalidé par ETag
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = current_app.config.get('PDF_CACHE_MAX_AGE', 3600)
+        return response
         
     except requests.RequestException as e:
         print(f"❌ PDF proxy error: {e}")
@@ -2550,10 +2678,22 @@ def calculate_credit_api():
                 'percentage_repaid': 0
             }
         
-        return jsonify({
+        response = {
             'success': True,
             'credit_details': credit_details
-        })
+        }
+        
+        # Tableau d'amortissement complet à la demande (moteur vectorisé)
+        if data.get('include_schedule') and data.get('date_debut'):
+            from app.services.credit_amortization_engine import CreditAmortizationEngine
+            response['schedule'] = CreditAmortizationEngine.schedule(
+                float(data['montant_initial']),
+                float(data['taux_interet']),
+                int(data['duree_mois']),
+                CreditCalculationService._parse_date(data['date_debut'])
+            ).to_list(iso_dates=True)
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({'error': f'Erreur de calcul: {str(e)}'}), 500
@@ -19,11 +19,11 @@ def update_crypto_prices():
         with current_app.app_context():
             print(f"🕐 Mise à jour crypto automatique (Binance) - {datetime.now().strftime('%H:%M:%S')}")
             
-            # Étape 1: Mettre à jour tous les prix crypto en base depuis Binance
+            # Étape 1: Un seul snapshot Binance pour tout le tick (enregistré en base)
             print(f"📊 Mise à jour des prix crypto en base...")
-            success = BinancePriceService.update_crypto_prices_in_db()
+            price_snapshot = BinancePriceService.refresh_price_snapshot()
             
-            if not success:
+            if not price_snapshot:
                 print(f"❌ Échec mise à jour prix Binance")
                 return
             
@@ -38,11 +38,12 @@ def update_crypto_prices():
             for user in users_with_crypto:
                 if user.investor_profile and user.investor_profile.cryptomonnaies_data:
                     try:
-                        # Recalculer et sauvegarder avec les nouveaux prix (forcer l'enrichissement pour la visualisation)
+                        # Recalculer et sauvegarder avec le snapshot du tick (pas de nouvel appel Binance)
                         PatrimoineCalculationService.calculate_all_totaux(
                             user.investor_profile, 
                             save_to_db=True,
-                            force_crypto_update=True  # Forcer la mise à jour pour enrichir les données
+                            force_crypto_update=True,  # Forcer l'enrichissement pour la visualisation
+                            price_snapshot=price_snapshot
                         )
                         updated_count += 1
                         
@@ -0,0 +1,141 @@
+"""
+Indicateurs du tableau de bord administrateur.
+Calculés en une seule requête d'agrégats SQL (utilisateurs, abonnements, patrimoine)
+et gardés en cache mémoire pendant un court TTL (ADMIN_STATS_CACHE_TTL).
+Le cache est propre à chaque worker : le cron de mise à jour des patrimoines tourne dans un autre
+process et ne peut pas le rafraîchir, les KPIs suivent donc les recalculs au plus un TTL plus tard.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from flask import current_app, has_app_context
+from sqlalchemy import case, func, select
+from app import db
+from app.models.investor_profile import InvestorProfile
+from app.models.subscription import Subscription
+from app.models.user import User
+
+
+class AdminDashboardStatsService:
+    """
+    Cache process-wide et thread-safe des KPIs du tableau de bord administrateur.
+    """
+    
+    DEFAULT_TTL_SECONDS = 60
+    
+    _lock = threading.Lock()
+    _stats = None
+    _computed_at = None  # time.monotonic() du dernier calcul
+    
+    @classmethod
+    def get_ttl(cls) -> int:
+        """TTL en secondes, configurable via ADMIN_STATS_CACHE_TTL."""
+        if has_app_context():
+            return int(current_app.config.get('ADMIN_STATS_CACHE_TTL', cls.DEFAULT_TTL_SECONDS))
+        return cls.DEFAULT_TTL_SECONDS
+    
+    @classmethod
+    def get_stats(cls) -> Dict:
+        """KPIs du tableau de bord (recalculés si le cache a expiré)."""
+        stats, computed_at = cls._stats, cls._computed_at
+        if stats is not None and time.monotonic() - computed_at <= cls.get_ttl():
+            return stats
+        return cls.refresh() or stats or cls._empty_stats()
+    
+    @classmethod
+    def refresh(cls) -> Optional[Dict]:
+        """
+        Recalcule les KPIs et remplace le cache.
+        
+        Returns:
+            Dict ou None en cas d'erreur (le cache précédent est conservé)
+        """
+        try:
+            stats = cls.compute()
+        except Exception as e:
+            print(f"❌ Erreur calcul statistiques admin: {e}")
+            db.session.rollback()
+            return None
+        
+        with cls._lock:
+            cls._stats = stats
+            cls._computed_at = time.monotonic()
+        return stats
+    
+    @classmethod
+    def compute(cls) -> Dict:
+        """
+        Calcule tous les KPIs en un seul aller-retour : un SELECT de trois sous-requêtes d'agrégats
+        (une par table), sans charger aucun objet ORM.
+        """
+        debut_mois = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        
+        def count_if(condition):
+            return func.count(case((condition, 1)))
+        
+        def sum_if(condition, value):
+            return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+        
+        is_client = db.and_(User.is_admin == False, User.is_prospect == False)
+        
+        users = select(
+            count_if(is_client).label('total_users'),
+            count_if(User.is_prospect == True).label('total_prospects'),
+            count_if(db.and_(is_client, User.date_created >= debut_mois)).label('nouveaux_ce_mois')
+        ).subquery()
+        
+        is_active = Subscription.status == 'active'
+        subscriptions = select(
+            count_if(is_active).label('active_subscriptions'),
+            sum_if(is_active, Subscription.price).label('real_mrr'),
+            count_if(db.and_(is_active, Subscription.tier == 'initia')).label('initia_subs'),
+            count_if(db.and_(is_active, Subscription.tier == 'optima')).label('optima_subs')
+        ).subquery()
+        
+        net = InvestorProfile.calculated_patrimoine_total_net
+        encours = (func.coalesce(InvestorProfile.calculated_total_placements, 0)
+                   + func.coalesce(InvestorProfile.calculated_total_cryptomonnaies, 0))
+        profiles = select(
+            func.count(InvestorProfile.id).label('completed_profiles'),
+            func.avg(case((net > 0, net))).label('avg_patrimoine'),
+            # Encours conseillés (placements + crypto) des vrais clients uniquement
+            sum_if(is_client, encours).label('total_encours')
+        ).select_from(InvestorProfile).outerjoin(User, InvestorProfile.user_id == User.id).subquery()
+        
+        # Trois sous-requêtes d'une ligne chacune, jointes sans condition
+        row = db.session.execute(
+            select(users, subscriptions, profiles).select_from(
+                users.join(subscriptions, db.true()).join(profiles, db.true())
+            )
+        ).mappings().one()
+        
+        return {
+            'total_users': int(row['total_users']),
+            'total_prospects': int(row['total_prospects']),
+            'active_subscriptions': int(row['active_subscriptions']),
+            'completed_profiles': int(row['completed_profiles']),
+            'real_mrr': float(row['real_mrr'] or 0),
+            'initia_subs': int(row['initia_subs']),
+            'optima_subs': int(row['optima_subs']),
+            'nouveaux_ce_mois': int(row['nouveaux_ce_mois']),
+            'avg_patrimoine': float(row['avg_patrimoine'] or 0),
+            'total_encours': float(row['total_encours'] or 0)
+        }
+    
+    @staticmethod
+    def _empty_stats() -> Dict:
+        """KPIs à zéro (base indisponible et aucun calcul précédent)."""
+        return {
+            'total_users': 0,
+            'total_prospects': 0,
+            'active_subscriptions': 0,
+            'completed_profiles': 0,
+            'real_mrr': 0.0,
+            'initia_subs': 0,
+            'optima_subs': 0,
+            'nouveaux_ce_mois': 0,
+            'avg_patrimoine': 0.0,
+            'total_encours': 0.0
+        }
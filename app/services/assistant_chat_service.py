@@ -0,0 +1,120 @@
+"""
+Service d'appel au modèle de chat de l'Assistant Atlas.
+Construit la requête (system prompt + contexte RAG) et relaie la réponse,
+en bloc ou en streaming (server-sent events) token par token.
+"""
+
+import json
+from typing import Dict, Any, Iterator, List
+import requests
+from flask import current_app, has_app_context
+from app.services.http_client import HttpClient
+
+
+class AssistantChatService:
+    """Service pour interroger l'API chat-completions avec le contexte Atlas."""
+    
+    DEFAULT_API_URL = 'https://api.openai.com/v1/chat/completions'
+    MODEL = 'gpt-4o-mini'
+    MAX_TOKENS = 1000
+    TEMPERATURE = 0.7
+    
+    # Délai de connexion / délai maximal entre deux chunks du flux (secondes)
+    STREAM_TIMEOUT = (5, 60)
+    
+    @classmethod
+    def get_api_url(cls) -> str:
+        """URL de l'API chat-completions, configurable via OPENAI_API_URL (ex: serveur de test local)."""
+        if has_app_context():
+            return current_app.config.get('OPENAI_API_URL') or cls.DEFAULT_API_URL
+        return cls.DEFAULT_API_URL
+    
+    @classmethod
+    def build_messages(cls, user_message: str, rag_service) -> List[Dict[str, str]]:
+        """
+        Construit les messages envoyés au modèle.
+        
+        Args:
+            user_message: Question du client
+            rag_service: Service RAG Atlas (system prompt et contexte)
+        
+        Returns:
+            List[Dict[str, str]]: Messages system + user (avec contexte RAG)
+        """
+        # Récupérer le system prompt depuis assistant_atlas.md
+        system_prompt = rag_service.get_system_prompt()
+        
+        # Rechercher le contexte pertinent dans la base de connaissance
+        context = rag_service.get_context_for_query(user_message, max_context_length=1500)
+        
+        # Construire le message utilisateur avec le contexte
+        user_message_with_context = user_message
+        if context:
+            user_message_with_context = f"{context}\n\nQUESTION CLIENT: {user_message}"
+        
+        return [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_message_with_context}
+        ]
+    
+    @classmethod
+    def build_payload(cls, messages: List[Dict[str, str]], stream: bool = False) -> Dict[str, Any]:
+        """Corps de la requête chat-completions."""
+        payload = {
+            'model': cls.MODEL,
+            'messages': messages,
+            'max_tokens': cls.MAX_TOKENS,
+            'temperature': cls.TEMPERATURE
+        }
+        if stream:
+            payload['stream'] = True
+        return payload
+    
+    @classmethod
+    def build_headers(cls, api_key: str) -> Dict[str, str]:
+        """En-têtes d'authentification de l'API."""
+        return {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+    
+    @classmethod
+    def open_stream(cls, messages: List[Dict[str, str]], api_key: str) -> requests.Response:
+        """
+        Ouvre la requête en streaming (le corps n'est pas encore lu).
+        
+        Returns:
+            requests.Response: Réponse à consommer avec iter_deltas puis fermer
+        """
+        return HttpClient.session().post(
+            cls.get_api_url(),
+            headers=cls.build_headers(api_key),
+            json=cls.build_payload(messages, stream=True),
+            stream=True,
+            timeout=cls.STREAM_TIMEOUT
+        )
+    
+    @classmethod
+    def iter_deltas(cls, response: requests.Response) -> Iterator[str]:
+        """
+        Lit le flux SSE de l'API ("data: {...}" puis "data: [DONE]") au fil de l'eau
+        et produit chaque fragment de texte dès sa réception.
+        """
+        for line in response.iter_lines(chunk_size=None):
+            if not line or not line.startswith(b'data:'):
+                continue
+            
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            
+            chunk = json.loads(data.decode('utf-8'))
+            for choice in chunk.get('choices', []):
+                content = (choice.get('delta') or {}).get('content')
+                if content:
+                    yield content
+    
+    @staticmethod
+    def format_sse(event: str, data: Dict[str, Any]) -> str:
+        """Formate un événement server-sent events."""
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -4,15 +4,130 @@ Gère l'indexation et la recherche sémantique dans la base de connaissance Atla
 """
 
 import os
-import glob
+import re
 import json
+import time
 import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from flask import current_app, has_app_context
+
+
+class RAGSearchResult:
+    """
+    Résultat de recherche léger : référence vers le chunk indexé (sans copie) et son score.
+    
+    Se lit comme le document (result['title'], result.get('folder'), result['relevance_score']) ;
+    to_dict() produit la copie sérialisable pour les réponses JSON.
+    """
+    
+    __slots__ = ('document', 'relevance_score')
+    
+    def __init__(self, document: Dict[str, Any], relevance_score: float):
+        self.document = document
+        self.relevance_score = relevance_score
+    
+    def __getitem__(self, key: str) -> Any:
+        if key == 'relevance_score':
+            return self.relevance_score
+        return self.document[key]
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'relevance_score':
+            return self.relevance_score
+        return self.document.get(key, default)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Copie du document avec son score de pertinence."""
+        result = dict(self.document)
+        result['relevance_score'] = self.relevance_score
+        return result
+
+
+class RAGQueryCache:
+    """
+    Cache LRU (propre au process) des contextes RAG déjà formatés.
+    
+    Clé : (version de l'index, requête normalisée, taille maximale du contexte).
+    Les entrées expirent après ttl secondes et la moins récemment utilisée est évincée
+    au-delà de max_size. Le cache est vidé à chaque mise à jour ou rechargement de l'index.
+    """
+    
+    DEFAULT_MAX_SIZE = 256
+    DEFAULT_TTL_SECONDS = 3600
+    
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.max_size = self.DEFAULT_MAX_SIZE if max_size is None else max_size
+        self.ttl = self.DEFAULT_TTL_SECONDS if ttl is None else ttl
+        self._entries = OrderedDict()  # {clé: (contexte, time.monotonic() d'insertion)}
+        self._lock = threading.Lock()
+        
+        # Statistiques affichées sur la page admin assistant-ia
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Normalise une requête (casse, ponctuation, espaces) : "C'est quoi un PEA ?" et
+        "c'est quoi un pea" partagent la même entrée, comme ils partagent les mêmes termes.
+        """
+        return ' '.join(re.findall(r'\w+', unicodedata.normalize('NFKC', query).lower()))
+    
+    def get(self, key: tuple) -> Optional[str]:
+        """Contexte en cache pour cette clé, ou None (absent ou expiré)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+    
+    def set(self, key: tuple, context: str):
+        """Mémorise un contexte et évince les entrées les moins récemment utilisées."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (context, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Invalide toutes les entrées (nouvelle version de l'index)."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache (propres à ce worker)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(100.0 * self.hits / total, 1) if total else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
 
 
 class AtlasRAGService:
@@ -21,21 +136,67 @@ class AtlasRAGService:
     
     Indexe et recherche dans les documents de la base de connaissance Atlas
     pour fournir un contexte pertinent aux réponses de l'IA.
+    
+    Les termes sont hachés (HashingVectorizer, pas de vocabulaire appris) : un fichier
+    modifié est re-vectorisé seul, ses lignes remplacent les anciennes et les poids IDF
+    sont recalculés à partir des fréquences documentaires stockées.
+    
+    L'index est persisté sans pickle dans app/cache/rag_index/ :
+    - counts_data.npy, counts_indices.npy, counts_indptr.npy : occurrences brutes par chunk (CSR)
+    - data.npy, indices.npy, indptr.npy : matrice TF-IDF normalisée (CSR), chargée en mémoire mappée
+      pour que tous les workers gunicorn partagent les mêmes pages
+    - df.npy, idf.npy : fréquences documentaires et poids IDF par colonne hachée
+    - documents.json : chunks indexés et leurs métadonnées
+    - meta.json : hash du contenu, fichiers indexés (ordre des lignes), paramètres et forme
+      de la matrice (écrit en dernier)
     """
     
+    INDEX_FORMAT_VERSION = 2
+    
+    # Paramètres du HashingVectorizer (sauvegardés avec l'index pour le recharger à l'identique)
+    VECTORIZER_PARAMS = {
+        'n_features': 2 ** 18,
+        'ngram_range': (1, 2),
+        'alternate_sign': False,
+        'norm': None  # Pondération IDF et normalisation L2 appliquées par le service
+    }
+    
+    # Seuil de pertinence minimum (similarité cosinus)
+    RELEVANCE_THRESHOLD = 0.1
+    
+    ARRAY_FILES = (
+        'counts_data', 'counts_indices', 'counts_indptr',
+        'data', 'indices', 'indptr',
+        'df', 'idf'
+    )
+    
     def __init__(self):
         self.knowledge_base_path = os.path.join(os.path.dirname(__file__), '..', 'Atlas-knowledge')
-        self.cache_path = os.path.join(os.path.dirname(__file__), '..', 'cache', 'rag_cache.pkl')
+        self.cache_path = os.path.join(os.path.dirname(__file__), '..', 'cache', 'rag_index')
         self.system_prompt_path = os.path.join(self.knowledge_base_path, '_system:', 'Assistant_atlas.md')
         
         # État de l'index
         self.documents = []
-        self.vectorizer = None
+        self.vectorizer = HashingVectorizer(**self.VECTORIZER_PARAMS)
+        self.term_counts = None  # Occurrences brutes (CSR), une ligne par chunk
+        self.document_frequency = None  # Nombre de chunks contenant chaque colonne
+        self.idf = None
         self.document_vectors = None
+        self.files = []  # [chemin relatif, nombre de chunks, hash] dans l'ordre des lignes
         self.index_hash = None
+        self._manifest = None  # Manifeste de l'index chargé ou sauvegardé : {chemin relatif: {mtime_ns, size, hash}}
+        
+        # Cache des contextes déjà calculés (taille et TTL configurables)
+        if has_app_context():
+            self.query_cache = RAGQueryCache(
+                max_size=current_app.config.get('RAG_QUERY_CACHE_SIZE'),
+                ttl=current_app.config.get('RAG_QUERY_CACHE_TTL')
+            )
+        else:
+            self.query_cache = RAGQueryCache()
         
         # Créer le dossier cache si nécessaire
-        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        os.makedirs(self.cache_path, exist_ok=True)
         
         # Charger ou créer l'index
         self._load_or_build_index()
@@ -69,6 +230,35 @@ class AtlasRAGService:
 Tu accompagnes des clients déjà abonnés à Atlas dans la compréhension de leur patrimoine et de leurs investissements.
 Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jamais de conseil personnalisé d'investissement."""
     
+    def _scan_markdown_files(self) -> Dict[str, tuple]:
+        """
+        Parcourt la base de connaissance avec os.scandir (sans lire les fichiers).
+        Le dossier _system est exclu du RAG.
+        
+        Returns:
+            Dict[str, tuple]: {chemin relatif: (mtime_ns, taille)}
+        """
+        files = {}
+        pending = [self.knowledge_base_path]
+        
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('_system'):
+                        pending.append(entry.path)
+                elif entry.name.endswith('.md') and entry.is_file():
+                    stat = entry.stat()
+                    relative_path = os.path.relpath(entry.path, self.knowledge_base_path)
+                    files[relative_path] = (stat.st_mtime_ns, stat.st_size)
+        
+        return files
+    
     def _get_markdown_files(self) -> List[str]:
         """
         Récupère tous les fichiers .md de la base de connaissance (sauf _system).
@@ -76,20 +266,10 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
         Returns:
             List[str]: Liste des chemins vers les fichiers markdown
         """
-        markdown_files = []
-        
-        # Exclure le dossier _system du RAG
-        exclude_patterns = ['_system:', '_system/', '_system\\']
-        
-        # Rechercher tous les fichiers .md
-        pattern = os.path.join(self.knowledge_base_path, '**', '*.md')
-        for file_path in glob.glob(pattern, recursive=True):
-            # Vérifier qu'on n'est pas dans _system
-            relative_path = os.path.relpath(file_path, self.knowledge_base_path)
-            if not any(exclude in relative_path for exclude in exclude_patterns):
-                markdown_files.append(file_path)
-        
-        return sorted(markdown_files)
+        return [
+            os.path.join(self.knowledge_base_path, relative_path)
+            for relative_path in sorted(self._scan_markdown_files())
+        ]
     
     def _extract_content(self, file_path: str) -> Dict[str, Any]:
         """
@@ -172,102 +352,382 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
         
         return chunks
     
-    def _calculate_content_hash(self) -> str:
+    @staticmethod
+    def _hash_file(file_path: str) -> Optional[str]:
+        """Hash MD5 du contenu d'un fichier (None s'il est illisible)."""
+        hasher = hashlib.md5()
+        try:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(65536), b''):
+                    hasher.update(block)
+        except OSError:
+            return None
+        return hasher.hexdigest()
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Charge le manifeste sauvegardé à côté de l'index."""
+        try:
+            with open(self._index_file('manifest.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _scan_manifest(self) -> tuple:
         """
-        Calcule un hash de tous les fichiers de la base de connaissance.
-        Utilisé pour détecter les changements.
+        Calcule le manifeste (chemin, mtime, taille, hash) actuel de la base de connaissance.
+        Seuls les fichiers nouveaux ou dont le mtime ou la taille ont changé depuis le manifeste
+        retenu sont relus et hashés. Le manifeste retenu n'est pas modifié (voir _commit_manifest).
         
         Returns:
-            str: Hash MD5 du contenu
+            tuple: (manifeste, True si au moins un fichier a été ajouté, modifié ou supprimé)
         """
-        hasher = hashlib.md5()
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
         
-        for file_path in self._get_markdown_files():
-            try:
-                with open(file_path, 'rb') as f:
-                    hasher.update(f.read())
-            except Exception:
+        previous = self._manifest
+        manifest = {}
+        changed = False
+        
+        for relative_path, (mtime_ns, size) in self._scan_markdown_files().items():
+            entry = previous.get(relative_path)
+            if entry and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+                manifest[relative_path] = entry
+                continue
+            
+            file_hash = self._hash_file(os.path.join(self.knowledge_base_path, relative_path))
+            if file_hash is None:
                 continue
+            if not entry or entry['hash'] != file_hash:
+                changed = True
+            manifest[relative_path] = {'mtime_ns': mtime_ns, 'size': size, 'hash': file_hash}
         
-        return hasher.hexdigest()
+        if set(manifest) != set(previous):
+            changed = True
+        
+        return manifest, changed
     
-    def _build_index(self):
+    def _commit_manifest(self, manifest: Dict[str, Dict[str, Any]]):
+        """
+        Retient le manifeste (en mémoire et dans manifest.json) une fois l'index correspondant
+        chargé ou sauvegardé : si la mise à jour échoue, le changement est encore détecté
+        à la requête suivante et la mise à jour est retentée.
         """
-        Construit l'index de recherche sémantique.
+        if manifest == self._manifest:
+            return
+        self._manifest = manifest
+        try:
+            self._write_json('manifest.json', manifest)
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la sauvegarde du manifeste RAG: {e}")
+    
+    def _calculate_content_hash(self, manifest: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
         """
-        print("🔄 Construction de l'index RAG Atlas...")
+        Calcule un hash de toute la base de connaissance à partir du manifeste.
+        Utilisé pour détecter les changements.
         
-        # Récolter tous les documents
-        self.documents = []
-        markdown_files = self._get_markdown_files()
+        Args:
+            manifest: Manifeste déjà calculé (sinon la base de connaissance est scannée)
+            
+        Returns:
+            str: Hash MD5 du contenu
+        """
+        if manifest is None:
+            manifest, _ = self._scan_manifest()
         
-        for file_path in markdown_files:
-            file_documents = self._extract_content(file_path)
-            self.documents.extend(file_documents)
+        hasher = hashlib.md5()
+        for relative_path in sorted(manifest):
+            hasher.update(f"{relative_path}:{manifest[relative_path]['hash']}\n".encode('utf-8'))
         
-        print(f"📚 {len(self.documents)} chunks indexés depuis {len(markdown_files)} fichiers")
+        return hasher.hexdigest()
+    
+    def refresh_if_changed(self) -> bool:
+        """
+        Vérification peu coûteuse (os.scandir + stat) à chaque requête : met à jour l'index
+        seulement si un fichier de la base de connaissance a changé.
         
-        if not self.documents:
-            print("⚠️ Aucun document trouvé pour l'indexation")
-            return
+        Si un autre worker a déjà sauvegardé l'index correspondant au contenu actuel,
+        il est simplement rechargé (mémoire mappée) au lieu d'être recalculé.
         
-        # Créer les vecteurs TF-IDF
-        texts = [doc['content'] for doc in self.documents]
+        Returns:
+            bool: True si l'index a été rechargé ou mis à jour
+        """
+        manifest, changed = self._scan_manifest()
+        if not changed:
+            # Seuls des mtime ont changé : retenir le manifeste pour ne pas re-hasher ces fichiers
+            self._commit_manifest(manifest)
+            return False
         
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words=None,  # Pas de stop words français dans scikit-learn de base
-            ngram_range=(1, 2),
-            min_df=1,
-            max_df=0.95
-        )
+        current_hash = self._calculate_content_hash(manifest)
+        if self._load_index() and self.index_hash == current_hash:
+            self._commit_manifest(manifest)
+            print("✅ Index RAG Atlas rechargé depuis le cache (mis à jour par un autre processus)")
+            return True
+        
+        print("🔄 Base de connaissance modifiée, mise à jour incrémentale de l'index...")
+        self._update_index(manifest=manifest)
+        return True
+    
+    def _indexed_files(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Position des lignes de chaque fichier indexé dans la matrice.
         
-        self.document_vectors = self.vectorizer.fit_transform(texts)
+        Returns:
+            Dict[str, Dict[str, Any]]: {chemin relatif: {'rows': (début, fin), 'hash': hash}}
+        """
+        indexed = {}
+        start = 0
+        for relative_path, row_count, file_hash in self.files:
+            indexed[relative_path] = {'rows': (start, start + row_count), 'hash': file_hash}
+            start += row_count
+        return indexed
+    
+    def _document_frequency(self, counts: sparse.csr_matrix) -> np.ndarray:
+        """Nombre de lignes (chunks) contenant chaque colonne hachée."""
+        return np.bincount(counts.indices, minlength=self.VECTORIZER_PARAMS['n_features']).astype(np.int64)
+    
+    @staticmethod
+    def _compute_idf(document_frequency: np.ndarray, n_documents: int) -> np.ndarray:
+        """IDF lissé, identique à celui de TfidfVectorizer(smooth_idf=True)."""
+        return np.log((1.0 + n_documents) / (1.0 + document_frequency)) + 1.0
+    
+    @staticmethod
+    def _weight(counts: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+        """Applique les poids IDF à des occurrences brutes puis normalise chaque ligne (L2)."""
+        weighted = sparse.csr_matrix(counts, dtype=np.float64, copy=True)
+        weighted.data *= idf[weighted.indices]
+        return normalize(weighted, norm='l2', copy=False)
+    
+    def _update_index(self, full: bool = False, manifest: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, int]:
+        """
+        Met à jour l'index de recherche sémantique.
         
-        # Calculer et sauvegarder le hash
-        self.index_hash = self._calculate_content_hash()
+        Seuls les fichiers nouveaux ou modifiés (hash du manifeste) sont relus et vectorisés :
+        les lignes des fichiers inchangés sont reprises telles quelles, celles des fichiers
+        modifiés ou supprimés sont retirées. Les fréquences documentaires sont ajustées
+        en conséquence, puis les poids IDF et la matrice TF-IDF sont recalculés à partir
+        des occurrences stockées (sans re-tokeniser le reste du corpus).
         
-        # Sauvegarder l'index
-        self._save_index()
+        Le manifeste n'est retenu qu'une fois l'index sauvegardé.
         
-        print("✅ Index RAG Atlas construit avec succès")
+        Args:
+            full (bool): Si True, re-vectorise toute la base de connaissance
+            manifest: Manifeste déjà calculé (sinon la base de connaissance est scannée)
+            
+        Returns:
+            Dict[str, int]: Nombre de fichiers re-vectorisés, repris et supprimés, et de chunks
+        """
+        print("🔄 Mise à jour de l'index RAG Atlas...")
+        
+        if manifest is None:
+            manifest, _ = self._scan_manifest()
+        incremental = not full and self.term_counts is not None and self.document_frequency is not None
+        previous = self._indexed_files() if incremental else {}
+        
+        if incremental:
+            document_frequency = np.array(self.document_frequency, dtype=np.int64)
+        else:
+            document_frequency = np.zeros(self.VECTORIZER_PARAMS['n_features'], dtype=np.int64)
+        
+        blocks = []
+        documents = []
+        files = []
+        stats = {'reindexed_files': 0, 'reused_files': 0, 'removed_files': 0}
+        
+        for relative_path in sorted(manifest):
+            file_hash = manifest[relative_path]['hash']
+            entry = previous.pop(relative_path, None)
+            
+            if entry:
+                start, stop = entry['rows']
+                if entry['hash'] == file_hash:
+                    # Fichier inchangé : reprendre ses lignes
+                    blocks.append(self.term_counts[start:stop])
+                    documents.extend(self.documents[start:stop])
+                    files.append([relative_path, stop - start, file_hash])
+                    stats['reused_files'] += 1
+                    continue
+                
+                # Fichier modifié : retirer ses anciennes lignes des fréquences documentaires
+                document_frequency -= self._document_frequency(self.term_counts[start:stop])
+            
+            file_documents = self._extract_content(os.path.join(self.knowledge_base_path, relative_path))
+            if file_documents:
+                counts = self.vectorizer.transform([doc['content'] for doc in file_documents]).tocsr()
+                document_frequency += self._document_frequency(counts)
+                blocks.append(counts)
+                documents.extend(file_documents)
+            files.append([relative_path, len(file_documents), file_hash])
+            stats['reindexed_files'] += 1
+        
+        # Fichiers supprimés de la base de connaissance
+        for entry in previous.values():
+            start, stop = entry['rows']
+            document_frequency -= self._document_frequency(self.term_counts[start:stop])
+            stats['removed_files'] += 1
+        
+        stats['chunks'] = len(documents)
+        print(
+            f"📚 {len(documents)} chunks indexés depuis {len(files)} fichiers "
+            f"({stats['reindexed_files']} vectorisés, {stats['reused_files']} repris, "
+            f"{stats['removed_files']} supprimés)"
+        )
+        
+        if not documents:
+            print("⚠️ Aucun document trouvé pour l'indexation")
+            self.documents = []
+            self.term_counts = None
+            self.document_frequency = None
+            self.idf = None
+            self.document_vectors = None
+            self.files = []
+            self.query_cache.clear()
+            self._commit_manifest(manifest)
+            return stats
+        
+        term_counts = sparse.vstack(blocks, format='csr')
+        idf = self._compute_idf(document_frequency, term_counts.shape[0])
+        
+        self.documents = documents
+        self.files = files
+        self.term_counts = term_counts
+        self.document_frequency = document_frequency
+        self.idf = idf
+        self.document_vectors = self._weight(term_counts, idf)
+        self.index_hash = self._calculate_content_hash(manifest)
+        self.query_cache.clear()
+        
+        # Sauvegarder l'index, puis seulement le manifeste
+        if not self._save_index():
+            return stats
+        self._commit_manifest(manifest)
+        
+        print("✅ Index RAG Atlas mis à jour avec succès")
+        return stats
+    
+    def _index_file(self, name: str) -> str:
+        """Chemin d'un fichier de l'index."""
+        return os.path.join(self.cache_path, name)
+    
+    def _write_atomic(self, name: str, write):
+        """Écrit un fichier de l'index via un fichier temporaire puis os.replace."""
+        final_path = self._index_file(name)
+        tmp_path = f"{final_path}.{os.getpid()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
     
-    def _save_index(self):
+    def _write_json(self, name: str, data):
+        """Écrit un fichier JSON de l'index."""
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        self._write_atomic(name, write)
+    
+    def _write_array(self, name: str, array: np.ndarray):
+        """Écrit un tableau NumPy au format .npy (mappable en mémoire)."""
+        def write(path):
+            with open(path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        self._write_atomic(f"{name}.npy", write)
+    
+    def _save_index(self) -> bool:
         """
-        Sauvegarde l'index dans un fichier cache.
+        Sauvegarde l'index (tableaux .npy + JSON), meta.json en dernier pour
+        qu'un index partiellement écrit ne soit jamais considéré comme valide.
+        
+        Returns:
+            bool: True si l'index a été sauvegardé
         """
         try:
-            cache_data = {
-                'documents': self.documents,
-                'vectorizer': self.vectorizer,
-                'document_vectors': self.document_vectors,
-                'index_hash': self.index_hash
+            counts = self.term_counts
+            matrix = self.document_vectors
+            arrays = {
+                'counts_data': counts.data,
+                'counts_indices': counts.indices,
+                'counts_indptr': counts.indptr,
+                'data': matrix.data,
+                'indices': matrix.indices,
+                'indptr': matrix.indptr,
+                'df': self.document_frequency,
+                'idf': self.idf
             }
+            for name, array in arrays.items():
+                self._write_array(name, array)
+            
+            self._write_json('documents.json', self.documents)
+            
+            params = dict(self.VECTORIZER_PARAMS)
+            params['ngram_range'] = list(params['ngram_range'])
+            self._write_json('meta.json', {
+                'format_version': self.INDEX_FORMAT_VERSION,
+                'index_hash': self.index_hash,
+                'shape': list(matrix.shape),
+                'files': self.files,
+                'vectorizer_params': params
+            })
+            return True
             
-            with open(self.cache_path, 'wb') as f:
-                pickle.dump(cache_data, f)
-                
         except Exception as e:
             print(f"⚠️ Erreur lors de la sauvegarde du cache RAG: {e}")
+            return False
     
     def _load_index(self) -> bool:
         """
-        Charge l'index depuis le cache si disponible.
+        Charge l'index depuis le cache si disponible (tableaux en mémoire mappée, sans pickle).
         
         Returns:
             bool: True si chargé avec succès, False sinon
         """
         try:
-            if not os.path.exists(self.cache_path):
+            meta_path = self._index_file('meta.json')
+            if not os.path.exists(meta_path):
+                return False
+            
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('format_version') != self.INDEX_FORMAT_VERSION:
+                return False
+            
+            params = dict(meta['vectorizer_params'])
+            params['ngram_range'] = tuple(params['ngram_range'])
+            if params != self.VECTORIZER_PARAMS:
                 return False
             
-            with open(self.cache_path, 'rb') as f:
-                cache_data = pickle.load(f)
+            arrays = {
+                name: np.load(self._index_file(f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+                for name in self.ARRAY_FILES
+            }
+            
+            with open(self._index_file('documents.json'), 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            
+            # Un index en cours de réécriture par un autre worker est ignoré
+            shape = tuple(meta['shape'])
+            if (len(documents) != shape[0] or sum(row_count for _, row_count, _ in meta['files']) != shape[0]
+                    or len(arrays['indptr']) != shape[0] + 1 or len(arrays['counts_indptr']) != shape[0] + 1):
+                return False
             
-            self.documents = cache_data['documents']
-            self.vectorizer = cache_data['vectorizer']
-            self.document_vectors = cache_data['document_vectors']
-            self.index_hash = cache_data['index_hash']
+            # Matrices construites directement sur les tableaux mappés (pas de copie)
+            self.term_counts = sparse.csr_matrix(
+                (arrays['counts_data'], arrays['counts_indices'], arrays['counts_indptr']),
+                shape=shape,
+                copy=False
+            )
+            self.document_vectors = sparse.csr_matrix(
+                (arrays['data'], arrays['indices'], arrays['indptr']),
+                shape=shape,
+                copy=False
+            )
+            self.document_frequency = arrays['df']
+            self.idf = arrays['idf']
+            self.documents = documents
+            self.files = meta['files']
+            if self.index_hash != meta['index_hash']:
+                self.query_cache.clear()
+            self.index_hash = meta['index_hash']
             
             return True
             
@@ -277,55 +737,69 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
     
     def _load_or_build_index(self):
         """
-        Charge l'index depuis le cache ou le reconstruit si nécessaire.
+        Charge l'index depuis le cache ou le met à jour si nécessaire.
         """
-        current_hash = self._calculate_content_hash()
+        manifest, _ = self._scan_manifest()
+        current_hash = self._calculate_content_hash(manifest)
         
         # Essayer de charger le cache
         if self._load_index():
             # Vérifier si le contenu a changé
             if self.index_hash == current_hash:
+                self._commit_manifest(manifest)
                 print("✅ Index RAG Atlas chargé depuis le cache")
                 return
             else:
-                print("🔄 Contenu modifié, reconstruction de l'index...")
+                print("🔄 Contenu modifié, mise à jour incrémentale de l'index...")
         
-        # Construire l'index
-        self._build_index()
+        # Construire ou mettre à jour l'index
+        self._update_index(manifest=manifest)
     
-    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    def search(self, query: str, max_results: int = 5) -> List[RAGSearchResult]:
         """
         Recherche les documents les plus pertinents pour une requête.
         
+        Les lignes de l'index et la requête sont normalisées (L2) : un produit scalaire creux
+        donne directement la similarité cosinus des seuls chunks partageant un terme avec la
+        requête. Le seuil est appliqué sur ces scores, puis argpartition sélectionne le top-k
+        sans trier tout le corpus.
+        
         Args:
             query (str): Requête de l'utilisateur
             max_results (int): Nombre maximum de résultats
             
         Returns:
-            List[Dict[str, Any]]: Liste des documents pertinents avec scores
+            List[RAGSearchResult]: Documents pertinents avec scores, du plus au moins pertinent
         """
-        if not self.vectorizer or self.document_vectors is None:
+        if self.document_vectors is None:
             print("⚠️ Index RAG non disponible")
             return []
         
         try:
-            # Vectoriser la requête
-            query_vector = self.vectorizer.transform([query])
+            # Vectoriser la requête (mêmes poids IDF et normalisation que les chunks)
+            query_vector = self._weight(self.vectorizer.transform([query]).tocsr(), self.idf)
             
-            # Calculer les similarités
-            similarities = cosine_similarity(query_vector, self.document_vectors).flatten()
+            # Similarités non nulles uniquement (matrice creuse n x 1)
+            similarities = (self.document_vectors @ query_vector.T).tocoo()
+            rows = similarities.row
+            scores = similarities.data
             
-            # Trier par pertinence
-            top_indices = similarities.argsort()[-max_results:][::-1]
+            # Seuil de pertinence avant toute sélection
+            relevant = scores > self.RELEVANCE_THRESHOLD
+            rows = rows[relevant]
+            scores = scores[relevant]
             
-            results = []
-            for idx in top_indices:
-                if similarities[idx] > 0.1:  # Seuil de pertinence minimum
-                    doc = self.documents[idx].copy()
-                    doc['relevance_score'] = similarities[idx]
-                    results.append(doc)
+            # Top-k partiel puis tri des seuls k retenus
+            if len(scores) > max_results > 0:
+                top = np.argpartition(-scores, max_results - 1)[:max_results]
+                rows = rows[top]
+                scores = scores[top]
+            order = np.lexsort((rows, -scores))[:max_results]
             
-            return results
+            return [
+                RAGSearchResult(self.documents[int(rows[index])], float(scores[index]))
+                for index in order
+            ]
             
         except Exception as e:
             print(f"❌ Erreur lors de la recherche RAG: {e}")
@@ -334,6 +808,7 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
     def get_context_for_query(self, query: str, max_context_length: int = 2000) -> str:
         """
         Récupère le contexte le plus pertinent pour une requête.
+        Les questions répétées sont servies par le cache LRU, sans vectorisation.
         
         Args:
             query (str): Requête de l'utilisateur
@@ -342,6 +817,18 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
         Returns:
             str: Contexte formaté pour l'IA
         """
+        if self.document_vectors is None:
+            return self._format_context(query, max_context_length)
+        
+        cache_key = (self.index_hash, RAGQueryCache.normalize_query(query), max_context_length)
+        context = self.query_cache.get(cache_key)
+        if context is None:
+            context = self._format_context(query, max_context_length)
+            self.query_cache.set(cache_key, context)
+        return context
+    
+    def _format_context(self, query: str, max_context_length: int) -> str:
+        """Recherche les chunks pertinents et les formate en contexte pour l'IA."""
         relevant_docs = self.search(query, max_results=3)
         
         if not relevant_docs:
@@ -365,15 +852,18 @@ Tu es un guide pédagogique, pas un robot-conseiller financier. Tu ne donnes jam
         
         return ""
     
-    def rebuild_index(self):
+    def rebuild_index(self, full: bool = False) -> Dict[str, int]:
         """
-        Force la reconstruction de l'index.
+        Force la mise à jour de l'index.
+        
+        Args:
+            full (bool): Si True, re-vectorise toute la base (sinon seuls les fichiers modifiés)
+            
+        Returns:
+            Dict[str, int]: Statistiques de la mise à jour
         """
-        print("🔄 Reconstruction forcée de l'index RAG...")
-        if os.path.exists(self.cache_path):
-            os.remove(self.cache_path)
-        self._build_index()
-
+        print(f"🔄 {'Reconstruction complète' if full else 'Mise à jour forcée'} de l'index RAG...")
+        return self._update_index(full=full)
 
 # Instance globale du service
 _rag_service = None
@@ -388,4 +878,7 @@ def get_atlas_rag_service() -> AtlasRAGService:
     global _rag_service
     if _rag_service is None:
         _rag_service = AtlasRAGService()
+    else:
+        # Ne relit que les fichiers dont le mtime ou la taille ont changé
+        _rag_service.refresh_if_changed()
     return _rag_service
\ No newline at end of file
@@ -4,10 +4,49 @@ Pas de CoinGecko, que du Binance pur.
 """
 
 import requests
+import threading
+from collections import Counter
 from typing import Dict, Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime
 from app import db
 from app.models.crypto_price import CryptoPrice
+from app.services.crypto_price_cache import CryptoPriceCache
+from app.services.crypto_price_history_service import CryptoPriceHistoryService
+from app.services.http_client import HttpClient
+
+
+class PriceSnapshot:
+    """
+    Photographie des prix crypto à un instant donné.
+    Construite une seule fois par tick et partagée par tous les calculs du batch.
+    """
+    
+    def __init__(self, prices: Dict[str, float], usd_to_eur: float, taken_at: Optional[datetime] = None):
+        self.prices = prices  # {symbol: price_eur}
+        self.usd_to_eur = usd_to_eur
+        self.taken_at = taken_at or datetime.utcnow()
+    
+    def __len__(self):
+        return len(self.prices)
+    
+    def __bool__(self):
+        return bool(self.prices)
+    
+    def __repr__(self):
+        return f'<PriceSnapshot {len(self.prices)} prix @ {self.taken_at.isoformat()}>'
+    
+    def get(self, symbol: str) -> Optional[float]:
+        """Prix EUR d'un symbole ou None s'il est absent du snapshot."""
+        return self.prices.get(symbol.lower())
+    
+    def prices_for_symbols(self, symbols: List[str]) -> Dict[str, float]:
+        """Retourne {symbol: price_eur} pour les symboles présents dans le snapshot."""
+        result = {}
+        for symbol in symbols:
+            price = self.get(symbol)
+            if price is not None:
+                result[symbol] = price
+        return result
 
 
 class BinancePriceService:
@@ -15,6 +54,10 @@ class BinancePriceService:
     Service centralisé pour la gestion des prix crypto via Binance UNIQUEMENT.
     """
     
+    # Compteur des appels HTTP sortants ('binance', 'fx') - utilisé par les tests
+    outbound_calls = Counter()
+    _outbound_calls_lock = threading.Lock()
+    
     BINANCE_API_URL = "https://api.binance.com/api/v3/ticker/price"
     EXCHANGE_RATE_API = "https://api.exchangerate-api.com/v4/latest/USD"
     
@@ -141,11 +184,24 @@ class BinancePriceService:
         'stacks': 'STXUSDT'
     }
     
+    @classmethod
+    def _record_outbound_call(cls, target: str):
+        """Incrémente le compteur d'appels sortants pour la cible donnée."""
+        with cls._outbound_calls_lock:
+            cls.outbound_calls[target] += 1
+    
+    @classmethod
+    def reset_outbound_calls(cls):
+        """Remet à zéro le compteur d'appels sortants."""
+        with cls._outbound_calls_lock:
+            cls.outbound_calls.clear()
+    
     @classmethod 
     def get_usd_to_eur_rate(cls) -> float:
         """Récupère le taux de change USD vers EUR en temps réel."""
         try:
-            response = requests.get(cls.EXCHANGE_RATE_API, timeout=5)
+            cls._record_outbound_call('fx')
+            response = HttpClient.session().get(cls.EXCHANGE_RATE_API, timeout=5)
             response.raise_for_status()
             data = response.json()
             return data['rates']['EUR']
@@ -154,19 +210,21 @@ class BinancePriceService:
             return 0.92  # Fallback
     
     @classmethod
-    def fetch_all_prices(cls) -> Dict[str, float]:
+    def fetch_price_snapshot(cls) -> Optional[PriceSnapshot]:
         """
         Récupère tous les prix depuis Binance et convertit en EUR.
+        Coûte exactement un appel Binance et un appel de taux de change.
         
         Returns:
-            Dict: {"bitcoin": 78525.0, "ethereum": 3600.0, ...}
+            PriceSnapshot ou None si l'API Binance est indisponible
         """
         try:
             # 1. Récupérer le taux USD/EUR
             usd_to_eur = cls.get_usd_to_eur_rate()
             
             # 2. Récupérer tous les prix Binance
-            response = requests.get(cls.BINANCE_API_URL, timeout=10)
+            cls._record_outbound_call('binance')
+            response = HttpClient.session().get(cls.BINANCE_API_URL, timeout=10)
             response.raise_for_status()
             binance_data = response.json()
             
@@ -177,70 +235,72 @@ class BinancePriceService:
             
             # 4. Convertir vers nos symboles avec prix EUR
             prices = {}
-            missing_pairs = []
             
             for crypto_symbol, binance_pair in cls.SYMBOL_TO_BINANCE.items():
                 if binance_pair in binance_prices:
-                    price_usd = binance_prices[binance_pair]
-                    price_eur = price_usd * usd_to_eur
-                    prices[crypto_symbol] = price_eur
-                else:
-                    missing_pairs.append(f"{crypto_symbol} -> {binance_pair}")
-            
+                    prices[crypto_symbol] = binance_prices[binance_pair] * usd_to_eur
             
-            return prices
+            return PriceSnapshot(prices, usd_to_eur)
             
         except requests.exceptions.RequestException as e:
             print(f"❌ Erreur API Binance: {e}")
-            return {}
+            return None
         except Exception as e:
             print(f"❌ Erreur parsing Binance: {e}")
-            return {}
+            return None
     
     @classmethod
-    def update_crypto_prices_in_db(cls) -> bool:
+    def fetch_all_prices(cls) -> Dict[str, float]:
+        """
+        Récupère tous les prix depuis Binance et convertit en EUR.
+        
+        Returns:
+            Dict: {"bitcoin": 78525.0, "ethereum": 3600.0, ...}
+        """
+        snapshot = cls.fetch_price_snapshot()
+        return snapshot.prices if snapshot else {}
+    
+    @classmethod
+    def update_crypto_prices_in_db(cls, snapshot: Optional[PriceSnapshot] = None) -> bool:
         """
         Met à jour tous les prix crypto en base depuis Binance.
         
+        Args:
+            snapshot: Snapshot déjà récupéré (sinon un nouveau est demandé à Binance)
+            
         Returns:
             bool: True si succès, False sinon
         """
         try:
             # Récupérer les prix depuis Binance
-            binance_prices = cls.fetch_all_prices()
+            if snapshot is None:
+                snapshot = cls.fetch_price_snapshot()
             
-            if not binance_prices:
+            if not snapshot:
                 print("⚠️ Aucun prix récupéré de Binance")
                 return False
             
-            # Mettre à jour chaque crypto supportée
-            updated_count = 0
-            now = datetime.utcnow()
+            # Préparer toutes les lignes (conversion EUR->USD avec le taux du snapshot, sans appel API)
+            now = snapshot.taken_at
+            rows = [
+                {
+                    'symbol': crypto_symbol,
+                    'price_usd': price_eur / snapshot.usd_to_eur,
+                    'price_eur': price_eur,
+                    'updated_at': now,
+                    'created_at': now
+                }
+                for crypto_symbol, price_eur in snapshot.prices.items()
+            ]
+            
+            # Un seul INSERT ... ON CONFLICT pour toutes les cryptos supportées
+            cls._bulk_upsert_prices(rows)
             
-            for crypto_symbol in cls.SYMBOL_TO_BINANCE.keys():
-                if crypto_symbol in binance_prices:
-                    price_eur = binance_prices[crypto_symbol]
-                    price_usd = price_eur / cls.get_usd_to_eur_rate()  # Conversion EUR->USD
-                    
-                    # Créer ou mettre à jour l'enregistrement
-                    crypto_price = CryptoPrice.query.filter_by(symbol=crypto_symbol).first()
-                    
-                    if crypto_price:
-                        crypto_price.price_usd = price_usd
-                        crypto_price.price_eur = price_eur
-                        crypto_price.updated_at = now
-                    else:
-                        crypto_price = CryptoPrice(
-                            symbol=crypto_symbol,
-                            price_usd=price_usd,
-                            price_eur=price_eur,
-                            updated_at=now
-                        )
-                        db.session.add(crypto_price)
-                    
-                    updated_count += 1
+            # Historique : une ligne par refresh, dans la même transaction
+            CryptoPriceHistoryService.record(snapshot.prices, snapshot.usd_to_eur, now)
             
             db.session.commit()
+            CryptoPriceCache.store(rows)
             return True
             
         except Exception as e:
@@ -248,10 +308,96 @@ class BinancePriceService:
             db.session.rollback()
             return False
     
+    @classmethod
+    def _bulk_upsert_prices(cls, rows: List[Dict]):
+        """
+        Insère ou met à jour les prix en une seule requête.
+        PostgreSQL et SQLite utilisent INSERT ... ON CONFLICT (symbol) DO UPDATE,
+        les autres moteurs une lecture groupée suivie d'un merge en session.
+        
+        Args:
+            rows: Lignes {symbol, price_usd, price_eur, updated_at, created_at}
+        """
+        if not rows:
+            return
+        
+        dialect = db.engine.dialect.name
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            
+            stmt = insert(CryptoPrice.__table__).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CryptoPrice.__table__.c.symbol],
+                set_={
+                    'price_usd': stmt.excluded.price_usd,
+                    'price_eur': stmt.excluded.price_eur,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+            return
+        
+        # Fallback générique : un seul SELECT pour toutes les lignes existantes
+        existing = {
+            crypto_price.symbol: crypto_price
+            for crypto_price in CryptoPrice.query.filter(
+                CryptoPrice.symbol.in_([row['symbol'] for row in rows])
+            ).all()
+        }
+        for row in rows:
+            crypto_price = existing.get(row['symbol'])
+            if crypto_price:
+                crypto_price.price_usd = row['price_usd']
+                crypto_price.price_eur = row['price_eur']
+                crypto_price.updated_at = row['updated_at']
+            else:
+                db.session.add(CryptoPrice(**row))
+    
+    @classmethod
+    def refresh_price_snapshot(cls) -> Optional[PriceSnapshot]:
+        """
+        Récupère un snapshot depuis Binance et l'enregistre en base.
+        Point d'entrée d'un tick du scheduler : le snapshot retourné est ensuite
+        passé aux services de calcul pour éviter tout nouvel appel API.
+        
+        Returns:
+            PriceSnapshot ou None en cas d'échec
+        """
+        snapshot = cls.fetch_price_snapshot()
+        
+        if not snapshot or not cls.update_crypto_prices_in_db(snapshot):
+            return None
+        
+        return snapshot
+    
+    @classmethod
+    def snapshot_from_cache(cls) -> PriceSnapshot:
+        """
+        Construit un snapshot à partir des prix déjà en base (via le cache), sans appel API.
+        Le taux USD/EUR est déduit des prix stockés.
+        
+        Returns:
+            PriceSnapshot (éventuellement vide si aucun prix en base)
+        """
+        prices = {}
+        usd_to_eur = None
+        
+        for symbol in CryptoPriceCache.get_prices():
+            price_eur, price_usd, _ = CryptoPriceCache.get_entry(symbol)
+            prices[symbol] = price_eur
+            if usd_to_eur is None and price_usd:
+                usd_to_eur = price_eur / price_usd
+        
+        return PriceSnapshot(prices, usd_to_eur or 0.92, CryptoPriceCache.latest_update())
+    
     @classmethod
     def get_crypto_price_from_db(cls, symbol: str, max_age_minutes: int = 5) -> Optional[float]:
         """
-        Récupère le prix d'une crypto depuis la base de données.
+        Récupère le prix d'une crypto depuis le cache des prix (alimenté par la base).
         
         Args:
             symbol: Symbole de la crypto (ex: 'bitcoin', 'ethereum')
@@ -261,46 +407,30 @@ class BinancePriceService:
             float: Prix en EUR ou None si pas trouvé/trop ancien
         """
         try:
-            # Normaliser le symbole
-            symbol = symbol.lower()
-            
-            # Protection contre les erreurs de session DB en cours
-            from sqlalchemy.exc import InvalidRequestError, PendingRollbackError
-            try:
-                crypto_price = CryptoPrice.query.filter_by(symbol=symbol).first()
-            except (InvalidRequestError, PendingRollbackError):
-                # Session DB corrompue, ne pas essayer de lire
-                return None
-            
-            if not crypto_price:
-                return None
-            
-            # Vérifier l'âge des données
-            max_age = timedelta(minutes=max_age_minutes)
-            age = datetime.utcnow() - crypto_price.updated_at
-            
-            if age > max_age:
-                # Prix trop ancien (silencieux pendant les erreurs DB)
-                return None
-            
-            return crypto_price.price_eur
+            # Le cache gère lui-même les erreurs de session DB (ancien contenu conservé)
+            return CryptoPriceCache.get_price(symbol, max_age_minutes=max_age_minutes)
             
         except Exception as e:
             # Suppression du log pour éviter le spam pendant les erreurs DB
             return None
     
     @classmethod
-    def get_crypto_prices_for_symbols(cls, symbols: List[str], force_update: bool = False) -> Dict[str, float]:
+    def get_crypto_prices_for_symbols(cls, symbols: List[str], force_update: bool = False,
+                                      snapshot: Optional[PriceSnapshot] = None) -> Dict[str, float]:
         """
         Récupère les prix pour une liste de symboles crypto.
         
         Args:
             symbols: Liste des symboles crypto
             force_update: Force la mise à jour depuis l'API
+            snapshot: Snapshot partagé du tick en cours (prioritaire, aucun appel API ni DB)
             
         Returns:
             Dict: {symbol: price_eur}
         """
+        if snapshot is not None:
+            return snapshot.prices_for_symbols(symbols)
+        
         result = {}
         
         # Si force_update, mettre à jour tous les prix
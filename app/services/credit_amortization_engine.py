@@ -0,0 +1,239 @@
+"""
+Moteur d'amortissement vectorisé (NumPy) pour les crédits et prêts immobiliers.
+Calcule mensualités, capital restant dû et tableaux d'amortissement de nombreux prêts d'un coup,
+avec les mêmes formules que CreditCalculationService.
+"""
+
+import numpy as np
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.credit_calculation import CreditCalculationService
+
+
+# Conditions d'un prêt : (capital, taux annuel %, durée en mois, date de début)
+LoanTerms = Tuple[float, float, int, date]
+
+
+class AmortizationSchedule:
+    """
+    Tableau d'amortissement stocké en colonnes NumPy.
+    La colonne des dates n'est construite qu'à la première lecture.
+    """
+    
+    def __init__(self, start_date: date, monthly_payment: float, interest: np.ndarray,
+                 capital: np.ndarray, remaining: np.ndarray):
+        self.start_date = start_date
+        self.monthly_payment = monthly_payment
+        self.interest = interest
+        self.capital = capital
+        self.remaining = remaining
+        self._dates = None
+    
+    def __len__(self):
+        return len(self.remaining)
+    
+    @property
+    def months(self) -> np.ndarray:
+        """Numéros d'échéance (1..n)."""
+        return np.arange(1, len(self) + 1)
+    
+    @property
+    def dates(self) -> List[date]:
+        """Dates des échéances (calculées à la demande puis mémorisées)."""
+        if self._dates is None:
+            self._dates = [
+                CreditCalculationService._add_months(self.start_date, month)
+                for month in range(len(self))
+            ]
+        return self._dates
+    
+    def to_list(self, iso_dates: bool = False) -> List[Dict]:
+        """
+        Format historique de CreditCalculationService.calculate_amortization_schedule.
+        
+        Args:
+            iso_dates: Si True, dates au format 'YYYY-MM-DD' (réponses JSON)
+        """
+        monthly_payment = round(self.monthly_payment, 2)
+        dates = [d.isoformat() for d in self.dates] if iso_dates else self.dates
+        return [
+            {
+                'month': index + 1,
+                'date': dates[index],
+                'monthly_payment': monthly_payment,
+                'interest_payment': round(float(self.interest[index]), 2),
+                'capital_payment': round(float(self.capital[index]), 2),
+                'remaining_capital': round(float(self.remaining[index]), 2)
+            }
+            for index in range(len(self))
+        ]
+
+
+class CreditAmortizationEngine:
+    """
+    Calculs de crédit vectorisés : une opération NumPy pour tous les prêts à la fois.
+    """
+    
+    @staticmethod
+    def _as_arrays(principals, annual_rates, durations):
+        """Convertit les entrées en tableaux float64/int64."""
+        return (
+            np.asarray(principals, dtype=np.float64),
+            np.asarray(annual_rates, dtype=np.float64),
+            np.asarray(durations, dtype=np.int64)
+        )
+    
+    @classmethod
+    def monthly_payments(cls, principals, annual_rates, durations) -> np.ndarray:
+        """
+        Mensualités de plusieurs prêts (mêmes règles que calculate_monthly_payment).
+        
+        Args:
+            principals: Montants empruntés
+            annual_rates: Taux annuels en %
+            durations: Durées en mois
+        
+        Returns:
+            np.ndarray: Mensualités (arrondies au centime si taux > 0)
+        """
+        principals, annual_rates, durations = cls._as_arrays(principals, annual_rates, durations)
+        monthly_rates = annual_rates / 100 / 12
+        safe_durations = np.maximum(durations, 1)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.power(1 + monthly_rates, safe_durations)
+            amortized = np.round(principals * monthly_rates * growth / (growth - 1), 2)
+        
+        payments = np.where(monthly_rates == 0, principals / safe_durations, amortized)
+        invalid = (principals <= 0) | (annual_rates < 0) | (durations <= 0)
+        return np.where(invalid, 0.0, payments)
+    
+    @classmethod
+    def remaining_capitals(cls, principals, annual_rates, durations, start_dates: Iterable[date],
+                           current_date: Optional[date] = None) -> np.ndarray:
+        """
+        Capital restant dû de plusieurs prêts (mêmes règles que calculate_remaining_capital).
+        
+        Args:
+            principals: Montants empruntés
+            annual_rates: Taux annuels en %
+            durations: Durées en mois
+            start_dates: Dates de début
+            current_date: Date de calcul (défaut: aujourd'hui)
+        
+        Returns:
+            np.ndarray: Capital restant dû (non arrondi, voir remaining_capital_lookup)
+        """
+        if current_date is None:
+            current_date = date.today()
+        
+        principals, annual_rates, durations = cls._as_arrays(principals, annual_rates, durations)
+        start_dates = list(start_dates)
+        start_months = np.array([d.year * 12 + d.month for d in start_dates], dtype=np.int64)
+        not_started = np.array([d > current_date for d in start_dates], dtype=bool)
+        
+        # Même convention que _calculate_months_elapsed : le mois de départ compte
+        months_elapsed = (current_date.year * 12 + current_date.month) - start_months + 1
+        monthly_rates = annual_rates / 100 / 12
+        safe_durations = np.maximum(durations, 1)
+        
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            growth_total = np.power(1 + monthly_rates, durations)
+            growth_elapsed = np.power(1 + monthly_rates, months_elapsed)
+            amortized = principals * (growth_total - growth_elapsed) / (growth_total - 1)
+        
+        linear = principals - (principals / safe_durations) * months_elapsed
+        remaining = np.maximum(0, np.where(monthly_rates == 0, linear, amortized))
+        remaining = np.where(months_elapsed >= durations, 0.0, remaining)
+        remaining = np.where(not_started, principals, remaining)
+        return np.where(principals <= 0, 0.0, remaining)
+    
+    @classmethod
+    def remaining_capital_lookup(cls, loans: Iterable[LoanTerms],
+                                 current_date: Optional[date] = None) -> Dict[LoanTerms, float]:
+        """
+        API batch : capital restant dû pour tous les prêts fournis, en un seul calcul.
+        Les valeurs sont arrondies comme calculate_remaining_capital.
+        
+        Args:
+            loans: Conditions de prêt (capital, taux, durée en mois, date de début),
+                   typiquement tous les crédits et prêts immobiliers de plusieurs profils
+            current_date: Date de calcul (défaut: aujourd'hui)
+        
+        Returns:
+            Dict: {conditions du prêt: capital restant dû}
+        """
+        unique_loans = list(dict.fromkeys(loans))
+        if not unique_loans:
+            return {}
+        
+        principals, annual_rates, durations, start_dates = zip(*unique_loans)
+        remaining = cls.remaining_capitals(principals, annual_rates, durations, start_dates, current_date)
+        
+        # Le scalaire retourne le capital initial tel quel si le prêt n'a pas commencé
+        return {
+            loan: value if value == loan[0] else round(value, 2)
+            for loan, value in zip(unique_loans, remaining.tolist())
+        }
+    
+    @classmethod
+    def schedules(cls, loans: List[LoanTerms]) -> List[AmortizationSchedule]:
+        """
+        Tableaux d'amortissement de plusieurs prêts calculés ensemble (matrice prêts x mois).
+        
+        Args:
+            loans: Conditions de prêt (capital, taux, durée en mois, date de début)
+        
+        Returns:
+            List[AmortizationSchedule]: Un tableau par prêt, dans l'ordre d'entrée
+        """
+        if not loans:
+            return []
+        
+        principals, annual_rates, durations, start_dates = zip(*loans)
+        payments = cls.monthly_payments(principals, annual_rates, durations)
+        principals, annual_rates, durations = cls._as_arrays(principals, annual_rates, durations)
+        monthly_rates = annual_rates / 100 / 12
+        
+        max_duration = int(max(durations.max(), 0))
+        months = np.arange(0, max_duration + 1, dtype=np.float64)
+        
+        # Capital restant après k échéances : P(1+r)^k - M((1+r)^k - 1)/r  (linéaire si r = 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.power((1 + monthly_rates)[:, None], months[None, :])
+            compounded = (principals[:, None] * growth
+                          - payments[:, None] * (growth - 1) / monthly_rates[:, None])
+        linear = principals[:, None] - payments[:, None] * months[None, :]
+        balances = np.where((monthly_rates == 0)[:, None], linear, compounded)
+        
+        interest = balances[:, :-1] * monthly_rates[:, None]
+        capital = payments[:, None] - interest
+        remaining = balances[:, 1:]
+        
+        result = []
+        for index, start_date in enumerate(start_dates):
+            duration = max(int(durations[index]), 0)
+            row_interest = interest[index, :duration].copy()
+            row_capital = capital[index, :duration].copy()
+            row_remaining = remaining[index, :duration].copy()
+            
+            # Comme le calcul itératif : la première échéance qui solde le prêt clôt le tableau
+            paid_off = np.flatnonzero(row_remaining <= 0)
+            if paid_off.size:
+                last = int(paid_off[0])
+                row_capital[last] += row_remaining[last]
+                row_remaining[last] = 0.0
+                row_interest = row_interest[:last + 1]
+                row_capital = row_capital[:last + 1]
+                row_remaining = row_remaining[:last + 1]
+            
+            result.append(AmortizationSchedule(
+                start_date, float(payments[index]), row_interest, row_capital, row_remaining
+            ))
+        return result
+    
+    @classmethod
+    def schedule(cls, principal: float, annual_rate: float, duration_months: int,
+                 start_date: date) -> AmortizationSchedule:
+        """Tableau d'amortissement d'un seul prêt."""
+        return cls.schedules([(principal, annual_rate, duration_months, start_date)])[0]
@@ -110,39 +110,10 @@ class CreditCalculationService:
         Returns:
             List[Dict]: Liste des échéances avec détail amortissement/intérêts
         """
-        schedule = []
-        monthly_payment = CreditCalculationService.calculate_monthly_payment(principal, annual_rate, duration_months)
-        monthly_rate = annual_rate / 100 / 12
-        remaining_capital = principal
-        
-        for month in range(1, duration_months + 1):
-            # Calcul des intérêts du mois
-            interest_payment = remaining_capital * monthly_rate
-            
-            # Calcul de l'amortissement du capital
-            capital_payment = monthly_payment - interest_payment
-            
-            # Nouveau capital restant
-            remaining_capital -= capital_payment
-            
-            # Protection contre les valeurs négatives dues aux arrondis
-            if remaining_capital < 0:
-                capital_payment += remaining_capital
-                remaining_capital = 0
-            
-            schedule.append({
-                'month': month,
-                'date': CreditCalculationService._add_months(start_date, month - 1),
-                'monthly_payment': round(monthly_payment, 2),
-                'interest_payment': round(interest_payment, 2),
-                'capital_payment': round(capital_payment, 2),
-                'remaining_capital': round(remaining_capital, 2)
-            })
-            
-            if remaining_capital <= 0:
-                break
+        # Calcul vectorisé (NumPy) : mêmes formules que le calcul mois par mois, en forme fermée
+        from app.services.credit_amortization_engine import CreditAmortizationEngine
         
-        return schedule
+        return CreditAmortizationEngine.schedule(principal, annual_rate, duration_months, start_date).to_list()
     
     @staticmethod
     def calculate_credit_details(principal: float, annual_rate: float, duration_months: int, 
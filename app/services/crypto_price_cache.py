@@ -0,0 +1,160 @@
+"""
+Cache mémoire des prix crypto partagé par tout le process.
+Chargé en une seule requête depuis la table crypto_prices et rafraîchi après expiration du TTL.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from flask import current_app, has_app_context
+from app import db
+from app.models.crypto_price import CryptoPrice
+
+
+class CryptoPriceCache:
+    """
+    Cache process-wide et thread-safe des prix crypto, indexé par symbole.
+    Chaque entrée contient (price_eur, price_usd, updated_at).
+    """
+    
+    DEFAULT_TTL_SECONDS = 60
+    
+    _lock = threading.RLock()
+    _entries = {}  # {symbol: (price_eur, price_usd, updated_at)}
+    _loaded_at = None  # time.monotonic() du dernier chargement
+    
+    # Statistiques (utile pour vérifier qu'un cache chaud ne fait aucune requête)
+    db_loads = 0
+    
+    @classmethod
+    def get_ttl(cls) -> int:
+        """TTL en secondes, configurable via CRYPTO_PRICE_CACHE_TTL."""
+        if has_app_context():
+            return int(current_app.config.get('CRYPTO_PRICE_CACHE_TTL', cls.DEFAULT_TTL_SECONDS))
+        return cls.DEFAULT_TTL_SECONDS
+    
+    @classmethod
+    def is_expired(cls) -> bool:
+        """True si le cache n'a jamais été chargé ou si son TTL est dépassé."""
+        if cls._loaded_at is None:
+            return True
+        return time.monotonic() - cls._loaded_at > cls.get_ttl()
+    
+    @classmethod
+    def load(cls) -> bool:
+        """
+        Recharge tout le cache avec un seul SELECT sur crypto_prices.
+        
+        Returns:
+            bool: True si succès, False sinon (le cache précédent est conservé)
+        """
+        try:
+            rows = db.session.query(
+                CryptoPrice.symbol,
+                CryptoPrice.price_eur,
+                CryptoPrice.price_usd,
+                CryptoPrice.updated_at
+            ).all()
+        except Exception as e:
+            print(f"⚠️ Erreur chargement cache prix crypto: {e}")
+            return False
+        
+        with cls._lock:
+            cls._entries = {
+                symbol: (price_eur, price_usd, updated_at)
+                for symbol, price_eur, price_usd, updated_at in rows
+            }
+            cls._loaded_at = time.monotonic()
+            cls.db_loads += 1
+        return True
+    
+    @classmethod
+    def _ensure_loaded(cls):
+        """Recharge le cache si nécessaire (double vérification sous verrou)."""
+        if not cls.is_expired():
+            return
+        with cls._lock:
+            if cls.is_expired():
+                cls.load()
+    
+    @classmethod
+    def get_entry(cls, symbol: str) -> Optional[tuple]:
+        """
+        Retourne (price_eur, price_usd, updated_at) pour un symbole.
+        
+        Args:
+            symbol: Symbole crypto (ex: 'bitcoin', 'btc')
+        
+        Returns:
+            tuple ou None si le symbole est inconnu
+        """
+        cls._ensure_loaded()
+        return cls._entries.get(symbol.lower())
+    
+    @classmethod
+    def get_price(cls, symbol: str, max_age_minutes: Optional[int] = None) -> Optional[float]:
+        """
+        Retourne le prix EUR d'un symbole.
+        
+        Args:
+            symbol: Symbole crypto
+            max_age_minutes: Âge max du prix (None = pas de limite)
+        
+        Returns:
+            Prix EUR ou None si absent/trop ancien
+        """
+        entry = cls.get_entry(symbol)
+        if entry is None:
+            return None
+        
+        price_eur, _, updated_at = entry
+        if max_age_minutes is not None and updated_at is not None:
+            age_seconds = (datetime.utcnow() - updated_at).total_seconds()
+            if age_seconds > max_age_minutes * 60:
+                return None
+        return price_eur
+    
+    @classmethod
+    def get_prices(cls, symbols: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        Retourne {symbol: price_eur} pour les symboles demandés (tous si None).
+        """
+        cls._ensure_loaded()
+        entries = cls._entries
+        if symbols is None:
+            return {symbol: entry[0] for symbol, entry in entries.items()}
+        
+        prices = {}
+        for symbol in symbols:
+            entry = entries.get(symbol.lower())
+            if entry is not None:
+                prices[symbol] = entry[0]
+        return prices
+    
+    @classmethod
+    def latest_update(cls) -> Optional[datetime]:
+        """Date de mise à jour la plus récente parmi les prix en cache."""
+        cls._ensure_loaded()
+        dates = [entry[2] for entry in cls._entries.values() if entry[2] is not None]
+        return max(dates) if dates else None
+    
+    @classmethod
+    def store(cls, rows: List[Dict]):
+        """
+        Met à jour le cache après une écriture en base (sans relire la table).
+        
+        Args:
+            rows: Lignes {symbol, price_eur, price_usd, updated_at}
+        """
+        with cls._lock:
+            entries = dict(cls._entries)
+            for row in rows:
+                entries[row['symbol']] = (row['price_eur'], row['price_usd'], row['updated_at'])
+            cls._entries = entries
+    
+    @classmethod
+    def invalidate(cls):
+        """Force un rechargement depuis la base à la prochaine lecture."""
+        with cls._lock:
+            cls._loaded_at = None
@@ -0,0 +1,223 @@
+"""
+Service de l'historique des prix crypto.
+Enregistre une ligne par refresh (depuis BinancePriceService.update_crypto_prices_in_db)
+et fournit des séries sous-échantillonnées (1h, 1d, 1w) pour les graphiques de tendance,
+ainsi que la valeur d'un portefeuille crypto dans le temps, calculée en une passe numpy.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app import db
+from app.models.crypto_price_history import CryptoPriceHistory
+
+
+class CryptoPriceHistoryService:
+    """
+    Lecture et écriture de l'historique des prix crypto.
+    """
+    
+    # Pas de sous-échantillonnage supportés (secondes)
+    INTERVALS = {
+        '1h': 3600,
+        '1d': 86400,
+        '1w': 7 * 86400
+    }
+    
+    # Les semaines commencent le lundi (le 01/01/1970 était un jeudi)
+    WEEK_OFFSET_SECONDS = 4 * 86400
+    
+    DEFAULT_PERIOD = timedelta(days=30)
+    
+    @classmethod
+    def record(cls, prices: Dict[str, float], usd_to_eur: float, recorded_at: datetime) -> Optional[CryptoPriceHistory]:
+        """
+        Ajoute une ligne d'historique à la session (le commit est fait par l'appelant,
+        dans la même transaction que la mise à jour des derniers prix).
+        
+        Args:
+            prices: Prix EUR par symbole
+            usd_to_eur: Taux de change du snapshot
+            recorded_at: Date du snapshot
+        
+        Returns:
+            CryptoPriceHistory ajoutée ou None si aucun prix
+        """
+        if not prices:
+            return None
+        entry = CryptoPriceHistory.from_prices(prices, usd_to_eur, recorded_at)
+        db.session.add(entry)
+        return entry
+    
+    @classmethod
+    def load_matrix(cls, symbols: List[str], start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Charge les prix d'une liste de symboles sur une période.
+        
+        Args:
+            symbols: Symboles voulus (colonnes de la matrice)
+            start: Début de la période (inclus)
+            end: Fin de la période (incluse)
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (timestamps en secondes epoch, matrice (n_lignes, n_symboles)
+            des prix EUR, NaN quand un symbole est absent d'une ligne)
+        """
+        rows = db.session.query(
+            CryptoPriceHistory.recorded_at,
+            CryptoPriceHistory.symbols,
+            CryptoPriceHistory.prices_eur
+        ).filter(
+            CryptoPriceHistory.recorded_at >= start,
+            CryptoPriceHistory.recorded_at <= end
+        ).order_by(CryptoPriceHistory.recorded_at).all()
+        
+        timestamps = np.empty(len(rows), dtype=np.int64)
+        matrix = np.full((len(rows), len(symbols)), np.nan)
+        wanted = {symbol: column for column, symbol in enumerate(symbols)}
+        
+        # La liste de symboles change rarement d'un refresh à l'autre : correspondance calculée une fois par liste
+        layouts = {}
+        for i, (recorded_at, row_symbols, packed) in enumerate(rows):
+            layout = layouts.get(row_symbols)
+            if layout is None:
+                positions, columns = [], []
+                for position, symbol in enumerate(row_symbols.split(',')):
+                    if symbol in wanted:
+                        positions.append(position)
+                        columns.append(wanted[symbol])
+                layout = (np.array(positions, dtype=np.intp), np.array(columns, dtype=np.intp))
+                layouts[row_symbols] = layout
+            
+            timestamps[i] = int((recorded_at - datetime(1970, 1, 1)).total_seconds())
+            prices = np.frombuffer(packed, dtype=CryptoPriceHistory.PRICE_DTYPE)
+            matrix[i, layout[1]] = prices[layout[0]]
+        
+        return timestamps, matrix
+    
+    @staticmethod
+    def forward_fill(matrix: np.ndarray) -> np.ndarray:
+        """Remplace chaque NaN par la dernière valeur connue de sa colonne."""
+        if matrix.size == 0:
+            return matrix
+        rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        return matrix[rows, np.arange(matrix.shape[1])]
+    
+    @classmethod
+    def downsample(cls, timestamps: np.ndarray, matrix: np.ndarray, interval: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Garde le dernier prix connu de chaque intervalle (prix de clôture).
+        
+        Args:
+            timestamps: Timestamps triés (secondes epoch)
+            matrix: Prix alignés sur les timestamps
+            interval: '1h', '1d' ou '1w'
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (début de chaque intervalle, prix de clôture)
+        """
+        step = cls.INTERVALS[interval]
+        offset = cls.WEEK_OFFSET_SECONDS if interval == '1w' else 0
+        
+        if len(timestamps) == 0:
+            return timestamps, matrix
+        
+        buckets = (timestamps - offset) // step
+        last_rows = np.flatnonzero(np.append(buckets[1:] != buckets[:-1], True))
+        return buckets[last_rows] * step + offset, cls.forward_fill(matrix)[last_rows]
+    
+    @classmethod
+    def _resolve_period(cls, start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+        """Période par défaut : les 30 derniers jours."""
+        end = end or datetime.utcnow()
+        start = start or end - cls.DEFAULT_PERIOD
+        return start, end
+    
+    @staticmethod
+    def _format_timestamps(timestamps: np.ndarray) -> List[str]:
+        """Timestamps epoch -> dates ISO 8601 (UTC)."""
+        return [
+            (datetime(1970, 1, 1) + timedelta(seconds=int(ts))).isoformat()
+            for ts in timestamps
+        ]
+    
+    @classmethod
+    def get_price_series(cls, symbols: Iterable[str], interval: str = '1d',
+                         start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """
+        Séries de prix EUR sous-échantillonnées pour les graphiques de tendance.
+        
+        Args:
+            symbols: Symboles crypto (ex: ['bitcoin', 'ethereum'])
+            interval: '1h', '1d' ou '1w'
+            start: Début de la période (défaut : il y a 30 jours)
+            end: Fin de la période (défaut : maintenant)
+        
+        Returns:
+            Dict: {interval, timestamps: [ISO], prices: {symbol: [prix ou None]}}
+        """
+        if interval not in cls.INTERVALS:
+            raise ValueError(f"Intervalle invalide: {interval} (attendu : {', '.join(cls.INTERVALS)})")
+        
+        symbols = list(dict.fromkeys(symbol.lower() for symbol in symbols))
+        start, end = cls._resolve_period(start, end)
+        
+        timestamps, matrix = cls.load_matrix(symbols, start, end)
+        timestamps, matrix = cls.downsample(timestamps, matrix, interval)
+        
+        return {
+            'interval': interval,
+            'timestamps': cls._format_timestamps(timestamps),
+            'prices': {
+                symbol: [None if np.isnan(price) else round(float(price), 8) for price in matrix[:, column]]
+                for column, symbol in enumerate(symbols)
+            }
+        }
+    
+    @staticmethod
+    def holdings_from_profile(investor_profile) -> Dict[str, float]:
+        """Quantités détenues par symbole à partir des cryptos du profil."""
+        holdings = {}
+        for crypto in investor_profile.cryptomonnaies_data or []:
+            symbol = (crypto.get('symbol') or '').lower()
+            quantity = crypto.get('quantity') or 0
+            if symbol and quantity:
+                holdings[symbol] = holdings.get(symbol, 0.0) + float(quantity)
+        return holdings
+    
+    @classmethod
+    def get_portfolio_value_series(cls, holdings: Dict[str, float], interval: str = '1d',
+                                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """
+        Valeur EUR d'un portefeuille crypto dans le temps, calculée depuis l'historique des prix
+        et les quantités détenues (matrice des prix x vecteur des quantités).
+        Les quantités actuelles sont appliquées à toute la période.
+        
+        Args:
+            holdings: Quantité détenue par symbole
+            interval: '1h', '1d' ou '1w'
+            start: Début de la période (défaut : il y a 30 jours)
+            end: Fin de la période (défaut : maintenant)
+        
+        Returns:
+            Dict: {interval, timestamps: [ISO], values: [valeur EUR]}
+        """
+        if interval not in cls.INTERVALS:
+            raise ValueError(f"Intervalle invalide: {interval} (attendu : {', '.join(cls.INTERVALS)})")
+        
+        symbols = list(holdings)
+        quantities = np.array([holdings[symbol] for symbol in symbols], dtype=np.float64)
+        start, end = cls._resolve_period(start, end)
+        
+        timestamps, matrix = cls.load_matrix(symbols, start, end)
+        timestamps, matrix = cls.downsample(timestamps, matrix, interval)
+        
+        # Un symbole jamais coté sur la période compte pour 0
+        values = np.nan_to_num(matrix) @ quantities if symbols else np.zeros(len(timestamps))
+        
+        return {
+            'interval': interval,
+            'timestamps': cls._format_timestamps(timestamps),
+            'values': np.round(values, 2).tolist()
+        }
@@ -3,23 +3,49 @@ Service pour la gestion des fichiers sur DigitalOcean Spaces
 """
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 import os
 import uuid
 from datetime import datetime
+from urllib.parse import unquote, urlsplit
 from werkzeug.utils import secure_filename
 import logging
+from app.services.spaces_index import SpacesObjectIndex
 
 logger = logging.getLogger(__name__)
 
+class _KeepOpenStream:
+    """Flux passé à boto3 sans qu'il le ferme (le fichier reste lisible après l'upload, ex: miniatures)"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def close(self):
+        pass
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
 class DigitalOceanSpacesService:
-    def __init__(self, access_key, secret_key, region='fra1', space_name='atlas-database'):
+    DEFAULT_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024  # 8 Mo (minimum S3 : 5 Mo)
+    DEFAULT_MAX_CONCURRENCY = 4
+    
+    LIST_PAGE_SIZE = 1000  # Maximum S3 par requête list_objects_v2
+    
+    def __init__(self, access_key, secret_key, region='fra1', space_name='atlas-database',
+                 multipart_chunksize=None, max_concurrency=None, endpoint_url=None,
+                 index_ttl=None, index_prefixes=()):
         self.access_key = access_key
         self.secret_key = secret_key
         self.region = region
         self.space_name = space_name
-        self.endpoint_url = f'https://{region}.digitaloceanspaces.com'
-        self.public_url = f'https://{space_name}.{region}.digitaloceanspaces.com'
+        # endpoint_url : autre endpoint S3 compatible (ex: serveur S3 local de test)
+        self.endpoint_url = endpoint_url or f'https://{region}.digitaloceanspaces.com'
+        self.public_url = (
+            f"{endpoint_url.rstrip('/')}/{space_name}" if endpoint_url
+            else f'https://{space_name}.{region}.digitaloceanspaces.com'
+        )
         
         # Configuration du client S3 compatible
         self.session = boto3.session.Session()
@@ -29,12 +55,24 @@ class DigitalOceanSpacesService:
             endpoint_url=self.endpoint_url,
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
-            config=Config(signature_version='s3v4')
+            config=Config(signature_version='s3v4', max_pool_connections=max(10, max_concurrency or 0))
+        )
+        
+        # Upload multipart : le fichier est envoyé par parties en parallèle, sans être chargé en mémoire
+        chunk_size = multipart_chunksize or self.DEFAULT_MULTIPART_CHUNK_SIZE
+        self.transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=max_concurrency or self.DEFAULT_MAX_CONCURRENCY,
+            use_threads=True
         )
         
+        # Index local des métadonnées (existence et listings sans aller-retour réseau)
+        self.index = SpacesObjectIndex(self.iter_files, ttl_seconds=index_ttl, prefixes=index_prefixes)
+        
         logger.info(f"✅ DigitalOcean Spaces configuré - Space: {space_name}, Région: {region}")
 
-    def upload_file(self, file, folder_path, custom_filename=None, make_public=True):
+    def upload_file(self, file, folder_path, custom_filename=None, make_public=True, cache_control=None):
         """
         Upload un fichier vers DigitalOcean Spaces
         
@@ -43,6 +81,7 @@ class DigitalOceanSpacesService:
             folder_path: Chemin du dossier dans le Space (ex: 'apprentissages/pdfs')
             custom_filename: Nom personnalisé pour le fichier (optionnel)
             make_public: Rendre le fichier public (défaut: True)
+            cache_control: En-tête Cache-Control de l'objet (optionnel)
             
         Returns:
             dict: {'success': bool, 'url': str, 'key': str, 'error': str}
@@ -80,15 +119,23 @@ class DigitalOceanSpacesService:
             
             if make_public:
                 extra_args['ACL'] = 'public-read'
+            if cache_control:
+                extra_args['CacheControl'] = cache_control
             
-            # Upload du fichier
+            # Upload du fichier (multipart au-delà de multipart_chunksize)
             logger.info(f"📤 Upload vers DigitalOcean Spaces: {key}")
+            stream = getattr(file, 'stream', file)
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell()
+            stream.seek(0)
             self.client.upload_fileobj(
-                file,
+                _KeepOpenStream(stream),
                 self.space_name,
                 key,
-                ExtraArgs=extra_args
+                ExtraArgs=extra_args,
+                Config=self.transfer_config
             )
+            self.index.record(key, size=size)
             
             # URL publique du fichier
             public_url = f"{self.public_url}/{key}"
@@ -112,6 +159,47 @@ class DigitalOceanSpacesService:
                 'key': None
             }
 
+    def upload_bytes(self, data, key, content_type, make_public=True, cache_control=None):
+        """
+        Upload d'un petit contenu déjà en mémoire (ex: miniatures générées)
+        
+        Args:
+            data: Contenu (bytes)
+            key: Clé complète de l'objet dans le Space
+            content_type: Type MIME
+            make_public: Rendre le fichier public (défaut: True)
+            cache_control: En-tête Cache-Control de l'objet (optionnel)
+            
+        Returns:
+            dict: {'success': bool, 'url': str, 'key': str, 'error': str}
+        """
+        try:
+            extra_args = {'ContentType': content_type}
+            if make_public:
+                extra_args['ACL'] = 'public-read'
+            if cache_control:
+                extra_args['CacheControl'] = cache_control
+            
+            response = self.client.put_object(Bucket=self.space_name, Key=key, Body=data, **extra_args)
+            self.index.record(key, size=len(data), etag=response.get('ETag', '').strip('"') or None)
+            
+            return {
+                'success': True,
+                'url': self.get_file_url(key),
+                'key': key,
+                'error': None
+            }
+            
+        except Exception as e:
+            error_msg = f"Erreur lors de l'upload: {str(e)}"
+            logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg,
+                'url': None,
+                'key': None
+            }
+
     def delete_file(self, key):
         """
         Supprime un fichier de DigitalOcean Spaces
@@ -125,6 +213,7 @@ class DigitalOceanSpacesService:
         try:
             logger.info(f"🗑️ Suppression du fichier: {key}")
             self.client.delete_object(Bucket=self.space_name, Key=key)
+            self.index.forget(key)
             logger.info(f"✅ Fichier supprimé avec succès: {key}")
             
             return {
@@ -143,6 +232,8 @@ class DigitalOceanSpacesService:
     def file_exists(self, key):
         """
         Vérifie si un fichier existe dans le Space
+        (depuis l'index local si la clé y figure, sinon via HEAD : un objet absent de l'index
+        a pu être uploadé par un autre worker depuis la dernière réconciliation)
         
         Args:
             key: Clé du fichier dans le Space
@@ -151,10 +242,27 @@ class DigitalOceanSpacesService:
             bool: True si le fichier existe
         """
         try:
-            self.client.head_object(Bucket=self.space_name, Key=key)
-            return True
+            entry = self.index.lookup(key)
+            if isinstance(entry, dict):
+                return True
+        except Exception as e:
+            logger.warning(f"Index Spaces indisponible pour {key}: {str(e)}")
+            entry = SpacesObjectIndex.UNKNOWN
+        
+        try:
+            head = self.client.head_object(Bucket=self.space_name, Key=key)
         except:
             return False
+        
+        if entry is None:
+            # Objet créé ailleurs : ajouté à l'index jusqu'à la prochaine réconciliation
+            self.index.record(
+                key,
+                size=head.get('ContentLength'),
+                etag=head.get('ETag', '').strip('"') or None,
+                last_modified=head.get('LastModified')
+            )
+        return True
 
     def get_file_url(self, key):
         """
@@ -168,35 +276,81 @@ class DigitalOceanSpacesService:
         """
         return f"{self.public_url}/{key}"
 
-    def list_files(self, folder_path="", max_keys=1000):
+    def key_from_url(self, url):
+        """
+        Retrouve la clé d'un fichier à partir de son URL publique
+        
+        Args:
+            url: URL publique (https://<space>.<région>.digitaloceanspaces.com/<clé>,
+                 ou <endpoint>/<space>/<clé> avec un endpoint personnalisé)
+            
+        Returns:
+            str: Clé du fichier dans le Space (None si l'URL est vide)
+        """
+        if not url:
+            return None
+        path = unquote(urlsplit(url).path).lstrip('/')
+        # Avec un endpoint personnalisé, le nom du Space est le premier segment du chemin
+        bucket_path = urlsplit(self.public_url).path.strip('/')
+        if bucket_path and path.startswith(bucket_path + '/'):
+            path = path[len(bucket_path) + 1:]
+        return path or None
+
+    def iter_files(self, folder_path="", page_size=None):
+        """
+        Parcourt tous les fichiers d'un dossier directement sur le Space, page par page
+        (jetons de continuation suivis, aucune limite sur le nombre d'objets)
+        
+        Args:
+            folder_path: Chemin du dossier (optionnel)
+            page_size: Nombre d'objets par requête (défaut: 1000)
+            
+        Yields:
+            dict: {'key', 'size', 'etag', 'last_modified', 'url'}
+        """
+        prefix = SpacesObjectIndex.normalize_prefix(folder_path)
+        paginator = self.client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=self.space_name,
+            Prefix=prefix,
+            PaginationConfig={'PageSize': page_size or self.LIST_PAGE_SIZE}
+        )
+        for page in pages:
+            for obj in page.get('Contents', []):
+                yield {
+                    'key': obj['Key'],
+                    'size': obj['Size'],
+                    'etag': obj.get('ETag', '').strip('"') or None,
+                    'last_modified': obj['LastModified'],
+                    'url': self.get_file_url(obj['Key'])
+                }
+
+    def list_files(self, folder_path="", max_keys=None, use_index=True):
         """
         Liste les fichiers dans un dossier
         
         Args:
             folder_path: Chemin du dossier (optionnel)
-            max_keys: Nombre maximum de fichiers à retourner
+            max_keys: Nombre maximum de fichiers à retourner (défaut: tous)
+            use_index: Répondre depuis l'index local (réconcilié si expiré)
             
         Returns:
             list: Liste des fichiers avec leurs métadonnées
         """
         try:
-            prefix = folder_path.strip('/') + '/' if folder_path else ''
-            
-            response = self.client.list_objects_v2(
-                Bucket=self.space_name,
-                Prefix=prefix,
-                MaxKeys=max_keys
-            )
+            objects = self.index.iter_objects(folder_path) if use_index else self.iter_files(folder_path)
             
             files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    files.append({
-                        'key': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'],
-                        'url': self.get_file_url(obj['Key'])
-                    })
+            for obj in objects:
+                if max_keys is not None and len(files) >= max_keys:
+                    break
+                files.append({
+                    'key': obj['key'],
+                    'size': obj['size'],
+                    'etag': obj['etag'],
+                    'last_modified': obj['last_modified'],
+                    'url': self.get_file_url(obj['key'])
+                })
             
             return files
             
@@ -208,14 +362,19 @@ class DigitalOceanSpacesService:
 # Instance globale du service (sera configurée depuis les variables d'environnement)
 spaces_service = None
 
-def init_spaces_service(access_key, secret_key):
+def init_spaces_service(access_key, secret_key, multipart_chunksize=None, max_concurrency=None,
+                        index_ttl=None, index_prefixes=()):
     """
     Initialise le service DigitalOcean Spaces
     """
     global spaces_service
     spaces_service = DigitalOceanSpacesService(
         access_key=access_key,
-        secret_key=secret_key
+        secret_key=secret_key,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        index_ttl=index_ttl,
+        index_prefixes=index_prefixes
     )
     return spaces_service
 
@@ -232,7 +391,11 @@ def get_spaces_service():
             if current_app.config.get('DO_SPACES_ACCESS_KEY') and current_app.config.get('DO_SPACES_SECRET_KEY'):
                 spaces_service = DigitalOceanSpacesService(
                     access_key=current_app.config['DO_SPACES_ACCESS_KEY'],
-                    secret_key=current_app.config['DO_SPACES_SECRET_KEY']
+                    secret_key=current_app.config['DO_SPACES_SECRET_KEY'],
+                    multipart_chunksize=current_app.config.get('SPACES_MULTIPART_CHUNK_SIZE'),
+                    max_concurrency=current_app.config.get('SPACES_MULTIPART_CONCURRENCY'),
+                    index_ttl=current_app.config.get('SPACES_INDEX_TTL'),
+                    index_prefixes=current_app.config.get('SPACES_INDEX_PREFIXES', ())
                 )
                 print(f"✅ Service DigitalOcean initialisé à la demande")
         except Exception as e:
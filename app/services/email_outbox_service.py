@@ -0,0 +1,315 @@
+"""
+File d'envoi des emails (outbox) et dispatcher en arrière-plan.
+Les routes enregistrent l'email en base et répondent immédiatement ; un thread par process
+envoie les emails en attente via MailerSend (endpoint bulk quand plusieurs sont en file),
+confirme chaque email d'un lot bulk auprès de MailerSend, retente les échecs avec un backoff
+exponentiel et enregistre l'état de livraison.
+"""
+
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import List
+from flask import current_app
+from app import db
+from app.models.email_outbox import OutboxEmail
+from app.services.email_service import MailerSendService
+
+
+class EmailOutboxService:
+    """
+    Mise en file et envoi différé des emails transactionnels.
+    """
+    
+    DEFAULT_FROM_EMAIL = "noreply@atlas-invest.fr"
+    DEFAULT_FROM_NAME = "Atlas"
+    
+    # Nombre maximal d'emails réclamés (et envoyés en une requête bulk) par passage
+    BATCH_SIZE = 100
+    
+    # Intervalle de scrutation de la file quand aucun email n'est mis en file dans ce process
+    POLL_INTERVAL_SECONDS = 15
+    
+    # Backoff des nouvelles tentatives : 30 s, 1 min, 2 min... plafonné à 1 h
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 3600
+    MAX_ATTEMPTS = 10
+    
+    # Un email resté 'sending' plus longtemps (worker arrêté pendant l'envoi) est repris
+    STALE_SENDING_AFTER = timedelta(minutes=10)
+    
+    # Délai entre deux consultations de l'état d'un lot bulk accepté mais pas encore traité
+    BULK_STATUS_POLL_INTERVAL = timedelta(seconds=30)
+    BULK_INDEX_SEPARATOR = '#'
+    
+    _lock = threading.Lock()
+    _wake = threading.Event()
+    _thread = None
+    _thread_pid = None
+    
+    @classmethod
+    def init_app(cls, app):
+        """Démarre le dispatcher à la première requête de chaque worker (pas pour les commandes CLI)."""
+        @app.before_request
+        def _start_email_dispatcher():
+            cls.ensure_dispatcher(app)
+    
+    @classmethod
+    def enqueue(cls, to_email: str, to_name: str, subject: str,
+                html_content: str, text_content: str,
+                from_email: str = DEFAULT_FROM_EMAIL,
+                from_name: str = DEFAULT_FROM_NAME) -> bool:
+        """
+        Enregistre un email dans la file d'envoi (même signature que MailerSendService.send_email).
+        
+        Returns:
+            bool: True si l'email est enregistré (il sera envoyé en arrière-plan)
+        """
+        try:
+            email = OutboxEmail(
+                to_email=to_email,
+                to_name=to_name,
+                from_email=from_email,
+                from_name=from_name,
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content
+            )
+            db.session.add(email)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erreur mise en file de l'email pour {to_email}: {e}")
+            return False
+        
+        cls.ensure_dispatcher(current_app._get_current_object())
+        cls._wake.set()
+        return True
+    
+    @classmethod
+    def ensure_dispatcher(cls, app):
+        """Démarre le thread d'envoi de ce process s'il ne tourne pas déjà."""
+        pid = os.getpid()
+        if cls._thread is not None and cls._thread_pid == pid and cls._thread.is_alive():
+            return
+        with cls._lock:
+            if cls._thread is not None and cls._thread_pid == pid and cls._thread.is_alive():
+                return
+            cls._thread = threading.Thread(
+                target=cls._run_dispatcher,
+                args=(app,),
+                name='email-outbox-dispatcher',
+                daemon=True
+            )
+            cls._thread_pid = pid
+            cls._thread.start()
+    
+    @classmethod
+    def _run_dispatcher(cls, app):
+        """Boucle du dispatcher : vide la file puis attend un nouvel email ou l'intervalle de scrutation."""
+        while True:
+            cls._wake.clear()
+            try:
+                with app.app_context():
+                    while cls.dispatch_pending() >= cls.BATCH_SIZE:
+                        pass
+            except Exception as e:
+                print(f"❌ Erreur dispatcher emails: {e}")
+                traceback.print_exc()
+            cls._wake.wait(cls.POLL_INTERVAL_SECONDS)
+    
+    @classmethod
+    def dispatch_pending(cls) -> int:
+        """
+        Envoie un lot d'emails dus (à appeler dans un app context).
+        
+        Returns:
+            int: Nombre d'emails traités dans ce lot
+        """
+        api_token = os.getenv('MAILERSEND_API_TOKEN')
+        if not api_token:
+            # Les emails restent en file jusqu'à ce que le service soit configuré
+            return 0
+        
+        try:
+            mailer = MailerSendService(api_token)
+            cls._confirm_bulk_sends(mailer)
+            
+            emails = cls._claim_batch()
+            if not emails:
+                return 0
+            
+            # Premiers envois groupés via /bulk-email ; les nouvelles tentatives partent une par une
+            # pour qu'une adresse invalide ne fasse pas échouer tout un lot
+            fresh = [email for email in emails if email.attempts == 0]
+            retries = [email for email in emails if email.attempts > 0]
+            if len(fresh) > 1:
+                result = mailer.send_bulk([email.to_mailersend_payload() for email in fresh])
+                for index, email in enumerate(fresh):
+                    cls._record_bulk_result(email, result, index)
+            else:
+                retries = fresh + retries
+            for email in retries:
+                cls._record_result(email, mailer.send_payload(email.to_mailersend_payload()), individual=True)
+            
+            db.session.commit()
+            
+            sent = sum(1 for email in emails if email.status == OutboxEmail.STATUS_SENT)
+            accepted = sum(1 for email in emails if email.status == OutboxEmail.STATUS_ACCEPTED)
+            print(f"📧 Outbox : {sent}/{len(emails)} email(s) envoyé(s), {accepted} en attente de confirmation bulk")
+            return len(emails)
+        
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+    
+    @classmethod
+    def _claim_batch(cls) -> List[OutboxEmail]:
+        """
+        Réserve un lot d'emails dus (statut 'sending') ; SKIP LOCKED évite qu'un autre
+        worker réclame les mêmes lignes.
+        """
+        now = datetime.utcnow()
+        due = db.or_(
+            db.and_(OutboxEmail.status == OutboxEmail.STATUS_PENDING, OutboxEmail.next_attempt_at <= now),
+            db.and_(OutboxEmail.status == OutboxEmail.STATUS_SENDING,
+                    OutboxEmail.locked_at < now - cls.STALE_SENDING_AFTER)
+        )
+        emails = OutboxEmail.query.filter(due).order_by(
+            OutboxEmail.next_attempt_at, OutboxEmail.id
+        ).limit(cls.BATCH_SIZE).with_for_update(skip_locked=True).all()
+        
+        for email in emails:
+            email.status = OutboxEmail.STATUS_SENDING
+            email.locked_at = now
+        db.session.commit()
+        return emails
+    
+    @classmethod
+    def _record_result(cls, email: OutboxEmail, result: dict, individual: bool):
+        """
+        Enregistre le résultat d'un envoi et planifie une nouvelle tentative si besoin.
+        
+        Args:
+            email: Email envoyé
+            result: Résultat de MailerSendService.send_payload / send_bulk
+            individual: False si l'email faisait partie d'un envoi bulk refusé
+        """
+        email.attempts += 1
+        email.locked_at = None
+        
+        if result['success']:
+            email.status = OutboxEmail.STATUS_SENT
+            email.sent_at = datetime.utcnow()
+            email.provider_id = result['provider_id']
+            email.last_error = None
+            return
+        
+        email.last_error = result['error']
+        if not result['retryable'] and individual:
+            # Rejet définitif de MailerSend (4xx) pour cet email envoyé seul
+            email.status = OutboxEmail.STATUS_FAILED
+        elif email.attempts >= cls.MAX_ATTEMPTS:
+            email.status = OutboxEmail.STATUS_FAILED
+        else:
+            email.status = OutboxEmail.STATUS_PENDING
+            email.next_attempt_at = datetime.utcnow() + cls.retry_delay(email.attempts)
+        
+        if email.status == OutboxEmail.STATUS_FAILED:
+            print(f"❌ Email {email.id} pour {email.to_email} en échec définitif: {email.last_error}")
+    
+    @classmethod
+    def _record_bulk_result(cls, email: OutboxEmail, result: dict, index: int):
+        """
+        Enregistre la réponse de /bulk-email pour un email du lot : le 202 signifie seulement
+        que MailerSend a accepté le lot, l'email reste 'accepted' jusqu'à confirmation.
+        """
+        if not result['success'] or not result['provider_id']:
+            if result['success']:
+                # Lot accepté sans bulk_email_id : impossible à confirmer, renvoi individuel
+                result = dict(result, success=False, error="bulk_email_id absent de la réponse MailerSend", retryable=True)
+            cls._record_result(email, result, individual=False)
+            return
+        
+        email.attempts += 1
+        email.locked_at = None
+        email.status = OutboxEmail.STATUS_ACCEPTED
+        email.provider_id = f"{result['provider_id']}{cls.BULK_INDEX_SEPARATOR}{index}"
+        email.last_error = None
+        email.next_attempt_at = datetime.utcnow() + cls.BULK_STATUS_POLL_INTERVAL
+    
+    @classmethod
+    def _confirm_bulk_sends(cls, mailer: MailerSendService) -> int:
+        """
+        Consulte l'état des lots bulk acceptés et marque chacun de leurs emails envoyé, rejeté
+        ou à renvoyer individuellement.
+        
+        Returns:
+            int: Nombre d'emails dont l'état a été consulté
+        """
+        now = datetime.utcnow()
+        emails = OutboxEmail.query.filter(
+            OutboxEmail.status == OutboxEmail.STATUS_ACCEPTED,
+            OutboxEmail.next_attempt_at <= now
+        ).order_by(OutboxEmail.next_attempt_at, OutboxEmail.id).limit(cls.BATCH_SIZE).with_for_update(skip_locked=True).all()
+        if not emails:
+            return 0
+        
+        batches = {}
+        for email in emails:
+            bulk_email_id, _, index = email.provider_id.rpartition(cls.BULK_INDEX_SEPARATOR)
+            batches.setdefault(bulk_email_id, []).append((int(index), email))
+        
+        for bulk_email_id, members in batches.items():
+            status = mailer.get_bulk_status(bulk_email_id)
+            for index, email in members:
+                cls._record_bulk_status(email, index, status)
+        
+        db.session.commit()
+        return len(emails)
+    
+    @classmethod
+    def _record_bulk_status(cls, email: OutboxEmail, index: int, status: dict):
+        """Applique l'état d'un lot bulk (MailerSendService.get_bulk_status) à l'un de ses emails."""
+        now = datetime.utcnow()
+        
+        if (status['success'] and status['state'] not in ('completed', 'failed')) or (not status['success'] and status['retryable']):
+            # Lot encore en file chez MailerSend, ou état momentanément indisponible
+            email.next_attempt_at = now + cls.BULK_STATUS_POLL_INTERVAL
+            return
+        
+        if not status['success'] or status['state'] == 'failed':
+            # Lot inconnu ou en échec : l'email repart en envoi individuel
+            email.last_error = status['error'] or "Lot bulk en échec chez MailerSend"
+            if email.attempts >= cls.MAX_ATTEMPTS:
+                email.status = OutboxEmail.STATUS_FAILED
+                print(f"❌ Email {email.id} pour {email.to_email} en échec définitif: {email.last_error}")
+            else:
+                email.status = OutboxEmail.STATUS_PENDING
+                email.next_attempt_at = now + cls.retry_delay(email.attempts)
+            return
+        
+        if index in status['rejected']:
+            # Message refusé par la validation MailerSend ou destinataire bloqué : définitif
+            email.status = OutboxEmail.STATUS_FAILED
+            email.last_error = status['rejected'][index]
+            print(f"❌ Email {email.id} pour {email.to_email} rejeté par MailerSend: {email.last_error}")
+            return
+        
+        email.status = OutboxEmail.STATUS_SENT
+        email.sent_at = now
+        email.last_error = None
+    
+    @classmethod
+    def retry_delay(cls, attempts: int) -> timedelta:
+        """Délai avant la tentative suivante (backoff exponentiel plafonné)."""
+        return timedelta(seconds=min(cls.RETRY_BASE_SECONDS * 2 ** (attempts - 1), cls.RETRY_MAX_SECONDS))
+    
+    @classmethod
+    def get_status_counts(cls) -> dict:
+        """Nombre d'emails par statut (suivi de la file)."""
+        rows = db.session.query(OutboxEmail.status, db.func.count(OutboxEmail.id)).group_by(OutboxEmail.status).all()
+        return {status: count for status, count in rows}
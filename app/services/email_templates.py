@@ -0,0 +1,85 @@
+"""
+Rendu des emails à partir des templates Jinja de app/templates/emails/.
+Chaque email a une version HTML (<nom>.html) et une version texte (<nom>.txt).
+Les templates sont chargés et compilés une seule fois par process ; seules les
+variables propres au destinataire sont rendues à l'envoi.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+
+class EmailTemplateRenderer:
+    """Rendu des emails transactionnels et des campagnes de suivi."""
+    
+    TEMPLATE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'templates', 'emails')
+    
+    _lock = threading.Lock()
+    _environment = None
+    _templates = {}  # {nom: (template HTML compilé, template texte compilé)}
+    
+    @classmethod
+    def environment(cls) -> Environment:
+        """Environnement Jinja dédié aux emails (sans rechargement : compilé une fois par process)."""
+        if cls._environment is None:
+            with cls._lock:
+                if cls._environment is None:
+                    cls._environment = Environment(
+                        loader=FileSystemLoader(cls.TEMPLATE_FOLDER),
+                        autoescape=select_autoescape(['html']),
+                        auto_reload=False,
+                        cache_size=-1,
+                        keep_trailing_newline=True,
+                        undefined=StrictUndefined
+                    )
+        return cls._environment
+    
+    @classmethod
+    def get_templates(cls, name: str):
+        """Templates compilés (HTML, texte) d'un email."""
+        templates = cls._templates.get(name)
+        if templates is None:
+            environment = cls.environment()
+            templates = (
+                environment.get_template(f'{name}.html'),
+                environment.get_template(f'{name}.txt')
+            )
+            cls._templates[name] = templates
+        return templates
+    
+    @classmethod
+    def render(cls, name: str, **context) -> Tuple[str, str]:
+        """
+        Rend un email pour un destinataire.
+        
+        Args:
+            name: Nom du template (ex: 'bienvenue')
+            **context: Variables du template (user, URLs...)
+        
+        Returns:
+            Tuple[str, str]: (contenu HTML, contenu texte)
+        """
+        html_template, text_template = cls.get_templates(name)
+        return html_template.render(context), text_template.render(context)
+    
+    @classmethod
+    def render_batch(cls, name: str, contexts: Iterable[Dict[str, Any]], **common) -> List[Tuple[str, str]]:
+        """
+        Rend le même email pour plusieurs destinataires (campagne de suivi).
+        
+        Args:
+            name: Nom du template
+            contexts: Variables propres à chaque destinataire (ex: [{'user': user}, ...])
+            **common: Variables communes à tous les destinataires (ex: URL du rendez-vous)
+        
+        Returns:
+            List[Tuple[str, str]]: (contenu HTML, contenu texte) pour chaque destinataire, dans l'ordre
+        """
+        html_template, text_template = cls.get_templates(name)
+        rendered = []
+        for context in contexts:
+            variables = {**common, **context}
+            rendered.append((html_template.render(variables), text_template.render(variables)))
+        return rendered
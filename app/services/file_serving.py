@@ -0,0 +1,145 @@
+"""
+Envoi des fichiers locaux (PDF des formations, images uploadées, cache Spaces).
+Le transfert peut être délégué au serveur web frontal pour ne pas occuper un worker gunicorn :
+
+- 'wsgi' (défaut) : send_file via wsgi.file_wrapper (sendfile(2) avec les workers sync de gunicorn)
+- 'x-sendfile' : en-tête X-Sendfile (Apache mod_xsendfile, lighttpd), géré nativement par Flask
+- 'x-accel' : en-tête X-Accel-Redirect (nginx) vers une location interne, par exemple :
+    
+    location /_protected/uploads/ {
+        internal;
+        alias /app/app/static/uploads/;
+    }
+
+Les chemins hors des dossiers déclarés dans X_ACCEL_MAPPINGS sont envoyés par Flask.
+"""
+
+import mimetypes
+import os
+import zlib
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+from flask import Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+
+class FileServingBackend:
+    """
+    Point d'entrée unique pour servir un fichier du disque local.
+    """
+    
+    BACKEND_WSGI = 'wsgi'
+    BACKEND_X_SENDFILE = 'x-sendfile'
+    BACKEND_X_ACCEL = 'x-accel'
+    BACKENDS = (BACKEND_WSGI, BACKEND_X_SENDFILE, BACKEND_X_ACCEL)
+    
+    @classmethod
+    def init_app(cls, app):
+        """Configure le backend choisi via FILE_SERVING_BACKEND."""
+        backend = app.config.get('FILE_SERVING_BACKEND', cls.BACKEND_WSGI)
+        if backend not in cls.BACKENDS:
+            print(f"⚠️ FILE_SERVING_BACKEND inconnu '{backend}', utilisation de '{cls.BACKEND_WSGI}'")
+            app.config['FILE_SERVING_BACKEND'] = backend = cls.BACKEND_WSGI
+        
+        if backend == cls.BACKEND_X_SENDFILE:
+            # Flask ajoute X-Sendfile à tous ses send_file (fichiers statiques compris)
+            app.config['USE_X_SENDFILE'] = True
+        elif backend == cls.BACKEND_X_ACCEL and app.has_static_folder:
+            # Fichiers statiques (dont les images uploadées) délégués à nginx
+            app.view_functions['static'] = cls._serve_static
+        
+        print(f"📁 Envoi des fichiers : backend '{backend}'")
+    
+    @classmethod
+    def get_backend(cls) -> str:
+        return current_app.config.get('FILE_SERVING_BACKEND', cls.BACKEND_WSGI)
+    
+    @classmethod
+    def get_mappings(cls) -> List[Tuple[str, str]]:
+        """
+        Correspondances dossier local -> location interne nginx.
+        X_ACCEL_MAPPINGS : "dossier=location;dossier=location"
+        """
+        mappings = []
+        for item in (current_app.config.get('X_ACCEL_MAPPINGS') or '').split(';'):
+            if '=' not in item:
+                continue
+            root, location = item.split('=', 1)
+            mappings.append((os.path.realpath(root.strip()), '/' + location.strip().strip('/') + '/'))
+        return mappings
+    
+    @classmethod
+    def internal_uri(cls, path: str) -> Optional[str]:
+        """URI interne nginx d'un fichier, ou None s'il n'est dans aucun dossier déclaré."""
+        real_path = os.path.realpath(path)
+        for root, location in cls.get_mappings():
+            if real_path.startswith(root + os.sep):
+                relative = os.path.relpath(real_path, root).replace(os.sep, '/')
+                return location + quote(relative)
+        return None
+    
+    @classmethod
+    def send(cls, path: str, mimetype: Optional[str] = None, download_name: Optional[str] = None,
+             etag=True, last_modified=None, max_age: Optional[int] = None) -> Response:
+        """
+        Sert un fichier local avec le backend configuré (Range, ETag et Last-Modified gérés).
+        
+        Args:
+            path: Chemin du fichier (absolu de préférence)
+            mimetype: Type MIME (déduit du nom sinon)
+            download_name: Nom proposé au navigateur (affichage inline)
+            etag: ETag imposé, ou True pour le calculer depuis le fichier
+            last_modified: Date de modification imposée (sinon celle du fichier)
+            max_age: Durée de cache navigateur (sinon configuration Flask)
+        """
+        path = os.path.abspath(path)
+        
+        if cls.get_backend() == cls.BACKEND_X_ACCEL:
+            uri = cls.internal_uri(path)
+            if uri:
+                return cls._x_accel_response(path, uri, mimetype, download_name, etag, last_modified, max_age)
+        
+        # 'wsgi' et 'x-sendfile' : send_file (X-Sendfile ajouté par Flask si USE_X_SENDFILE)
+        return send_file(
+            path,
+            mimetype=mimetype,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=max_age
+        )
+    
+    @classmethod
+    def _x_accel_response(cls, path: str, uri: str, mimetype: Optional[str], download_name: Optional[str],
+                          etag, last_modified, max_age: Optional[int]) -> Response:
+        """Réponse sans corps : nginx envoie le fichier (et gère Range) depuis sa location interne."""
+        stat = os.stat(path)
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(download_name or path)[0] or 'application/octet-stream'
+        
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = uri
+        if download_name:
+            response.headers.set('Content-Disposition', 'inline', filename=download_name)
+        
+        # Mêmes validateurs que send_file, pour des 304 cohérents quel que soit le backend
+        if etag is True:
+            etag = f"{stat.st_mtime}-{stat.st_size}-{zlib.adler32(path.encode('utf-8')) & 0xffffffff}"
+        if etag:
+            response.set_etag(etag)
+        response.last_modified = last_modified or int(stat.st_mtime)
+        if max_age is None:
+            max_age = current_app.get_send_file_max_age(download_name or path)
+        if max_age is not None:
+            response.cache_control.max_age = max_age
+        
+        return response.make_conditional(request.environ)
+    
+    @classmethod
+    def _serve_static(cls, filename: str) -> Response:
+        """Remplace la vue 'static' de Flask pour le backend x-accel."""
+        path = safe_join(current_app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        return cls.send(path, max_age=current_app.get_send_file_max_age(filename))
@@ -3,12 +3,11 @@ Service centralisé pour le refresh global des prix crypto.
 Appelé UNIQUEMENT à la connexion utilisateur.
 """
 
-import requests
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from sqlalchemy import func
 from app import db
-from app.models.crypto_price import CryptoPrice
+from app.services.crypto_price_cache import CryptoPriceCache
+from app.services.http_client import HttpClient
 
 
 class GlobalCryptoService:
@@ -47,7 +46,7 @@ class GlobalCryptoService:
         """
         try:
             # Trouver la date du dernier refresh global
-            last_update = db.session.query(func.max(CryptoPrice.updated_at)).scalar()
+            last_update = CryptoPriceCache.latest_update()
             
             if not last_update:
                 return True  # Aucun prix en base
@@ -68,7 +67,7 @@ class GlobalCryptoService:
     def get_usd_to_eur_rate(cls) -> float:
         """Récupère le taux USD->EUR."""
         try:
-            response = requests.get(cls.EXCHANGE_RATE_API, timeout=3)
+            response = HttpClient.session().get(cls.EXCHANGE_RATE_API, timeout=3)
             response.raise_for_status()
             return response.json()['rates']['EUR']
         except:
@@ -79,63 +78,26 @@ class GlobalCryptoService:
         """
         Refresh global de TOUS les prix de la plateforme.
         Appelé UNIQUEMENT à la connexion.
+        Passe par le refresh unique de BinancePriceService (derniers prix + historique).
         
         Returns:
             True si succès
         """
-        try:
-            print("🌐 Refresh global des prix crypto...")
-            
-            # 1. Récupérer TOUS les prix depuis Binance (un seul appel)
-            response = requests.get(cls.BINANCE_API_URL, timeout=10)
-            response.raise_for_status()
-            binance_data = response.json()
-            
-            # 2. Convertir en dict pour accès rapide
-            binance_prices = {item['symbol']: float(item['price']) for item in binance_data}
-            
-            # 3. Récupérer taux de change
-            eur_rate = cls.get_usd_to_eur_rate()
-            
-            # 4. Mettre à jour SEULEMENT les symboles de la plateforme
-            now = datetime.utcnow()
-            updated_count = 0
-            
-            for binance_symbol, our_symbol in cls.PLATFORM_SYMBOLS.items():
-                if binance_symbol in binance_prices:
-                    price_usd = binance_prices[binance_symbol]
-                    price_eur = price_usd * eur_rate
-                    
-                    # Upsert en base
-                    crypto_price = CryptoPrice.query.filter_by(symbol=our_symbol).first()
-                    if crypto_price:
-                        crypto_price.price_usd = price_usd
-                        crypto_price.price_eur = price_eur
-                        crypto_price.updated_at = now
-                    else:
-                        crypto_price = CryptoPrice(
-                            symbol=our_symbol,
-                            price_usd=price_usd,
-                            price_eur=price_eur,
-                            updated_at=now
-                        )
-                        db.session.add(crypto_price)
-                    
-                    updated_count += 1
-            
-            db.session.commit()
-            print(f"✅ {updated_count} prix mis à jour globalement")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Erreur refresh global: {e}")
-            db.session.rollback()
+        from app.services.binance_price_service import BinancePriceService
+        
+        print("🌐 Refresh global des prix crypto...")
+        snapshot = BinancePriceService.refresh_price_snapshot()
+        if not snapshot:
+            print("❌ Erreur refresh global")
             return False
+        
+        print(f"✅ {len(snapshot)} prix mis à jour globalement")
+        return True
     
     @classmethod
     def get_price_from_db(cls, symbol: str) -> Optional[float]:
         """
-        Récupère le prix depuis la DB (pas d'API).
+        Récupère le prix depuis le cache des prix (pas d'API, pas de requête si cache chaud).
         
         Args:
             symbol: Symbole crypto (ex: 'bitcoin')
@@ -144,8 +106,7 @@ class GlobalCryptoService:
             Prix EUR ou None
         """
         try:
-            crypto_price = CryptoPrice.query.filter_by(symbol=symbol).first()
-            return crypto_price.price_eur if crypto_price else None
+            return CryptoPriceCache.get_price(symbol)
         except:
             return None
     
@@ -0,0 +1,122 @@
+"""
+Client HTTP partagé par toutes les intégrations sortantes (Binance, taux de change,
+OpenAI, MailerSend, DigitalOcean Spaces).
+Une session requests par process : pools de connexions keep-alive par hôte,
+timeouts par défaut, retry avec backoff sur les appels idempotents et métriques de latence.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Any
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class _PooledSession(requests.Session):
+    """Session avec timeout par défaut et mesure de la latence par hôte."""
+    
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', HttpClient.DEFAULT_TIMEOUT)
+        host = urlsplit(url).netloc
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.RequestException:
+            HttpClient.record(host, time.monotonic() - started, error=True)
+            raise
+        # Pour stream=True, mesure le temps jusqu'aux en-têtes de la réponse
+        HttpClient.record(host, time.monotonic() - started, error=response.status_code >= 500)
+        return response
+
+
+class HttpClient:
+    """
+    Fabrique de la session HTTP partagée du process.
+    
+    Usage : HttpClient.session().get(url, timeout=5)
+    """
+    
+    # (connexion, lecture) en secondes, appliqué si l'appelant n'en précise pas
+    DEFAULT_TIMEOUT = (5, 30)
+    
+    # Connexions keep-alive conservées par hôte
+    POOL_CONNECTIONS = 10
+    POOL_MAXSIZE = 10
+    
+    # Retry uniquement sur les méthodes idempotentes (jamais un POST : pas de double envoi)
+    RETRY_TOTAL = 3
+    RETRY_BACKOFF_FACTOR = 0.3
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    RETRY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+    
+    _lock = threading.Lock()
+    _session = None
+    _session_pid = None  # Session recréée après un fork (workers gunicorn, ProcessPoolExecutor)
+    _metrics = {}  # {hôte: {'requests', 'errors', 'total_seconds', 'max_seconds'}}
+    
+    @classmethod
+    def session(cls) -> requests.Session:
+        """Session partagée du process (créée à la première utilisation)."""
+        pid = os.getpid()
+        if cls._session is None or cls._session_pid != pid:
+            with cls._lock:
+                if cls._session is None or cls._session_pid != pid:
+                    cls._session = cls._build_session()
+                    cls._session_pid = pid
+                    cls._metrics = {}
+        return cls._session
+    
+    @classmethod
+    def _build_session(cls) -> requests.Session:
+        """Crée la session et monte les adaptateurs HTTP/HTTPS avec pool et retry."""
+        retry = Retry(
+            total=cls.RETRY_TOTAL,
+            backoff_factor=cls.RETRY_BACKOFF_FACTOR,
+            status_forcelist=cls.RETRY_STATUS_CODES,
+            allowed_methods=cls.RETRY_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=cls.POOL_CONNECTIONS,
+            pool_maxsize=cls.POOL_MAXSIZE,
+            max_retries=retry
+        )
+        
+        session = _PooledSession()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    @classmethod
+    def record(cls, host: str, elapsed: float, error: bool = False):
+        """Enregistre la durée d'un appel vers un hôte."""
+        with cls._lock:
+            stats = cls._metrics.setdefault(host, {
+                'requests': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+    
+    @classmethod
+    def metrics(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Latence par hôte depuis le démarrage du process.
+        
+        Returns:
+            Dict: {hôte: {requests, errors, avg_ms, max_ms}}
+        """
+        with cls._lock:
+            return {
+                host: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(1000 * stats['total_seconds'] / stats['requests'], 1),
+                    'max_ms': round(1000 * stats['max_seconds'], 1)
+                }
+                for host, stats in cls._metrics.items()
+            }
@@ -0,0 +1,161 @@
+"""
+Miniatures des images de formation.
+Générées une seule fois à l'upload (recadrage carré, WebP + JPEG, plusieurs tailles) et stockées
+à côté de l'original (Spaces ou disque local) : le catalogue ne télécharge plus l'image d'origine.
+"""
+
+import io
+import os
+from typing import Dict, List, Optional, Tuple
+from flask import current_app, has_app_context
+from PIL import Image, ImageOps
+
+
+class ImageVariantService:
+    """
+    Génération et stockage des déclinaisons d'une image (clé de taille -> {format: url}).
+    """
+    
+    DEFAULT_SIZES = (160, 320)  # Côtés en pixels (vignettes affichées entre 50 et 120 px, écrans 2x)
+    DEFAULT_QUALITY = 80
+    
+    # Format -> (format Pillow, type MIME, extension)
+    FORMATS = {
+        'webp': ('WEBP', 'image/webp', 'webp'),
+        'jpeg': ('JPEG', 'image/jpeg', 'jpg')
+    }
+    
+    # Les clés sont uniques (nom d'origine horodaté) : les miniatures ne changent jamais
+    CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    
+    VARIANTS_FOLDER = 'variants'
+    
+    @classmethod
+    def get_sizes(cls) -> Tuple[int, ...]:
+        """Tailles générées, configurables via IMAGE_VARIANT_SIZES ("160,320")."""
+        if has_app_context() and current_app.config.get('IMAGE_VARIANT_SIZES'):
+            return tuple(sorted(int(size) for size in str(current_app.config['IMAGE_VARIANT_SIZES']).split(',') if size.strip()))
+        return cls.DEFAULT_SIZES
+    
+    @classmethod
+    def get_quality(cls) -> int:
+        if has_app_context():
+            return int(current_app.config.get('IMAGE_VARIANT_QUALITY', cls.DEFAULT_QUALITY))
+        return cls.DEFAULT_QUALITY
+    
+    @classmethod
+    def generate(cls, fileobj) -> List[Tuple[int, str, bytes]]:
+        """
+        Décline une image en miniatures carrées.
+        
+        Args:
+            fileobj: Fichier image (FileStorage ou objet fichier binaire)
+        
+        Returns:
+            Liste de (taille, format, contenu)
+        """
+        stream = getattr(fileobj, 'stream', fileobj)
+        stream.seek(0)
+        with Image.open(stream) as source:
+            # Première image des GIF animés, orientation EXIF appliquée
+            source.seek(0)
+            image = ImageOps.exif_transpose(source)
+            image.load()
+        stream.seek(0)
+        
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        
+        quality = cls.get_quality()
+        variants = []
+        for size in cls.get_sizes():
+            # Pas d'agrandissement : la plus petite dimension de l'original borne la taille
+            side = min(size, image.width, image.height)
+            thumbnail = ImageOps.fit(image, (side, side), method=Image.LANCZOS)
+            
+            for fmt, (pil_format, _, _) in cls.FORMATS.items():
+                output = thumbnail
+                if pil_format == 'JPEG' and thumbnail.mode == 'RGBA':
+                    # JPEG sans transparence : fond blanc
+                    output = Image.new('RGB', thumbnail.size, (255, 255, 255))
+                    output.paste(thumbnail, mask=thumbnail.getchannel('A'))
+                
+                options = {'progressive': True, 'optimize': True} if pil_format == 'JPEG' else {'method': 6}
+                buffer = io.BytesIO()
+                output.save(buffer, pil_format, quality=quality, **options)
+                variants.append((size, fmt, buffer.getvalue()))
+        
+        return variants
+    
+    @classmethod
+    def variant_name(cls, original_name: str, size: int, fmt: str) -> str:
+        """Nom d'une miniature : variants/<nom d'origine sans extension>-<taille>.<ext>"""
+        base = os.path.splitext(os.path.basename(original_name))[0]
+        return f"{cls.VARIANTS_FOLDER}/{base}-{size}.{cls.FORMATS[fmt][2]}"
+    
+    @classmethod
+    def store_in_spaces(cls, fileobj, original_key: str, spaces_service) -> Dict[str, Dict[str, str]]:
+        """
+        Génère et envoie les miniatures dans le même dossier Spaces que l'original.
+        
+        Returns:
+            {taille: {format: url}} (vide si l'image n'a pas pu être traitée)
+        """
+        folder = os.path.dirname(original_key)
+        variants = {}
+        for size, fmt, data in cls._safe_generate(fileobj):
+            key = f"{folder}/{cls.variant_name(original_key, size, fmt)}".lstrip('/')
+            result = spaces_service.upload_bytes(
+                data, key, cls.FORMATS[fmt][1],
+                cache_control=cls.CACHE_CONTROL
+            )
+            if not result['success']:
+                print(f"⚠️ Miniature non envoyée ({key}): {result['error']}")
+                continue
+            variants.setdefault(str(size), {})[fmt] = result['url']
+        
+        if variants:
+            print(f"🖼️ {sum(len(v) for v in variants.values())} miniature(s) créée(s) pour {original_key}")
+        return variants
+    
+    @classmethod
+    def store_locally(cls, fileobj, original_filename: str, upload_dir: str, url_prefix: str) -> Dict[str, Dict[str, str]]:
+        """
+        Génère et écrit les miniatures dans <upload_dir>/variants/.
+        
+        Returns:
+            {taille: {format: url}} (vide si l'image n'a pas pu être traitée)
+        """
+        variants = {}
+        for size, fmt, data in cls._safe_generate(fileobj):
+            name = cls.variant_name(original_filename, size, fmt)
+            path = os.path.join(upload_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            variants.setdefault(str(size), {})[fmt] = f"{url_prefix.rstrip('/')}/{name}"
+        return variants
+    
+    @classmethod
+    def delete(cls, variants: Optional[Dict[str, Dict[str, str]]], spaces_service=None, upload_dir: Optional[str] = None):
+        """Supprime les miniatures (Spaces si spaces_service, sinon fichiers de upload_dir)."""
+        for urls in (variants or {}).values():
+            for url in urls.values():
+                try:
+                    if spaces_service and url.startswith('http'):
+                        spaces_service.delete_file(spaces_service.key_from_url(url))
+                    elif upload_dir:
+                        path = os.path.join(upload_dir, cls.VARIANTS_FOLDER, os.path.basename(url))
+                        if os.path.exists(path):
+                            os.remove(path)
+                except Exception as e:
+                    print(f"⚠️ Erreur suppression miniature {url}: {e}")
+    
+    @classmethod
+    def _safe_generate(cls, fileobj) -> List[Tuple[int, str, bytes]]:
+        """generate() sans faire échouer l'upload de l'original si l'image est illisible."""
+        try:
+            return cls.generate(fileobj)
+        except Exception as e:
+            print(f"⚠️ Miniatures non générées: {e}")
+            return []
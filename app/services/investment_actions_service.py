@@ -196,7 +196,6 @@ class InvestmentActionsService:
                 from app.services.patrimony_calculation_engine import PatrimonyCalculationEngine
                 PatrimonyCalculationEngine.calculate_and_save_all(
                     user.investor_profile, 
-                    force_recalculate=True, 
                     save_to_db=True
                 )
                 print(f"🔄 Recalcul patrimonial effectué après validation action")
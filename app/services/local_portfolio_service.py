@@ -6,7 +6,8 @@ Utilise UNIQUEMENT les prix en base de données, AUCUN appel API.
 from datetime import datetime
 from typing import Optional, Dict, List
 from app import db
-from app.models.crypto_price import CryptoPrice
+from app.services.crypto_price_cache import CryptoPriceCache
+from app.services.patrimoine_categories import PatrimoineCategoryRegistry, round_cents
 
 
 class LocalPortfolioService:
@@ -27,8 +28,7 @@ class LocalPortfolioService:
             Prix EUR ou None si non trouvé
         """
         try:
-            crypto_price = CryptoPrice.query.filter_by(symbol=symbol).first()
-            return crypto_price.price_eur if crypto_price else None
+            return CryptoPriceCache.get_price(symbol)
         except:
             return None
     
@@ -41,13 +41,7 @@ class LocalPortfolioService:
             Dict {symbol: price_eur}
         """
         try:
-            prices = {}
-            crypto_prices = CryptoPrice.query.all()
-            
-            for crypto_price in crypto_prices:
-                prices[crypto_price.symbol] = crypto_price.price_eur
-            
-            return prices
+            return CryptoPriceCache.get_prices()
             
         except Exception as e:
             print(f"Erreur récupération prix DB: {e}")
@@ -67,27 +61,19 @@ class LocalPortfolioService:
         if not user_profile.cryptomonnaies_data:
             return 0.0
         
-        total_crypto = 0.0
         now = datetime.utcnow()
         
         # Récupérer tous les prix crypto en une fois
         all_prices = cls.get_all_crypto_prices_from_db()
         
-        for crypto in user_profile.cryptomonnaies_data:
-            symbol = crypto.get('symbol', '').lower()
-            quantity = crypto.get('quantity', 0)
-            
-            if symbol and quantity > 0 and symbol in all_prices:
-                price_eur = all_prices[symbol]
-                current_value = quantity * price_eur
-                total_crypto += current_value
-                
-                # Enrichir les données crypto pour l'affichage
-                crypto['current_price'] = price_eur
-                crypto['calculated_value'] = round(current_value, 2)
+        def enrich_crypto(crypto, details):
+            # Enrichir les données crypto pour l'affichage
+            if details:
+                crypto['current_price'] = details['price']
+                crypto['calculated_value'] = round(details['value'], 2)
                 crypto['last_updated'] = now.isoformat()
         
-        return total_crypto
+        return PatrimoineCategoryRegistry.evaluate(user_profile, 'crypto', prices=all_prices, on_item=enrich_crypto)
     
     @classmethod
     def update_user_calculated_totals(cls, user_profile, save_to_db: bool = True):
@@ -101,24 +87,21 @@ class LocalPortfolioService:
         try:
             # 1. Recalcul crypto
             total_crypto = cls.recalculate_user_crypto_portfolio(user_profile)
-            user_profile.calculated_total_cryptomonnaies = round(total_crypto, 2)
+            user_profile.calculated_total_cryptomonnaies = total_crypto
             
             # 2. Autres totaux patrimoniaux (liquidités, placements, etc.)
             cls._recalculate_other_totals(user_profile)
             
             # 3. Total patrimoine net
-            total_actifs = (
-                user_profile.calculated_total_liquidites or 0 +
-                user_profile.calculated_total_placements or 0 +
-                user_profile.calculated_total_immobilier_net or 0 +
-                user_profile.calculated_total_cryptomonnaies or 0 +
-                user_profile.calculated_total_autres_biens or 0
-            )
-            
-            total_passifs = user_profile.calculated_total_credits_consommation or 0
+            totals = {
+                category: getattr(user_profile, column)
+                for category, column in PatrimoineCategoryRegistry.COLUMNS.items()
+            }
+            total_actifs = PatrimoineCategoryRegistry.total_actifs(totals)
+            total_passifs = totals['credits'] or 0
             
-            user_profile.calculated_total_actifs = round(total_actifs, 2)
-            user_profile.calculated_patrimoine_total_net = round(total_actifs - total_passifs, 2)
+            user_profile.calculated_total_actifs = total_actifs
+            user_profile.calculated_patrimoine_total_net = round_cents(total_actifs - total_passifs)
             user_profile.last_calculation_date = datetime.utcnow()
             
             if save_to_db:
@@ -135,46 +118,12 @@ class LocalPortfolioService:
     def _recalculate_other_totals(cls, user_profile):
         """Recalcule les autres totaux patrimoniaux (non-crypto)."""
         try:
-            # Liquidités
-            total_liquidites = (
-                (user_profile.livret_a_value or 0) +
-                (user_profile.ldds_value or 0) +
-                (user_profile.pel_cel_value or 0) +
-                (user_profile.current_savings or 0)
-            )
-            
-            # Ajouter liquidités personnalisées
-            if user_profile.liquidites_personnalisees_data:
-                for liquidite in user_profile.liquidites_personnalisees_data:
-                    total_liquidites += liquidite.get('amount', 0)
-            
-            user_profile.calculated_total_liquidites = round(total_liquidites, 2)
-            
-            # Placements financiers
-            total_placements = (
-                (user_profile.pea_value or 0) +
-                (user_profile.per_value or 0) +
-                (user_profile.life_insurance_value or 0) +
-                (user_profile.cto_value or 0) +
-                (user_profile.pee_value or 0)
-            )
-            
-            # Ajouter placements personnalisés
-            if user_profile.placements_personnalises_data:
-                for placement in user_profile.placements_personnalises_data:
-                    total_placements += placement.get('amount', 0)
-                    
-            user_profile.calculated_total_placements = round(total_placements, 2)
-            
-            # Immobilier (simplifiée pour l'exemple)
-            user_profile.calculated_total_immobilier_net = user_profile.immobilier_value or 0
-            
-            # Autres biens - calcul depuis autres_biens_data
-            total_autres_biens = 0
-            if user_profile.autres_biens_data:
-                for bien in user_profile.autres_biens_data:
-                    total_autres_biens += bien.get('valeur', 0)
-            user_profile.calculated_total_autres_biens = round(total_autres_biens, 2)
+            for category in ('liquidites', 'placements', 'immobilier', 'autres_biens', 'credits'):
+                setattr(
+                    user_profile,
+                    PatrimoineCategoryRegistry.COLUMNS[category],
+                    PatrimoineCategoryRegistry.evaluate(user_profile, category)
+                )
             
         except Exception as e:
             print(f"Erreur recalcul autres totaux: {e}")
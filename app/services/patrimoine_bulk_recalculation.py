@@ -0,0 +1,167 @@
+"""
+Recalcul patrimonial en masse pour toute la base clients.
+Traite les profils par lots (un seul snapshot de prix, une écriture groupée et un commit par lot)
+pour tenir des dizaines de milliers de clients sans garder tous les objets ORM en mémoire.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from app import db
+from app.models.investor_profile import InvestorProfile
+from app.services.binance_price_service import BinancePriceService, PriceSnapshot
+from app.services.patrimoine_calculation import PatrimoineCalculationService
+from app.services.patrimoine_snapshot_service import PatrimoineSnapshotService
+
+
+class BulkPatrimoineRecalculationService:
+    """
+    Moteur de recalcul en masse des colonnes calculated_* de InvestorProfile.
+    """
+    
+    DEFAULT_CHUNK_SIZE = 500
+    
+    # Correspondance clé de résultat -> colonne InvestorProfile
+    RESULT_COLUMNS = {
+        'total_liquidites': 'calculated_total_liquidites',
+        'total_placements': 'calculated_total_placements',
+        'total_immobilier_net': 'calculated_total_immobilier_net',
+        'total_cryptomonnaies': 'calculated_total_cryptomonnaies',
+        'total_autres_biens': 'calculated_total_autres_biens',
+        'total_credits_consommation': 'calculated_total_credits_consommation',
+        'total_actifs': 'calculated_total_actifs',
+        'patrimoine_total_net': 'calculated_patrimoine_total_net'
+    }
+    
+    @classmethod
+    def recalculate_all(cls, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        price_snapshot: Optional[PriceSnapshot] = None,
+                        min_id: Optional[int] = None, max_id: Optional[int] = None,
+                        progress_callback=None) -> Dict:
+        """
+        Recalcule et sauvegarde les totaux de tous les profils (ou d'une plage d'IDs).
+        
+        Les profils sont parcourus par pagination sur la clé primaire (WHERE id > dernier ID du
+        lot précédent LIMIT chunk_size) : seul le lot courant est en mémoire. Chaque lot est
+        calculé avec le snapshot partagé, écrit via bulk_update_mappings puis committé et retiré
+        de la session. Les capitaux restants de tous les crédits du lot
+        sont calculés d'un coup par le moteur d'amortissement vectorisé.
+        
+        Args:
+            chunk_size: Nombre de profils par lot
+            price_snapshot: Snapshot de prix partagé (sinon construit depuis la base, sans API)
+            min_id: Premier ID de profil inclus (optionnel)
+            max_id: Dernier ID de profil inclus (optionnel)
+            progress_callback: Appelé après chaque lot avec le nombre de profils traités
+        
+        Returns:
+            Dict: Statistiques {profiles, errors, chunks, duration_seconds, profiles_per_second}
+        """
+        if price_snapshot is None:
+            price_snapshot = BinancePriceService.snapshot_from_cache()
+        
+        started = time.monotonic()
+        calculation_date = datetime.utcnow()
+        processed = 0
+        errors = 0
+        chunks = 0
+        last_id = min_id - 1 if min_id is not None else None
+        
+        while True:
+            query = InvestorProfile.query.order_by(InvestorProfile.id)
+            if last_id is not None:
+                query = query.filter(InvestorProfile.id > last_id)
+            if max_id is not None:
+                query = query.filter(InvestorProfile.id <= max_id)
+            
+            profiles = query.limit(chunk_size).all()
+            chunk_count = len(profiles)
+            if chunk_count == 0:
+                break
+            last_id = profiles[-1].id
+            
+            # Capital restant de tous les crédits du lot en un seul calcul vectorisé
+            remaining_capitals = cls._compute_remaining_capitals(profiles)
+            
+            mappings = []
+            for profile in profiles:
+                mapping = cls._compute_mapping(profile, price_snapshot, calculation_date, remaining_capitals)
+                if mapping is None:
+                    errors += 1
+                    continue
+                mappings.append(mapping)
+            
+            try:
+                db.session.bulk_update_mappings(InvestorProfile, mappings)
+                PatrimoineSnapshotService.record_mappings(mappings, calculation_date.date())
+                db.session.commit()
+            except Exception as e:
+                print(f"❌ Erreur sauvegarde lot (IDs <= {last_id}): {e}")
+                db.session.rollback()
+                errors += len(mappings)
+            finally:
+                # Libérer les objets ORM du lot
+                db.session.expunge_all()
+            
+            processed += chunk_count
+            chunks += 1
+            
+            if progress_callback:
+                progress_callback(processed)
+            
+            if chunk_count < chunk_size:
+                break
+        
+        duration = time.monotonic() - started
+        stats = {
+            'profiles': processed,
+            'errors': errors,
+            'chunks': chunks,
+            'duration_seconds': round(duration, 3),
+            'profiles_per_second': round(processed / duration, 1) if duration > 0 else float(processed)
+        }
+        
+        print(f"✅ Recalcul en masse: {processed} profils en {stats['duration_seconds']}s "
+              f"({stats['profiles_per_second']} profils/s, {errors} erreurs)")
+        return stats
+    
+    @classmethod
+    def _compute_remaining_capitals(cls, profiles: List[InvestorProfile]) -> Optional[Dict]:
+        """Précalcule les capitaux restants du lot (None = repli sur le calcul scalaire)."""
+        try:
+            return PatrimoineCalculationService.compute_remaining_capitals(profiles)
+        except Exception as e:
+            print(f"⚠️ Erreur calcul vectorisé des crédits du lot: {e}")
+            return None
+    
+    @classmethod
+    def _compute_mapping(cls, profile: InvestorProfile, price_snapshot: PriceSnapshot,
+                         calculation_date: datetime,
+                         remaining_capitals: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Calcule les totaux d'un profil et retourne la ligne à écrire en base.
+        
+        Returns:
+            Dict pour bulk_update_mappings ou None en cas d'erreur (le profil garde ses totaux
+            actuels au lieu de recevoir des zéros, et n'entre pas dans l'historique)
+        """
+        try:
+            results = PatrimoineCalculationService.compute_totaux(
+                profile,
+                force_crypto_update=True,
+                price_snapshot=price_snapshot,
+                remaining_capitals=remaining_capitals
+            )
+        except Exception as e:
+            print(f"❌ Erreur calcul profil {profile.id}: {e}")
+            return None
+        
+        mapping = {'id': profile.id, 'last_calculation_date': calculation_date}
+        for result_key, column in cls.RESULT_COLUMNS.items():
+            mapping[column] = results[result_key]
+        
+        # Les valeurs crypto enrichies (current_price, calculated_value) sont modifiées en place
+        if profile.cryptomonnaies_data:
+            mapping['cryptomonnaies_data_json'] = list(profile.cryptomonnaies_data)
+        
+        return mapping
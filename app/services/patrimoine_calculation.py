@@ -3,12 +3,17 @@ Service centralisé pour le calcul et la sauvegarde de tous les totaux patrimoni
 Gère les liquidités, placements, immobilier, cryptos, autres biens et patrimoine net.
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime, date
 from app import db
 from app.models.investor_profile import InvestorProfile
 from app.services.credit_calculation import CreditCalculationService
-from app.services.binance_price_service import BinancePriceService
+from app.services.credit_amortization_engine import CreditAmortizationEngine, LoanTerms
+from app.services.patrimoine_categories import (
+    PatrimoineCategoryRegistry, credit_loan_terms, immobilier_loan_terms, round_cents
+)
+from app.services.binance_price_service import BinancePriceService, PriceSnapshot
+from app.services.patrimoine_snapshot_service import PatrimoineSnapshotService
 
 
 class PatrimoineCalculationService:
@@ -20,7 +25,9 @@ class PatrimoineCalculationService:
     # Le service crypto est maintenant géré par BinancePriceService
     
     @classmethod
-    def calculate_all_totaux(cls, investor_profile: InvestorProfile, save_to_db: bool = True, force_crypto_update: bool = False) -> Dict:
+    def calculate_all_totaux(cls, investor_profile: InvestorProfile, save_to_db: bool = True, force_crypto_update: bool = False,
+                             price_snapshot: Optional[PriceSnapshot] = None,
+                             remaining_capitals: Optional[Dict[LoanTerms, float]] = None) -> Dict:
         """
         Calcule tous les totaux patrimoniaux et les sauvegarde en base.
         
@@ -28,49 +35,18 @@ class PatrimoineCalculationService:
             investor_profile: Profil investisseur
             save_to_db: Si True, sauvegarde les résultats en base
             force_crypto_update: Si True, force la mise à jour des prix crypto via API
+            price_snapshot: Snapshot de prix partagé par un batch (remplace l'appel API forcé)
+            remaining_capitals: Capitaux restants précalculés par lot (voir compute_remaining_capitals)
             
         Returns:
             Dict: Tous les totaux calculés
         """
         try:
-            results = {}
+            results = cls.compute_totaux(investor_profile, force_crypto_update, price_snapshot, remaining_capitals)
             
-            # 1. Calcul des liquidités
-            results['total_liquidites'] = cls._calculate_total_liquidites(investor_profile)
-            
-            # 2. Calcul des placements financiers
-            results['total_placements'] = cls._calculate_total_placements(investor_profile)
-            
-            # 3. Calcul de l'immobilier net
-            results['total_immobilier_net'] = cls._calculate_total_immobilier_net(investor_profile)
-            
-            # 4. Calcul des cryptomonnaies (avec ou sans mise à jour API)
-            if force_crypto_update:
-                results['total_cryptomonnaies'] = cls._calculate_total_cryptomonnaies(investor_profile)
-                # Sauvegarder immédiatement les données enrichies
-                if save_to_db:
-                    cls._save_crypto_data_to_db(investor_profile)
-            else:
-                # Utiliser les valeurs déjà en base ou calculer sans API
-                results['total_cryptomonnaies'] = cls._calculate_total_cryptomonnaies_cached(investor_profile)
-            
-            # 5. Calcul des autres biens
-            results['total_autres_biens'] = cls._calculate_total_autres_biens(investor_profile)
-            
-            # 6. Calcul des crédits de consommation
-            results['total_credits_consommation'] = cls._calculate_total_credits_consommation(investor_profile)
-            
-            # 7. Calcul du patrimoine total net
-            total_actifs = (
-                results['total_liquidites'] +
-                results['total_placements'] +
-                results['total_immobilier_net'] +
-                results['total_cryptomonnaies'] +
-                results['total_autres_biens']
-            )
-            
-            results['total_actifs'] = total_actifs
-            results['patrimoine_total_net'] = total_actifs - results['total_credits_consommation']
+            # Sauvegarder les données crypto enrichies
+            if force_crypto_update and save_to_db:
+                cls._save_crypto_data_to_db(investor_profile)
             
             # Sauvegarde en base de données
             if save_to_db:
@@ -83,133 +59,79 @@ class PatrimoineCalculationService:
             return cls._get_default_totaux()
     
     @classmethod
-    def _calculate_total_liquidites(cls, investor_profile: InvestorProfile) -> float:
-        """Calcule le total des liquidités."""
-        total = 0.0
+    def compute_totaux(cls, investor_profile: InvestorProfile, force_crypto_update: bool = False,
+                       price_snapshot: Optional[PriceSnapshot] = None,
+                       remaining_capitals: Optional[Dict[LoanTerms, float]] = None) -> Dict:
+        """
+        Calcule tous les totaux patrimoniaux sans rien sauvegarder.
+        Contrairement à calculate_all_totaux, une erreur de calcul est propagée
+        (pas de totaux à zéro) : le recalcul en masse peut ignorer le profil.
         
-        print(f"🔍 DEBUG _calculate_total_liquidites:")
+        Returns:
+            Dict: Tous les totaux calculés
+        """
+        results = {}
         
-        # Liquidités standards - vérifier que les attributs existent
-        if hasattr(investor_profile, 'has_livret_a') and investor_profile.has_livret_a and hasattr(investor_profile, 'livret_a_value') and investor_profile.livret_a_value:
-            print(f"  - Livret A: {investor_profile.livret_a_value}€")
-            total += investor_profile.livret_a_value
-            
-        if hasattr(investor_profile, 'has_ldds') and investor_profile.has_ldds and hasattr(investor_profile, 'ldds_value') and investor_profile.ldds_value:
-            print(f"  - LDDS: {investor_profile.ldds_value}€")
-            total += investor_profile.ldds_value
-            
-        if hasattr(investor_profile, 'has_pel_cel') and investor_profile.has_pel_cel and hasattr(investor_profile, 'pel_cel_value') and investor_profile.pel_cel_value:
-            print(f"  - PEL/CEL: {investor_profile.pel_cel_value}€")
-            total += investor_profile.pel_cel_value
-            
-        # IMPORTANT: Épargne courante (current_savings)
-        if hasattr(investor_profile, 'current_savings') and investor_profile.current_savings:
-            print(f"  - Épargne courante: {investor_profile.current_savings}€")
-            total += investor_profile.current_savings
-            
-        if hasattr(investor_profile, 'has_autres_livrets') and investor_profile.has_autres_livrets and hasattr(investor_profile, 'autres_livrets_value') and investor_profile.autres_livrets_value:
-            print(f"  - Autres livrets: {investor_profile.autres_livrets_value}€")
-            total += investor_profile.autres_livrets_value
+        # 1. Calcul des liquidités
+        results['total_liquidites'] = cls._calculate_total_liquidites(investor_profile)
+        
+        # 2. Calcul des placements financiers
+        results['total_placements'] = cls._calculate_total_placements(investor_profile)
+        
+        # 3. Calcul de l'immobilier net
+        results['total_immobilier_net'] = cls._calculate_total_immobilier_net(investor_profile, remaining_capitals)
         
-        # Liquidités personnalisées
-        if investor_profile.liquidites_personnalisees_data:
-            print(f"  - Liquidités personnalisées:")
-            for liquidite in investor_profile.liquidites_personnalisees_data:
-                valeur = liquidite.get('amount', 0)
-                print(f"    * {liquidite.get('name', 'N/A')}: {valeur}€")
-                total += valeur
+        # 4. Calcul des cryptomonnaies (avec ou sans mise à jour API)
+        if force_crypto_update:
+            results['total_cryptomonnaies'] = cls._calculate_total_cryptomonnaies(investor_profile, price_snapshot)
+        else:
+            # Utiliser les valeurs déjà en base ou calculer sans API
+            results['total_cryptomonnaies'] = cls._calculate_total_cryptomonnaies_cached(investor_profile)
         
-        print(f"  ✅ Total liquidités calculé: {total}€")
-        return round(total, 2)
+        # 5. Calcul des autres biens
+        results['total_autres_biens'] = cls._calculate_total_autres_biens(investor_profile)
+        
+        # 6. Calcul des crédits de consommation
+        results['total_credits_consommation'] = cls._calculate_total_credits_consommation(investor_profile, remaining_capitals)
+        
+        # 7. Calcul du patrimoine total net
+        total_actifs = PatrimoineCategoryRegistry.total_actifs({
+            'liquidites': results['total_liquidites'],
+            'placements': results['total_placements'],
+            'immobilier': results['total_immobilier_net'],
+            'crypto': results['total_cryptomonnaies'],
+            'autres_biens': results['total_autres_biens']
+        })
+        
+        results['total_actifs'] = total_actifs
+        results['patrimoine_total_net'] = round_cents(total_actifs - results['total_credits_consommation'])
+        
+        return results
+    
+    @classmethod
+    def _calculate_total_liquidites(cls, investor_profile: InvestorProfile) -> float:
+        """Calcule le total des liquidités."""
+        return PatrimoineCategoryRegistry.evaluate(investor_profile, 'liquidites')
     
     @classmethod
     def _calculate_total_placements(cls, investor_profile: InvestorProfile) -> float:
         """Calcule le total des placements financiers."""
-        total = 0.0
-        
-        # Placements standards - vérifier que les attributs existent
-        if hasattr(investor_profile, 'has_pea') and investor_profile.has_pea and hasattr(investor_profile, 'pea_value') and investor_profile.pea_value:
-            total += investor_profile.pea_value
-            
-        if hasattr(investor_profile, 'has_per') and investor_profile.has_per and hasattr(investor_profile, 'per_value') and investor_profile.per_value:
-            total += investor_profile.per_value
-            
-        if hasattr(investor_profile, 'has_life_insurance') and investor_profile.has_life_insurance and hasattr(investor_profile, 'life_insurance_value') and investor_profile.life_insurance_value:
-            total += investor_profile.life_insurance_value
-            
-        if hasattr(investor_profile, 'has_pee') and investor_profile.has_pee and hasattr(investor_profile, 'pee_value') and investor_profile.pee_value:
-            total += investor_profile.pee_value
-            
-        if hasattr(investor_profile, 'has_scpi') and investor_profile.has_scpi and hasattr(investor_profile, 'scpi_value') and investor_profile.scpi_value:
-            total += investor_profile.scpi_value
-            
-        if hasattr(investor_profile, 'has_cto') and investor_profile.has_cto and hasattr(investor_profile, 'cto_value') and investor_profile.cto_value:
-            total += investor_profile.cto_value
-            
-        if hasattr(investor_profile, 'has_private_equity') and investor_profile.has_private_equity and hasattr(investor_profile, 'private_equity_value') and investor_profile.private_equity_value:
-            total += investor_profile.private_equity_value
-            
-        if hasattr(investor_profile, 'has_crowdfunding') and investor_profile.has_crowdfunding and hasattr(investor_profile, 'crowdfunding_value') and investor_profile.crowdfunding_value:
-            total += investor_profile.crowdfunding_value
-        
-        # Placements personnalisés
-        if investor_profile.placements_personnalises_data:
-            for placement in investor_profile.placements_personnalises_data:
-                total += placement.get('amount', 0)
-        
-        return round(total, 2)
+        return PatrimoineCategoryRegistry.evaluate(investor_profile, 'placements')
     
     @classmethod
-    def _calculate_total_immobilier_net(cls, investor_profile: InvestorProfile) -> float:
-        """Calcule le total de l'immobilier net (valeur - crédits immobiliers)."""
-        total = 0.0
-        
-        if investor_profile.immobilier_data:
-            for bien in investor_profile.immobilier_data:
-                valeur = bien.get('valeur', 0)
-                
-                # Soustraction du crédit immobilier s'il existe
-                if bien.get('has_credit', False):
-                    # Récupération des données de crédit immobilier
-                    credit_initial = bien.get('credit_montant', 0)
-                    credit_taux = bien.get('credit_tag', 0)  # Dans immobilier_data c'est 'credit_tag' pas 'credit_taux'
-                    credit_duree_annees = bien.get('credit_duree', 0)  # En années
-                    credit_duree_mois = credit_duree_annees * 12 if credit_duree_annees else 0
-                    credit_date_debut = bien.get('credit_date', '')  # Dans immobilier_data c'est 'credit_date'
-                    
-                    if all([credit_initial, credit_duree_mois, credit_date_debut]):
-                        try:
-                            # Parse de la date (format 2025-10)
-                            if isinstance(credit_date_debut, str) and len(credit_date_debut) == 7:
-                                year, month = credit_date_debut.split('-')
-                                start_date = date(int(year), int(month), 1)
-                            elif isinstance(credit_date_debut, str):
-                                start_date = datetime.strptime(credit_date_debut, '%Y-%m-%d').date()
-                            else:
-                                start_date = credit_date_debut
-                            
-                            # Calcul dynamique pour tous les cas
-                            capital_restant = CreditCalculationService.calculate_remaining_capital(
-                                credit_initial, credit_taux, credit_duree_mois, start_date
-                            )
-                            valeur_nette = valeur - capital_restant
-                        except Exception as e:
-                            print(f"Erreur calcul crédit immobilier: {e}")
-                            # En cas d'erreur, utiliser le montant initial
-                            valeur_nette = valeur - credit_initial
-                    else:
-                        valeur_nette = valeur - credit_initial
-                else:
-                    valeur_nette = valeur
-                
-                total += valeur_nette
-        
-        return round(total, 2)
+    def _calculate_total_immobilier_net(cls, investor_profile: InvestorProfile,
+                                        remaining_capitals: Optional[Dict[LoanTerms, float]] = None) -> float:
+        """Calcule le total de l'immobilier net (valeur - capital restant des crédits immobiliers)."""
+        return PatrimoineCategoryRegistry.evaluate(
+            investor_profile, 'immobilier', remaining_capitals=remaining_capitals
+        )
     
     @classmethod
-    def _calculate_total_cryptomonnaies(cls, investor_profile: InvestorProfile) -> float:
+    def _calculate_total_cryptomonnaies(cls, investor_profile: InvestorProfile,
+                                        price_snapshot: Optional[PriceSnapshot] = None) -> float:
         """
         Calcule le total des cryptomonnaies avec les prix depuis Binance/DB.
+        Si un snapshot est fourni, il est utilisé tel quel sans nouvel appel Binance.
         """
         if not investor_profile.cryptomonnaies_data:
             return 0.0
@@ -225,36 +147,32 @@ class PatrimoineCalculationService:
             if not symbols_needed:
                 return 0.0
             
-            # Récupérer les prix depuis Binance/DB avec mise à jour forcée
-            print(f"🔄 Récupération des prix crypto via Binance...")
+            # Récupérer les prix depuis le snapshot partagé ou Binance/DB avec mise à jour forcée
+            if price_snapshot is None:
+                print(f"🔄 Récupération des prix crypto via Binance...")
             prices = BinancePriceService.get_crypto_prices_for_symbols(
                 symbols_needed, 
-                force_update=True
+                force_update=price_snapshot is None,
+                snapshot=price_snapshot
             )
             
-            total = 0.0
-            for crypto in investor_profile.cryptomonnaies_data:
-                symbol = crypto.get('symbol', '').lower()
-                quantity = crypto.get('quantity', 0)
-                
-                if symbol in prices:
-                    current_price = prices[symbol]
-                    value = quantity * current_price
-                    total += value
-                    
+            def enrich_crypto(crypto, details):
+                if details:
                     # Stocker les valeurs calculées dans les données crypto
-                    crypto['calculated_value'] = round(value, 2)
-                    crypto['current_price'] = current_price
-                    print(f"💰 {symbol}: {quantity} x €{current_price:.2f} = €{round(value, 2)}")
+                    crypto['calculated_value'] = round(details['value'], 2)
+                    crypto['current_price'] = details['price']
                 else:
-                    print(f"⚠️ Prix indisponible pour {symbol}")
+                    print(f"⚠️ Prix indisponible pour {crypto.get('symbol')}")
                     # Garder les anciennes valeurs si disponibles
                     if 'calculated_value' not in crypto:
                         crypto['calculated_value'] = 0.0
                         crypto['current_price'] = 0.0
             
-            print(f"🎯 Total crypto: €{round(total, 2)}")
-            return round(total, 2)
+            total = PatrimoineCategoryRegistry.evaluate(
+                investor_profile, 'crypto', prices=prices, on_item=enrich_crypto
+            )
+            print(f"🎯 Total crypto: €{total}")
+            return total
             
         except Exception as e:
             print(f"❌ Erreur calcul crypto Binance: {e}")
@@ -331,81 +249,50 @@ class PatrimoineCalculationService:
     @classmethod
     def _calculate_total_autres_biens(cls, investor_profile: InvestorProfile) -> float:
         """Calcule le total des autres biens."""
-        total = 0.0
-        
-        print(f"🔍 DEBUG _calculate_total_autres_biens:")
-        
-        # Autres biens standard
-        if hasattr(investor_profile, 'has_autres_biens') and investor_profile.has_autres_biens and hasattr(investor_profile, 'autres_biens_value') and investor_profile.autres_biens_value:
-            print(f"  - Autres biens standard: {investor_profile.autres_biens_value}€")
-            total += investor_profile.autres_biens_value
+        return PatrimoineCategoryRegistry.evaluate(investor_profile, 'autres_biens')
+    
+    @classmethod
+    def _calculate_total_credits_consommation(cls, investor_profile: InvestorProfile,
+                                              remaining_capitals: Optional[Dict[LoanTerms, float]] = None) -> float:
+        """Calcule le total des crédits de consommation restants."""
         
-        # Autres biens détaillés
-        print(f"  - autres_biens_data existe: {hasattr(investor_profile, 'autres_biens_data')}")
-        if hasattr(investor_profile, 'autres_biens_data'):
-            autres_biens_data = investor_profile.autres_biens_data
-            print(f"  - autres_biens_data contenu: {autres_biens_data}")
-            if autres_biens_data:
-                for bien in autres_biens_data:
-                    valeur = bien.get('valeur', 0)
-                    print(f"    * {bien.get('name', 'N/A')}: {valeur}€")
-                    total += valeur
-            else:
-                print(f"  - autres_biens_data est vide ou None")
+        def annotate_credit(credit, details):
+            # Mise à jour du crédit avec les valeurs calculées
+            terms = details['terms']
+            if terms:
+                credit['capital_restant'] = details['capital_restant']
+                credit['mensualite'] = CreditCalculationService.calculate_monthly_payment(*terms[:3])
         
-        print(f"  ✅ Total autres biens calculé: {total}€")
-        return round(total, 2)
+        return PatrimoineCategoryRegistry.evaluate(
+            investor_profile, 'credits', remaining_capitals=remaining_capitals, on_item=annotate_credit
+        )
     
     @classmethod
-    def _calculate_total_credits_consommation(cls, investor_profile: InvestorProfile) -> float:
-        """Calcule le total des crédits de consommation restants."""
-        total = 0.0
+    def compute_remaining_capitals(cls, profiles: Iterable[InvestorProfile],
+                                   current_date: Optional[date] = None) -> Dict[LoanTerms, float]:
+        """
+        Calcule en un seul passage vectorisé le capital restant dû de tous les crédits
+        et prêts immobiliers d'un ensemble de profils.
         
-        if hasattr(investor_profile, 'credits_data') and investor_profile.credits_data:
-            for credit in investor_profile.credits_data:
-                # Calcul du capital restant précis - adapter aux différentes structures
-                montant_initial = credit.get('montant_initial', 0)
-                taux_interet = credit.get('taux', 0)  # Dans credits_data c'est 'taux' pas 'taux_interet'
-                duree_annees = credit.get('duree', 0)  # Dans credits_data c'est en années
-                duree_mois = duree_annees * 12 if duree_annees else 0
-                date_debut_str = credit.get('date_depart', '')
-                
-                if all([montant_initial, duree_mois, date_debut_str]):
-                    try:
-                        # Parse de la date de début (format 2025-10 ou 2025-01)
-                        if '/' in date_debut_str:
-                            month, year = date_debut_str.split('/')
-                            start_date = date(int(year), int(month), 1)
-                        elif len(date_debut_str) == 7 and '-' in date_debut_str:
-                            year, month = date_debut_str.split('-')
-                            start_date = date(int(year), int(month), 1)
-                        else:
-                            start_date = datetime.strptime(date_debut_str, '%Y-%m-%d').date()
-                        
-                        # Calcul du capital restant
-                        capital_restant = CreditCalculationService.calculate_remaining_capital(
-                            montant_initial, taux_interet, duree_mois, start_date
-                        )
-                        
-                        # Mise à jour du crédit avec les valeurs calculées
-                        mensualite = CreditCalculationService.calculate_monthly_payment(
-                            montant_initial, taux_interet, duree_mois
-                        )
-                        
-                        credit['capital_restant'] = capital_restant
-                        credit['mensualite'] = mensualite
-                        
-                        total += capital_restant
-                        
-                    except Exception as e:
-                        print(f"Erreur calcul crédit consommation: {e}")
-                        # En cas d'erreur, utiliser le montant initial
-                        total += montant_initial
-                else:
-                    # Données incomplètes, utiliser le montant initial
-                    total += montant_initial
+        Args:
+            profiles: Profils investisseurs (typiquement un lot du recalcul en masse)
+            current_date: Date de calcul (défaut: aujourd'hui)
         
-        return round(total, 2)
+        Returns:
+            Dict: {conditions du prêt: capital restant dû}, à passer à calculate_all_totaux
+        """
+        loans = []
+        for profile in profiles:
+            for bien in profile.immobilier_data or []:
+                terms = immobilier_loan_terms(bien) if bien.get('has_credit', False) else None
+                if terms:
+                    loans.append(terms)
+            for credit in profile.credits_data or []:
+                terms = credit_loan_terms(credit)
+                if terms:
+                    loans.append(terms)
+        
+        return CreditAmortizationEngine.remaining_capital_lookup(loans, current_date)
     
     # Ancienne méthode CoinGecko supprimée - remplacée par BinancePriceService
     
@@ -468,6 +355,9 @@ class PatrimoineCalculationService:
             investor_profile.calculated_patrimoine_total_net = totaux['patrimoine_total_net']
             investor_profile.last_calculation_date = datetime.utcnow()
             
+            # Historique : snapshot du jour (ignoré si les totaux n'ont pas changé)
+            PatrimoineSnapshotService.record(investor_profile)
+            
             print(f"  - Après: liquidites={investor_profile.calculated_total_liquidites}")
             print(f"  - Appel db.session.commit()...")
             
@@ -501,16 +391,19 @@ class PatrimoineCalculationService:
         }
     
     @classmethod
-    def update_all_users_patrimoine(cls):
-        """Met à jour les calculs patrimoniaux pour tous les utilisateurs."""
+    def update_all_users_patrimoine(cls, chunk_size: int = 500) -> Optional[Dict]:
+        """
+        Met à jour les calculs patrimoniaux pour tous les utilisateurs.
+        Délègue au moteur de recalcul en masse (lots, snapshot de prix partagé).
+        
+        Returns:
+            Dict: Statistiques du recalcul ou None en cas d'erreur
+        """
         try:
-            profiles = InvestorProfile.query.all()
-            
-            for profile in profiles:
-                print(f"Mise à jour du patrimoine pour l'utilisateur {profile.user_id}")
-                cls.calculate_all_totaux(profile, save_to_db=True)
+            from app.services.patrimoine_bulk_recalculation import BulkPatrimoineRecalculationService
             
-            print(f"Mise à jour terminée pour {len(profiles)} profils")
+            return BulkPatrimoineRecalculationService.recalculate_all(chunk_size=chunk_size)
             
         except Exception as e:
-            print(f"Erreur lors de la mise à jour globale: {e}")
\ No newline at end of file
+            print(f"Erreur lors de la mise à jour globale: {e}")
+            return None
\ No newline at end of file
@@ -5,6 +5,7 @@ Calcule et sauvegarde tous les sous-totaux et le total ÉPARGNE & PATRIMOINE.
 
 from app import db
 from datetime import datetime
+from app.services.patrimoine_categories import PatrimoineCategoryRegistry, round_cents
 
 
 class PatrimoineCalculationService:
@@ -51,13 +52,13 @@ class PatrimoineCalculationService:
             totaux['autres_biens'] = total_autres_biens
             
             # 6. TOTAL ÉPARGNE & PATRIMOINE (somme de tous les actifs)
-            total_actifs = (
-                total_liquidites +
-                total_placements + 
-                total_immobilier +
-                total_cryptos +
-                total_autres_biens
-            )
+            total_actifs = PatrimoineCategoryRegistry.total_actifs({
+                'liquidites': total_liquidites,
+                'placements': total_placements,
+                'immobilier': total_immobilier,
+                'crypto': total_cryptos,
+                'autres_biens': total_autres_biens
+            })
             investor_profile.calculated_total_actifs = total_actifs
             totaux['total_actifs'] = total_actifs
             
@@ -67,7 +68,7 @@ class PatrimoineCalculationService:
             totaux['total_credits'] = total_credits
             
             # 8. PATRIMOINE NET TOTAL (actifs - passifs)
-            patrimoine_net = total_actifs - total_credits
+            patrimoine_net = round_cents(total_actifs - total_credits)
             investor_profile.calculated_patrimoine_total_net = patrimoine_net
             totaux['patrimoine_net'] = patrimoine_net
             
@@ -88,39 +89,12 @@ class PatrimoineCalculationService:
     @classmethod
     def _calculate_total_liquidites(cls, profile):
         """Calcule le total des liquidités."""
-        total = 0
-        
-        # Comptes épargne classiques
-        total += profile.livret_a_value or 0
-        total += profile.ldds_value or 0
-        total += profile.pel_cel_value or 0
-        total += profile.current_savings or 0
-        
-        # Liquidités personnalisées
-        if profile.liquidites_personnalisees_data:
-            for liquidite in profile.liquidites_personnalisees_data:
-                total += liquidite.get('amount', 0)
-                
-        return round(total, 2)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'liquidites')
     
     @classmethod
     def _calculate_total_placements(cls, profile):
         """Calcule le total des placements financiers."""
-        total = 0
-        
-        # Placements classiques
-        total += profile.pea_value or 0
-        total += profile.per_value or 0
-        total += profile.life_insurance_value or 0
-        total += profile.cto_value or 0
-        total += profile.pee_value or 0
-        
-        # Placements personnalisés
-        if profile.placements_personnalises_data:
-            for placement in profile.placements_personnalises_data:
-                total += placement.get('amount', 0)
-                
-        return round(total, 2)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'placements')
     
     @classmethod
     def _calculate_total_immobilier(cls, profile):
@@ -147,21 +121,9 @@ class PatrimoineCalculationService:
     @classmethod
     def _calculate_total_autres_biens(cls, profile):
         """Calcule le total des autres biens."""
-        total = 0
-        
-        if profile.autres_biens_data:
-            for bien in profile.autres_biens_data:
-                total += bien.get('valeur', 0)
-                
-        return round(total, 2)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'autres_biens')
     
     @classmethod
     def _calculate_total_credits(cls, profile):
         """Calcule le total des crédits (hors immobilier)."""
-        total = 0
-        
-        if profile.credits_data:
-            for credit in profile.credits_data:
-                total += credit.get('montant_restant', credit.get('montant_initial', 0))
-                
-        return round(total, 2)
\ No newline at end of file
+        return PatrimoineCategoryRegistry.evaluate(profile, 'credits')
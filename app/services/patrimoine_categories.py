@@ -0,0 +1,372 @@
+"""
+Registre déclaratif des catégories patrimoniales.
+Chaque catégorie liste ses champs (avec leur case à cocher has_*), ses sources JSONB et sa règle
+d'agrégation. Le registre est compilé une seule fois à l'import en évaluateurs réutilisés par tous
+les moteurs de calcul (PatrimonyCalculationEngine, PatrimoineCalculationService, LocalPortfolioService...).
+"""
+
+import math
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from operator import attrgetter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from app.services.credit_amortization_engine import LoanTerms
+from app.services.credit_calculation import CreditCalculationService
+
+
+class Field(NamedTuple):
+    """Colonne numérique du profil, comptée seulement si sa case à cocher (flag) est cochée."""
+    attribute: str
+    flag: Optional[str] = None
+
+
+class ListSource(NamedTuple):
+    """Liste JSONB du profil agrégée par une règle (voir RULES)."""
+    attribute: str
+    rule: str
+    key: Optional[str] = None
+    fallback: Optional[str] = None  # Colonne utilisée si la liste est vide
+
+
+class Category(NamedTuple):
+    """Catégorie patrimoniale et colonne calculated_* associée."""
+    name: str
+    column: str
+    fields: Tuple[Field, ...] = ()
+    lists: Tuple[ListSource, ...] = ()
+    monthly: bool = False  # Dépend du mois courant (capital restant dû des crédits)
+
+
+REGISTRY = (
+    Category(
+        'liquidites', 'calculated_total_liquidites',
+        fields=(
+            Field('livret_a_value', 'has_livret_a'),
+            Field('ldds_value', 'has_ldds'),
+            Field('pel_cel_value', 'has_pel_cel'),
+            Field('autres_livrets_value', 'has_autres_livrets'),
+            Field('current_savings'),
+        ),
+        lists=(ListSource('liquidites_personnalisees_data', 'sum', 'amount'),)
+    ),
+    Category(
+        'placements', 'calculated_total_placements',
+        fields=(
+            Field('pea_value', 'has_pea'),
+            Field('per_value', 'has_per'),
+            Field('life_insurance_value', 'has_life_insurance'),
+            Field('pee_value', 'has_pee'),
+            Field('scpi_value', 'has_scpi'),
+            Field('cto_value', 'has_cto'),
+            Field('private_equity_value', 'has_private_equity'),
+            Field('crowdfunding_value', 'has_crowdfunding'),
+        ),
+        lists=(ListSource('placements_personnalises_data', 'sum', 'amount'),)
+    ),
+    Category(
+        'immobilier', 'calculated_total_immobilier_net',
+        lists=(ListSource('immobilier_data', 'immobilier_net', fallback='immobilier_value'),),
+        monthly=True
+    ),
+    Category(
+        'crypto', 'calculated_total_cryptomonnaies',
+        lists=(ListSource('cryptomonnaies_data', 'crypto_valuation'),)
+    ),
+    Category(
+        'autres_biens', 'calculated_total_autres_biens',
+        fields=(Field('autres_biens_value', 'has_autres_biens'),),
+        lists=(ListSource('autres_biens_data', 'sum', 'valeur'),)
+    ),
+    Category(
+        'credits', 'calculated_total_credits_consommation',
+        lists=(ListSource('credits_data', 'credits_remaining'),),
+        monthly=True
+    ),
+)
+
+# Catégories d'actifs (le patrimoine net soustrait 'credits')
+ASSET_CATEGORIES = ('liquidites', 'placements', 'immobilier', 'crypto', 'autres_biens')
+
+
+def round_cents(value) -> float:
+    """Arrondi au centime (demi supérieur), identique pour tous les moteurs."""
+    return float(Decimal(repr(float(value))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def _to_float(value) -> float:
+    """Montant JSONB (nombre, chaîne ou None) en float."""
+    return float(value or 0)
+
+
+def parse_loan_start(value) -> Optional[date]:
+    """
+    Date de début d'un crédit depuis les formats saisis ('2025-10', '2025-10-01', '10/2025').
+    
+    Returns:
+        date ou None si le format n'est pas reconnu
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    
+    value = value.strip()
+    try:
+        if '/' in value:
+            month, year = value.split('/')
+            return date(int(year), int(month), 1)
+        if '-' in value and len(value) >= 7:
+            year, month = value[:7].split('-')
+            return date(int(year), int(month), 1)
+    except (ValueError, TypeError):
+        return None
+    return None
+
+
+def immobilier_loan_terms(bien: Dict) -> Optional[LoanTerms]:
+    """
+    Conditions du crédit d'un bien immobilier.
+    Le taux est saisi en TAEG ('credit_taeg'), les anciennes données utilisent 'credit_tag'.
+    
+    Returns:
+        (capital, taux, durée en mois, date de début) ou None si données incomplètes
+    """
+    principal = _to_float(bien.get('credit_montant'))
+    rate = _to_float(bien.get('credit_taeg') or bien.get('credit_tag'))
+    duration_months = int(_to_float(bien.get('credit_duree'))) * 12  # En années dans la base
+    start_date = parse_loan_start(bien.get('credit_date'))
+    
+    if principal <= 0 or duration_months <= 0 or start_date is None:
+        return None
+    return (principal, rate, duration_months, start_date)
+
+
+def credit_loan_terms(credit: Dict) -> Optional[LoanTerms]:
+    """
+    Conditions d'un crédit de consommation.
+    
+    Returns:
+        (capital, taux, durée en mois, date de début) ou None si données incomplètes
+    """
+    principal = _to_float(credit.get('montant_initial'))
+    rate = _to_float(credit.get('taux'))  # Dans credits_data c'est 'taux' pas 'taux_interet'
+    duration_months = int(_to_float(credit.get('duree'))) * 12  # Dans credits_data c'est en années
+    start_date = parse_loan_start(credit.get('date_depart'))
+    
+    if principal <= 0 or duration_months <= 0 or start_date is None:
+        return None
+    return (principal, rate, duration_months, start_date)
+
+
+def remaining_capital(terms: LoanTerms, options: Dict) -> float:
+    """Capital restant dû : valeur précalculée du lot si disponible, sinon calcul scalaire."""
+    lookup = options.get('remaining_capitals')
+    if lookup is not None and terms in lookup:
+        return lookup[terms]
+    return CreditCalculationService.calculate_remaining_capital(*terms, current_date=options.get('current_date'))
+
+
+# ==================== RÈGLES D'AGRÉGATION ====================
+
+def _rule_sum(items: List[Dict], key: str, options: Dict) -> float:
+    """Somme d'une clé sur tous les éléments de la liste."""
+    return math.fsum(_to_float(item.get(key)) for item in items)
+
+
+def _rule_immobilier_net(items: List[Dict], key: str, options: Dict) -> float:
+    """Valeur des biens moins le capital restant dû de leur crédit."""
+    on_item = options.get('on_item')
+    parts = []
+    for bien in items:
+        parts.append(_to_float(bien.get('valeur')))
+        if not bien.get('has_credit', False):
+            continue
+        
+        terms = immobilier_loan_terms(bien)
+        # Données de crédit incomplètes : on retient le montant emprunté
+        capital_restant = remaining_capital(terms, options) if terms else _to_float(bien.get('credit_montant'))
+        parts.append(-capital_restant)
+        if on_item:
+            on_item(bien, {'capital_restant': capital_restant, 'terms': terms})
+    return math.fsum(parts)
+
+
+def _rule_credits_remaining(items: List[Dict], key: str, options: Dict) -> float:
+    """Capital restant dû des crédits (montant restant saisi si les conditions sont incomplètes)."""
+    on_item = options.get('on_item')
+    parts = []
+    for credit in items:
+        terms = credit_loan_terms(credit)
+        if terms:
+            capital_restant = remaining_capital(terms, options)
+        else:
+            capital_restant = _to_float(credit.get('montant_restant', credit.get('montant_initial')))
+        parts.append(capital_restant)
+        if on_item:
+            on_item(credit, {'capital_restant': capital_restant, 'terms': terms})
+    return math.fsum(parts)
+
+
+def _rule_crypto_valuation(items: List[Dict], key: str, options: Dict) -> float:
+    """Quantité x prix EUR pour chaque crypto détenue dont le prix est connu."""
+    prices = options.get('prices') or {}
+    on_item = options.get('on_item')
+    parts = []
+    for crypto in items:
+        symbol = (crypto.get('symbol') or '').lower()
+        quantity = _to_float(crypto.get('quantity'))
+        price = prices.get(symbol)
+        if quantity <= 0 or price is None:
+            if on_item:
+                on_item(crypto, None)
+            continue
+        
+        value = quantity * price
+        parts.append(value)
+        if on_item:
+            on_item(crypto, {'price': price, 'value': value})
+    return math.fsum(parts)
+
+
+RULES = {
+    'sum': _rule_sum,
+    'immobilier_net': _rule_immobilier_net,
+    'credits_remaining': _rule_credits_remaining,
+    'crypto_valuation': _rule_crypto_valuation
+}
+
+
+# ==================== COMPILATION ====================
+
+def _compile(category: Category) -> Tuple[Callable, Callable]:
+    """
+    Compile une catégorie en évaluateur : un seul attrgetter pour tous les champs et
+    leurs cases à cocher, des règles résolues une fois pour toutes.
+    
+    Returns:
+        (évaluateur du total, extracteur des entrées pour les empreintes)
+    """
+    attributes = []
+    plan = []  # (index valeur, index case à cocher ou None)
+    for field in category.fields:
+        attributes.append(field.attribute)
+        value_index = len(attributes) - 1
+        flag_index = None
+        if field.flag:
+            attributes.append(field.flag)
+            flag_index = len(attributes) - 1
+        plan.append((value_index, flag_index))
+    
+    if len(attributes) > 1:
+        get_fields = attrgetter(*attributes)
+    elif attributes:
+        single = attrgetter(attributes[0])
+        get_fields = lambda profile: (single(profile),)
+    else:
+        get_fields = lambda profile: ()
+    
+    sources = [
+        (attrgetter(source.attribute), RULES[source.rule], source.key,
+         attrgetter(source.fallback) if source.fallback else None)
+        for source in category.lists
+    ]
+    
+    def evaluate(profile, options: Dict) -> float:
+        values = get_fields(profile)
+        parts = [
+            values[value_index] for value_index, flag_index in plan
+            if values[value_index] and (flag_index is None or values[flag_index])
+        ]
+        for get_items, rule, key, get_fallback in sources:
+            items = get_items(profile)
+            if items:
+                parts.append(rule(items, key, options))
+            elif get_fallback:
+                parts.append(get_fallback(profile) or 0)
+        return round_cents(math.fsum(parts))
+    
+    def inputs(profile) -> list:
+        data = list(get_fields(profile))
+        data.extend(get_items(profile) for get_items, _, _, _ in sources)
+        data.extend(get_fallback(profile) for _, _, _, get_fallback in sources if get_fallback)
+        return data
+    
+    return evaluate, inputs
+
+
+class PatrimoineCategoryRegistry:
+    """
+    Point d'entrée unique des calculs par catégorie, compilé à l'import.
+    """
+    
+    CATEGORIES = {category.name: category for category in REGISTRY}
+    COLUMNS = {category.name: category.column for category in REGISTRY}
+    
+    _evaluators = {}
+    _inputs = {}
+    
+    @classmethod
+    def compile(cls):
+        """Compile toutes les catégories (appelé une fois à l'import du module)."""
+        for category in REGISTRY:
+            cls._evaluators[category.name], cls._inputs[category.name] = _compile(category)
+    
+    @classmethod
+    def evaluate(cls, profile, category: str, prices: Optional[Dict[str, float]] = None,
+                 remaining_capitals: Optional[Dict[LoanTerms, float]] = None,
+                 current_date: Optional[date] = None,
+                 on_item: Optional[Callable] = None) -> float:
+        """
+        Total d'une catégorie pour un profil, arrondi au centime.
+        
+        Args:
+            profile: Profil investisseur
+            category: Nom de la catégorie (voir REGISTRY)
+            prices: Prix crypto {symbole: prix EUR} (catégorie 'crypto')
+            remaining_capitals: Capitaux restants précalculés par lot (catégories de crédit)
+            current_date: Date de calcul du capital restant (défaut: aujourd'hui)
+            on_item: Appelé pour chaque élément valorisé avec (élément, détails)
+        
+        Returns:
+            float: Total de la catégorie
+        """
+        options = {
+            'prices': prices,
+            'remaining_capitals': remaining_capitals,
+            'current_date': current_date,
+            'on_item': on_item
+        }
+        return cls._evaluators[category](profile, options)
+    
+    @classmethod
+    def evaluate_all(cls, profile, prices: Optional[Dict[str, float]] = None,
+                     remaining_capitals: Optional[Dict[LoanTerms, float]] = None) -> Dict[str, float]:
+        """
+        Totaux de toutes les catégories plus total_actifs et patrimoine_total_net.
+        """
+        options = {'prices': prices, 'remaining_capitals': remaining_capitals}
+        totals = {name: evaluator(profile, options) for name, evaluator in cls._evaluators.items()}
+        totals['total_actifs'] = cls.total_actifs(totals)
+        totals['patrimoine_total_net'] = round_cents(totals['total_actifs'] - totals['credits'])
+        return totals
+    
+    @staticmethod
+    def total_actifs(totals: Dict[str, float]) -> float:
+        """Somme des catégories d'actifs."""
+        return round_cents(math.fsum(totals[name] or 0 for name in ASSET_CATEGORIES))
+    
+    @classmethod
+    def inputs(cls, profile, category: str) -> list:
+        """
+        Entrées brutes d'une catégorie (champs, cases à cocher et listes JSONB),
+        avec le mois courant pour les catégories qui en dépendent.
+        """
+        data = cls._inputs[category](profile)
+        if cls.CATEGORIES[category].monthly:
+            data.append(date.today().strftime('%Y-%m'))
+        return data
+
+
+PatrimoineCategoryRegistry.compile()
@@ -0,0 +1,246 @@
+"""
+Jobs de recalcul patrimonial en arrière-plan.
+Découpe la plage des IDs de profils entre plusieurs workers (threads ou processus),
+chacun avec sa propre session DB, et publie l'avancement dans la table recalculation_jobs.
+"""
+
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from app import db
+from app.models.investor_profile import InvestorProfile
+from app.models.recalculation_job import RecalculationJob
+from app.services.binance_price_service import BinancePriceService, PriceSnapshot
+from app.services.patrimoine_bulk_recalculation import BulkPatrimoineRecalculationService
+
+
+class PatrimoineRecalculationJobService:
+    """
+    Lance et suit les recalculs complets de la base clients sans bloquer la requête HTTP.
+    """
+    
+    EXECUTORS = ('thread', 'process')
+    
+    # Un job non terminé plus vieux que ce délai est considéré comme abandonné (worker redémarré)
+    STALE_JOB_AFTER = timedelta(hours=2)
+    
+    # Verrou consultatif PostgreSQL qui sérialise les démarrages de job entre workers gunicorn
+    START_LOCK_KEY = 0x41544c52
+    _start_lock = threading.Lock()
+    
+    @classmethod
+    def start_job(cls, app, created_by_id: Optional[int] = None, workers: Optional[int] = None,
+                  executor: Optional[str] = None, chunk_size: Optional[int] = None) -> RecalculationJob:
+        """
+        Crée un job et lance le recalcul dans un thread de fond.
+        
+        Args:
+            app: Application Flask (le thread de fond ouvre son propre app context)
+            created_by_id: ID de l'admin qui a déclenché le job
+            workers: Nombre de workers (défaut: PATRIMOINE_RECALC_WORKERS)
+            executor: 'thread' ou 'process' (défaut: PATRIMOINE_RECALC_EXECUTOR)
+            chunk_size: Taille des lots de chaque worker
+        
+        Returns:
+            RecalculationJob: Le job créé, ou le job déjà en cours s'il y en a un
+        """
+        workers = max(1, int(workers or app.config.get('PATRIMOINE_RECALC_WORKERS', 1)))
+        executor = executor or app.config.get('PATRIMOINE_RECALC_EXECUTOR', 'thread')
+        if executor not in cls.EXECUTORS:
+            raise ValueError(f"Exécuteur inconnu: {executor}")
+        chunk_size = chunk_size or BulkPatrimoineRecalculationService.DEFAULT_CHUNK_SIZE
+        
+        # Vérification et création sous verrou : deux clics simultanés ne lancent qu'un seul job
+        with cls._start_lock:
+            cls._lock_job_start()
+            running_job = cls.get_running_job()
+            if running_job:
+                db.session.commit()  # Libère le verrou consultatif
+                return running_job
+            
+            job = RecalculationJob(
+                executor=executor,
+                workers=workers,
+                total_profiles=InvestorProfile.query.count(),
+                created_by_id=created_by_id
+            )
+            db.session.add(job)
+            db.session.commit()
+        
+        thread = threading.Thread(
+            target=cls._run_job,
+            args=(app, job.id, workers, executor, chunk_size),
+            daemon=True
+        )
+        thread.start()
+        
+        return job
+    
+    @classmethod
+    def _lock_job_start(cls):
+        """
+        Prend le verrou consultatif de démarrage jusqu'à la fin de la transaction (PostgreSQL).
+        Les autres moteurs (SQLite en développement) se contentent du verrou du processus.
+        """
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': cls.START_LOCK_KEY})
+    
+    @classmethod
+    def get_job(cls, job_id: str) -> Optional[RecalculationJob]:
+        """Retourne un job par son identifiant."""
+        return db.session.get(RecalculationJob, job_id)
+    
+    @classmethod
+    def get_running_job(cls) -> Optional[RecalculationJob]:
+        """Retourne le job en cours le plus récent (hors jobs abandonnés)."""
+        return RecalculationJob.query.filter(
+            RecalculationJob.status.in_([RecalculationJob.STATUS_PENDING, RecalculationJob.STATUS_RUNNING]),
+            RecalculationJob.created_at >= datetime.utcnow() - cls.STALE_JOB_AFTER
+        ).order_by(RecalculationJob.created_at.desc()).first()
+    
+    @classmethod
+    def split_id_ranges(cls, workers: int) -> List[Tuple[int, int]]:
+        """
+        Découpe les IDs de profils en plages contiguës de tailles équivalentes.
+        
+        Args:
+            workers: Nombre de plages souhaitées
+        
+        Returns:
+            List[Tuple[int, int]]: Plages (min_id, max_id) incluses
+        """
+        ids = [row[0] for row in db.session.query(InvestorProfile.id).order_by(InvestorProfile.id)]
+        if not ids:
+            return []
+        
+        workers = min(workers, len(ids))
+        size, remainder = divmod(len(ids), workers)
+        ranges = []
+        start = 0
+        for index in range(workers):
+            end = start + size + (1 if index < remainder else 0)
+            ranges.append((ids[start], ids[end - 1]))
+            start = end
+        return ranges
+    
+    @classmethod
+    def _run_job(cls, app, job_id: str, workers: int, executor: str, chunk_size: int):
+        """Coordonne le job : snapshot partagé, découpage et exécution des workers."""
+        with app.app_context():
+            job = cls.get_job(job_id)
+            try:
+                job.status = RecalculationJob.STATUS_RUNNING
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+                
+                # Un seul snapshot de prix pour tous les workers (aucun appel API)
+                price_snapshot = BinancePriceService.snapshot_from_cache()
+                ranges = cls.split_id_ranges(workers)
+                
+                if executor == 'process':
+                    pool = ProcessPoolExecutor(
+                        max_workers=len(ranges) or 1,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    futures = [
+                        pool.submit(_run_range_in_process, job_id, min_id, max_id, chunk_size, price_snapshot)
+                        for min_id, max_id in ranges
+                    ]
+                else:
+                    pool = ThreadPoolExecutor(max_workers=len(ranges) or 1)
+                    futures = [
+                        pool.submit(cls._run_range_in_thread, app, job_id, min_id, max_id, chunk_size, price_snapshot)
+                        for min_id, max_id in ranges
+                    ]
+                
+                error_count = 0
+                with pool:
+                    for future in as_completed(futures):
+                        error_count += future.result().get('errors', 0)
+                
+                job = cls.get_job(job_id)
+                db.session.refresh(job)
+                job.error_count = error_count
+                job.status = RecalculationJob.STATUS_COMPLETED
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                print(f"✅ Job recalcul {job_id}: {job.processed_profiles} profils "
+                      f"({job.profiles_per_second} profils/s, {workers} workers {executor})")
+            
+            except Exception as e:
+                print(f"❌ Erreur job recalcul {job_id}: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                job = cls.get_job(job_id)
+                job.status = RecalculationJob.STATUS_FAILED
+                job.error_message = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+            finally:
+                db.session.remove()
+    
+    @classmethod
+    def _run_range_in_thread(cls, app, job_id: str, min_id: int, max_id: int, chunk_size: int,
+                             price_snapshot: PriceSnapshot) -> dict:
+        """Worker thread : son propre app context, donc sa propre session DB."""
+        with app.app_context():
+            try:
+                return cls._run_range(job_id, min_id, max_id, chunk_size, price_snapshot)
+            finally:
+                db.session.remove()
+    
+    @classmethod
+    def _run_range(cls, job_id: str, min_id: int, max_id: int, chunk_size: int,
+                   price_snapshot: PriceSnapshot) -> dict:
+        """Recalcule une plage d'IDs et publie l'avancement après chaque lot."""
+        reported = {'processed': 0}
+        
+        def report_progress(processed):
+            delta = processed - reported['processed']
+            reported['processed'] = processed
+            cls._increment_progress(job_id, delta)
+        
+        return BulkPatrimoineRecalculationService.recalculate_all(
+            chunk_size=chunk_size,
+            price_snapshot=price_snapshot,
+            min_id=min_id,
+            max_id=max_id,
+            progress_callback=report_progress
+        )
+    
+    @classmethod
+    def _increment_progress(cls, job_id: str, delta: int):
+        """Incrémente atomiquement le compteur de profils traités du job."""
+        if delta <= 0:
+            return
+        try:
+            db.session.execute(
+                RecalculationJob.__table__.update()
+                .where(RecalculationJob.__table__.c.id == job_id)
+                .values(processed_profiles=RecalculationJob.__table__.c.processed_profiles + delta)
+            )
+            db.session.commit()
+        except Exception as e:
+            print(f"⚠️ Erreur mise à jour avancement job {job_id}: {e}")
+            db.session.rollback()
+
+
+def _run_range_in_process(job_id: str, min_id: int, max_id: int, chunk_size: int,
+                          price_snapshot: PriceSnapshot) -> dict:
+    """Worker processus : crée sa propre application (et donc son propre pool DB)."""
+    # Pas de refresh crypto au démarrage du worker, le snapshot est fourni
+    os.environ['ATLAS_DIRECT_LAUNCH'] = '1'
+    
+    from app import create_app
+    
+    app = create_app()
+    with app.app_context():
+        try:
+            return PatrimoineRecalculationJobService._run_range(job_id, min_id, max_id, chunk_size, price_snapshot)
+        finally:
+            db.session.remove()
@@ -0,0 +1,213 @@
+"""
+Service de l'historique du patrimoine des clients.
+Enregistre les totaux calculés (une ligne par profil et par jour, seulement quand ils changent)
+et fournit les séries d'évolution pour le tableau de bord investisseur.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from app import db
+from app.models.patrimoine_snapshot import PatrimoineSnapshot
+
+
+class PatrimoineSnapshotService:
+    """
+    Écriture et lecture des snapshots patrimoniaux.
+    """
+    
+    DEFAULT_PERIOD = timedelta(days=365)
+    
+    @classmethod
+    def record(cls, investor_profile, snapshot_date: Optional[date] = None) -> bool:
+        """
+        Enregistre les totaux calculated_* actuels d'un profil (le commit est fait par l'appelant).
+        
+        Args:
+            investor_profile: Profil dont les totaux viennent d'être calculés
+            snapshot_date: Jour du snapshot (défaut : aujourd'hui, UTC)
+        
+        Returns:
+            bool: True si une ligne a été ajoutée ou mise à jour
+        """
+        if investor_profile.id is None:
+            return False
+        return cls.record_many(
+            {investor_profile.id: PatrimoineSnapshot.pack_profile(investor_profile)},
+            snapshot_date
+        ) > 0
+    
+    @classmethod
+    def record_mappings(cls, mappings: List[Dict], snapshot_date: Optional[date] = None) -> int:
+        """
+        Enregistre les totaux d'un lot de lignes {id, calculated_*...} (recalcul en masse).
+        
+        Returns:
+            int: Nombre de lignes ajoutées ou mises à jour
+        """
+        return cls.record_many(
+            {mapping['id']: PatrimoineSnapshot.pack_mapping(mapping) for mapping in mappings},
+            snapshot_date
+        )
+    
+    @classmethod
+    def record_many(cls, packed_totals: Dict[int, bytes], snapshot_date: Optional[date] = None) -> int:
+        """
+        Enregistre les totaux de plusieurs profils avec une seule lecture des derniers snapshots.
+        Un profil dont les totaux n'ont pas changé depuis son dernier snapshot n'est pas écrit ;
+        un profil déjà photographié aujourd'hui voit sa ligne du jour mise à jour.
+        
+        Args:
+            packed_totals: {investor_profile_id: totaux packés (PatrimoineSnapshot.pack)}
+            snapshot_date: Jour du snapshot (défaut : aujourd'hui, UTC)
+        
+        Returns:
+            int: Nombre de lignes ajoutées ou mises à jour
+        """
+        if not packed_totals:
+            return 0
+        snapshot_date = snapshot_date or datetime.utcnow().date()
+        
+        # Dernier snapshot (<= jour) de chaque profil du lot
+        latest_dates = db.session.query(
+            PatrimoineSnapshot.investor_profile_id.label('profile_id'),
+            db.func.max(PatrimoineSnapshot.snapshot_date).label('snapshot_date')
+        ).filter(
+            PatrimoineSnapshot.investor_profile_id.in_(list(packed_totals)),
+            PatrimoineSnapshot.snapshot_date <= snapshot_date
+        ).group_by(PatrimoineSnapshot.investor_profile_id).subquery()
+        
+        latest = {
+            profile_id: (snapshot_id, latest_date, totals)
+            for snapshot_id, profile_id, latest_date, totals in db.session.query(
+                PatrimoineSnapshot.id,
+                PatrimoineSnapshot.investor_profile_id,
+                PatrimoineSnapshot.snapshot_date,
+                PatrimoineSnapshot.totals
+            ).join(
+                latest_dates,
+                db.and_(
+                    PatrimoineSnapshot.investor_profile_id == latest_dates.c.profile_id,
+                    PatrimoineSnapshot.snapshot_date == latest_dates.c.snapshot_date
+                )
+            )
+        }
+        
+        now = datetime.utcnow()
+        rows = []
+        for profile_id, packed in packed_totals.items():
+            previous = latest.get(profile_id)
+            if previous is not None and bytes(previous[2]) == packed:
+                continue  # Totaux inchangés : pas de nouvelle ligne
+            rows.append({
+                'investor_profile_id': profile_id,
+                'snapshot_date': snapshot_date,
+                'totals': packed,
+                'updated_at': now
+            })
+        
+        cls._bulk_upsert_snapshots(rows, latest)
+        return len(rows)
+    
+    @classmethod
+    def _bulk_upsert_snapshots(cls, rows: List[Dict], latest: Dict):
+        """
+        Insère ou met à jour les snapshots du jour en une seule requête.
+        PostgreSQL et SQLite utilisent INSERT ... ON CONFLICT (investor_profile_id, snapshot_date) DO UPDATE :
+        une ligne du jour écrite entre-temps par un autre processus (cron et calcul à la demande)
+        est mise à jour au lieu de faire échouer tout le lot sur la contrainte d'unicité.
+        
+        Args:
+            rows: Lignes {investor_profile_id, snapshot_date, totals, updated_at}
+            latest: {investor_profile_id: (id, snapshot_date, totals)} lu par record_many (fallback)
+        """
+        if not rows:
+            return
+        
+        dialect = db.engine.dialect.name
+        
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            
+            table = PatrimoineSnapshot.__table__
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.investor_profile_id, table.c.snapshot_date],
+                set_={
+                    'totals': stmt.excluded.totals,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+            return
+        
+        # Fallback générique : ligne du jour déjà lue -> mise à jour, sinon insertion
+        inserts, updates = [], []
+        for row in rows:
+            previous = latest.get(row['investor_profile_id'])
+            if previous is not None and previous[1] == row['snapshot_date']:
+                updates.append({'id': previous[0], 'totals': row['totals'], 'updated_at': row['updated_at']})
+            else:
+                inserts.append(row)
+        if inserts:
+            db.session.bulk_insert_mappings(PatrimoineSnapshot, inserts)
+        if updates:
+            db.session.bulk_update_mappings(PatrimoineSnapshot, updates)
+    
+    @classmethod
+    def get_history(cls, investor_profile_id: int, start: Optional[date] = None,
+                    end: Optional[date] = None, fill_days: bool = False) -> Dict:
+        """
+        Évolution des totaux d'un profil sur une période, en une requête indexée.
+        Le dernier snapshot antérieur au début de la période est inclus pour connaître la valeur de départ.
+        
+        Args:
+            investor_profile_id: ID du profil investisseur
+            start: Premier jour (défaut : il y a un an)
+            end: Dernier jour (défaut : aujourd'hui)
+            fill_days: Si True, une valeur par jour (report du dernier snapshot),
+                sinon uniquement les jours de changement
+        
+        Returns:
+            Dict: {dates: [ISO], <colonne calculated_*>: [valeurs]}
+        """
+        end = end or datetime.utcnow().date()
+        start = start or end - cls.DEFAULT_PERIOD
+        
+        # Début effectif : dernier snapshot <= start (sinon start)
+        first_date = db.session.query(db.func.max(PatrimoineSnapshot.snapshot_date)).filter(
+            PatrimoineSnapshot.investor_profile_id == investor_profile_id,
+            PatrimoineSnapshot.snapshot_date <= start
+        ).scalar_subquery()
+        
+        rows = db.session.query(PatrimoineSnapshot.snapshot_date, PatrimoineSnapshot.totals).filter(
+            PatrimoineSnapshot.investor_profile_id == investor_profile_id,
+            PatrimoineSnapshot.snapshot_date >= db.func.coalesce(first_date, start),
+            PatrimoineSnapshot.snapshot_date <= end
+        ).order_by(PatrimoineSnapshot.snapshot_date).all()
+        
+        dates = [snapshot_date for snapshot_date, _ in rows]
+        matrix = np.frombuffer(b''.join(totals for _, totals in rows), dtype=PatrimoineSnapshot.TOTAL_DTYPE)
+        matrix = matrix.reshape(len(rows), len(PatrimoineSnapshot.TOTAL_COLUMNS))
+        
+        if fill_days and rows:
+            # Index du dernier snapshot <= chaque jour de la période
+            first_day = max(start, dates[0])
+            days = np.arange(np.datetime64(first_day), np.datetime64(end) + 1)
+            positions = np.searchsorted(np.array(dates, dtype='datetime64[D]'), days, side='right') - 1
+            dates = days.astype(object).tolist()
+            matrix = matrix[positions]
+        elif rows and dates[0] < start:
+            # Valeur de départ ramenée au premier jour de la période
+            dates[0] = start
+        
+        return {
+            'dates': [snapshot_date.isoformat() for snapshot_date in dates],
+            **{
+                column: np.round(matrix[:, index], 2).tolist()
+                for index, column in enumerate(PatrimoineSnapshot.TOTAL_COLUMNS)
+            }
+        }
@@ -8,23 +8,32 @@ Formules:
 """
 
 from app import db
-from datetime import datetime, date
-from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime
+import hashlib
+import json
 import traceback
-from app.services.credit_calculation import CreditCalculationService
+from app.services.patrimoine_categories import PatrimoineCategoryRegistry, round_cents
+from app.services.patrimoine_snapshot_service import PatrimoineSnapshotService
 
 
 class PatrimonyCalculationEngine:
     """Service central pour tous les calculs patrimoniaux."""
     
+    # Colonne calculée associée à chaque catégorie suivie pour le recalcul incrémental
+    CATEGORY_COLUMNS = PatrimoineCategoryRegistry.COLUMNS
+    
     @classmethod
     def calculate_and_save_all(cls, investor_profile, force_recalculate=False, save_to_db=True):
         """
         Calcule et sauvegarde TOUS les totaux patrimoniaux.
         
+        Seules les catégories dont les entrées ont changé depuis le dernier calcul
+        (empreinte stockée dans calculation_hashes) sont recalculées ; les autres
+        reprennent la valeur déjà sauvegardée.
+        
         Args:
             investor_profile: Le profil investisseur
-            force_recalculate: Si True, force le recalcul même si les valeurs existent
+            force_recalculate: Si True, recalcule toutes les catégories
             save_to_db: Si True, sauvegarde en base de données
             
         Returns:
@@ -32,58 +41,86 @@ class PatrimonyCalculationEngine:
         """
         try:
             results = {}
+            previous_hashes = {} if force_recalculate else dict(investor_profile.calculation_hashes or {})
+            new_hashes = {}
             
+            # Prix crypto lus une seule fois (cache) : utilisés pour l'empreinte et le calcul
+            prix_cryptos = cls._get_crypto_prices_from_db() if investor_profile.cryptomonnaies_data else {}
+            
+            def category_total(category, compute):
+                fingerprint = cls._category_fingerprint(investor_profile, category, prix_cryptos)
+                stored = previous_hashes.get(category)
+                current_value = getattr(investor_profile, cls.CATEGORY_COLUMNS[category])
+                
+                # Catégorie inchangée : l'empreinte ET la valeur en base correspondent au dernier calcul
+                if (stored and stored[0] == fingerprint and current_value is not None
+                        and float(current_value) == stored[1]):
+                    total = float(current_value)
+                else:
+                    total = compute()
+                
+                new_hashes[category] = [fingerprint, total]
+                return total
             
             # 1. LIQUIDITÉS
-            total_liquidites = cls._calculate_liquidites(investor_profile)
+            total_liquidites = category_total('liquidites', lambda: cls._calculate_liquidites(investor_profile))
             investor_profile.calculated_total_liquidites = total_liquidites
-            results['liquidites'] = float(total_liquidites)
+            results['liquidites'] = total_liquidites
             
             # 2. PLACEMENTS FINANCIERS
-            total_placements = cls._calculate_placements_financiers(investor_profile)
+            total_placements = category_total('placements', lambda: cls._calculate_placements_financiers(investor_profile))
             investor_profile.calculated_total_placements = total_placements
-            results['placements_financiers'] = float(total_placements)
+            results['placements_financiers'] = total_placements
             
             # 3. PATRIMOINE IMMOBILIER NET - calculer correctement avec capital restant
-            patrimoine_immobilier_net = cls._calculate_patrimoine_immobilier_net_correct(investor_profile)
+            patrimoine_immobilier_net = category_total(
+                'immobilier', lambda: cls._calculate_patrimoine_immobilier_net(investor_profile)
+            )
             investor_profile.calculated_total_immobilier_net = patrimoine_immobilier_net
-            results['patrimoine_immobilier_net'] = float(patrimoine_immobilier_net)
+            results['patrimoine_immobilier_net'] = patrimoine_immobilier_net
             
-            # 4. TOTAL CRYPTOMONNAIES
-            total_cryptos = cls._calculate_total_cryptomonnaies(investor_profile)
+            # 4. TOTAL CRYPTOMONNAIES (recalculé seulement si les avoirs ou un prix utilisé ont bougé)
+            total_cryptos = category_total(
+                'crypto', lambda: cls._calculate_total_cryptomonnaies(investor_profile, prix_cryptos)
+            )
             investor_profile.calculated_total_cryptomonnaies = total_cryptos
-            results['total_cryptomonnaies'] = float(total_cryptos)
+            results['total_cryptomonnaies'] = total_cryptos
             
             # 5. TOTAL AUTRES BIENS
-            total_autres_biens = cls._calculate_total_autres_biens(investor_profile)
+            total_autres_biens = category_total('autres_biens', lambda: cls._calculate_total_autres_biens(investor_profile))
             investor_profile.calculated_total_autres_biens = total_autres_biens
-            results['total_autres_biens'] = float(total_autres_biens)
+            results['total_autres_biens'] = total_autres_biens
             
             # 6. TOTAL ÉPARGNE & PATRIMOINE (FORMULE PRINCIPALE)
-            total_epargne_patrimoine = (
-                total_liquidites +
-                total_placements +
-                patrimoine_immobilier_net +
-                total_cryptos +
-                total_autres_biens
-            )
+            total_epargne_patrimoine = PatrimoineCategoryRegistry.total_actifs({
+                'liquidites': total_liquidites,
+                'placements': total_placements,
+                'immobilier': patrimoine_immobilier_net,
+                'crypto': total_cryptos,
+                'autres_biens': total_autres_biens
+            })
             investor_profile.calculated_total_actifs = total_epargne_patrimoine
-            results['total_epargne_patrimoine'] = float(total_epargne_patrimoine)
+            results['total_epargne_patrimoine'] = total_epargne_patrimoine
             
             # 7. MONTANT CRÉDITS À REMBOURSER
-            total_credits = cls._calculate_total_credits(investor_profile)
+            total_credits = category_total('credits', lambda: cls._calculate_total_credits(investor_profile))
             investor_profile.calculated_total_credits_consommation = total_credits
-            results['total_credits'] = float(total_credits)
+            results['total_credits'] = total_credits
             
             # 8. PATRIMOINE TOTAL NET (FORMULE FINALE)
-            patrimoine_total_net = total_epargne_patrimoine - total_credits
+            patrimoine_total_net = round_cents(total_epargne_patrimoine - total_credits)
             investor_profile.calculated_patrimoine_total_net = patrimoine_total_net
-            results['patrimoine_total_net'] = float(patrimoine_total_net)
+            results['patrimoine_total_net'] = patrimoine_total_net
+            
+            # Empreintes pour le prochain calcul incrémental
+            investor_profile.calculation_hashes = new_hashes
             
             # Horodatage
             investor_profile.last_calculation_date = datetime.utcnow()
             
             if save_to_db:
+                # Historique : snapshot du jour (ignoré si les totaux n'ont pas changé)
+                PatrimoineSnapshotService.record(investor_profile)
                 db.session.commit()
             
             return results
@@ -94,180 +131,92 @@ class PatrimonyCalculationEngine:
             return None
     
     @classmethod
-    def _calculate_liquidites(cls, profile):
-        """Calcule Total Liquidités."""
-        total = Decimal('0')
-        
-        # Comptes épargne réglementés
-        total += Decimal(str(profile.livret_a_value or 0))
-        total += Decimal(str(profile.ldds_value or 0))
-        total += Decimal(str(profile.pel_cel_value or 0))
-        
-        # Épargne courante
-        total += Decimal(str(profile.current_savings or 0))
+    def _category_fingerprint(cls, profile, category, prix_cryptos=None):
+        """
+        Empreinte MD5 des entrées d'une catégorie.
         
-        # Liquidités personnalisées
-        if profile.liquidites_personnalisees_data:
-            for liquidite in profile.liquidites_personnalisees_data:
-                montant = liquidite.get('amount', 0)
-                total += Decimal(str(montant))
+        Args:
+            profile: Le profil investisseur
+            category: Clé de CATEGORY_COLUMNS
+            prix_cryptos: Prix crypto {symbole: prix EUR} (catégorie 'crypto' uniquement)
+            
+        Returns:
+            str: Empreinte hexadécimale
+        """
+        if category == 'crypto':
+            # Seuls les avoirs et les prix des cryptos détenues comptent (pas les champs enrichis)
+            prix_cryptos = prix_cryptos or {}
+            inputs = []
+            for crypto in profile.cryptomonnaies_data or []:
+                symbol = crypto.get('symbol', '').lower()
+                inputs.append([symbol, crypto.get('quantity', 0), prix_cryptos.get(symbol)])
+        else:
+            # Champs, cases à cocher et listes JSONB déclarés dans le registre
+            # (plus le mois courant pour les catégories de crédit)
+            inputs = PatrimoineCategoryRegistry.inputs(profile, category)
         
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.md5(payload.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def _calculate_liquidites(cls, profile):
+        """Calcule Total Liquidités."""
+        return PatrimoineCategoryRegistry.evaluate(profile, 'liquidites')
     
     @classmethod
     def _calculate_placements_financiers(cls, profile):
         """Calcule Total Placements Financiers."""
-        total = Decimal('0')
-        
-        # Placements réglementés
-        total += Decimal(str(profile.pea_value or 0))
-        total += Decimal(str(profile.per_value or 0))
-        total += Decimal(str(profile.life_insurance_value or 0))
-        total += Decimal(str(profile.cto_value or 0))
-        total += Decimal(str(profile.pee_value or 0))
-        
-        # Placements personnalisés
-        if profile.placements_personnalises_data:
-            for placement in profile.placements_personnalises_data:
-                montant = placement.get('amount', 0)
-                total += Decimal(str(montant))
-        
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'placements')
     
     @classmethod
     def _calculate_patrimoine_immobilier_net(cls, profile):
-        """Calcule Patrimoine Immobilier Net (valeur - crédits immobiliers)."""
-        valeur_totale = Decimal('0')
-        credits_immobiliers = Decimal('0')
-        
-        if profile.immobilier_data:
-            for bien in profile.immobilier_data:
-                # Valeur du bien
-                valeur_bien = Decimal(str(bien.get('valeur', 0)))
-                valeur_totale += valeur_bien
-                
-                # Crédit associé au bien
-                if bien.get('has_credit', False):
-                    montant_credit = Decimal(str(bien.get('credit_montant', 0)))
-                    credits_immobiliers += montant_credit
-        else:
-            # Fallback sur valeur simple
-            valeur_totale = Decimal(str(profile.immobilier_value or 0))
-        
-        patrimoine_net = valeur_totale - credits_immobiliers
-        return patrimoine_net.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    
-    @classmethod
-    def _calculate_patrimoine_immobilier_net_correct(cls, profile):
         """
-        Calcule Patrimoine Immobilier Net avec le capital restant RÉEL des crédits.
-        
-        Utilise CreditCalculationService pour calculer le capital restant après 
-        déduction des mensualités déjà payées.
+        Calcule Patrimoine Immobilier Net avec le capital restant RÉEL des crédits
+        (valeur des biens - capital restant dû après les mensualités déjà payées).
         """
-        valeur_totale = Decimal('0')
-        capital_restant_total = Decimal('0')
-        
-        
-        if profile.immobilier_data:
-            for i, bien in enumerate(profile.immobilier_data):
-                # Valeur du bien
-                valeur_bien = Decimal(str(bien.get('valeur', 0)))
-                valeur_totale += valeur_bien
-                
-                # Si le bien a un crédit associé
-                if bien.get('has_credit', False):
-                    montant_initial = float(bien.get('credit_montant', 0))
-                    taux_interet = float(bien.get('credit_taeg', 0))  # Utiliser credit_taeg au lieu de credit_taux
-                    duree_annees = int(bien.get('credit_duree', 0))  # En années dans la base
-                    duree_mois = duree_annees * 12  # Conversion en mois
-                    
-                    # Parse de la date de début du crédit
-                    date_debut_str = bien.get('credit_date', '')  # Utiliser credit_date
-                    try:
-                        # Essayer différents formats de date
-                        if date_debut_str:
-                            if '-' in date_debut_str and len(date_debut_str) >= 7:
-                                # Format YYYY-MM ou YYYY-MM-DD
-                                date_debut = datetime.strptime(date_debut_str[:7] + '-01', '%Y-%m-%d').date()
-                            elif '/' in date_debut_str:
-                                # Format MM/YYYY
-                                parts = date_debut_str.split('/')
-                                if len(parts) == 2:
-                                    month, year = parts
-                                    date_debut = datetime.strptime(f'{year}-{month.zfill(2)}-01', '%Y-%m-%d').date()
-                                else:
-                                    date_debut = date.today()
-                            else:
-                                date_debut = date.today()
-                        else:
-                            date_debut = date.today()
-                    except (ValueError, TypeError):
-                        date_debut = date.today()
-                    
-                    # Calcul du capital restant avec service existant
-                    if montant_initial > 0 and duree_mois > 0:
-                        capital_restant_reel = CreditCalculationService.calculate_remaining_capital(
-                            principal=montant_initial,
-                            annual_rate=taux_interet,
-                            duration_months=duree_mois,
-                            start_date=date_debut,
-                            current_date=date.today()
-                        )
-                        
-                        capital_restant_total += Decimal(str(capital_restant_reel))
-        else:
-            # Fallback sur valeur simple
-            valeur_totale = Decimal(str(profile.immobilier_value or 0))
-        
-        # Calcul final
-        patrimoine_net = valeur_totale - capital_restant_total
-        
-        return patrimoine_net.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'immobilier')
     
     @classmethod 
-    def _calculate_total_cryptomonnaies(cls, profile):
+    def _calculate_total_cryptomonnaies(cls, profile, prix_cryptos=None):
         """Calcule Total Cryptomonnaies avec prix en base de données."""
-        total = Decimal('0')
+        if not profile.cryptomonnaies_data:
+            return 0.0
         
-        if profile.cryptomonnaies_data:
-            # Récupérer les prix depuis la base de données
+        # Récupérer les prix depuis la base de données (sauf s'ils sont fournis)
+        if prix_cryptos is None:
             prix_cryptos = cls._get_crypto_prices_from_db()
-            
-            # Travailler sur une copie modifiable
-            cryptos_updated = []
-            for crypto in profile.cryptomonnaies_data:
-                # Créer une copie de la crypto
-                crypto_copy = dict(crypto)
-                symbol = crypto_copy.get('symbol', '').lower()
-                quantity = Decimal(str(crypto_copy.get('quantity', 0)))
-                
-                if quantity > 0 and symbol in prix_cryptos:
-                    price_eur = Decimal(str(prix_cryptos[symbol]))
-                    valeur_calculee = quantity * price_eur
-                    
-                    # Mettre à jour la copie avec la valeur calculée
-                    crypto_copy['current_price'] = float(price_eur)
-                    crypto_copy['calculated_value'] = float(valeur_calculee)
-                    crypto_copy['last_updated'] = datetime.utcnow().isoformat()
-                    
-                    total += valeur_calculee
-                
-                cryptos_updated.append(crypto_copy)
-            
-            # Sauvegarder immédiatement les cryptos mises à jour
-            profile.set_cryptomonnaies_data(cryptos_updated)
         
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        valorisations = {}
+        total = PatrimoineCategoryRegistry.evaluate(
+            profile, 'crypto', prices=prix_cryptos,
+            on_item=lambda crypto, details: valorisations.__setitem__(id(crypto), details)
+        )
+        
+        # Travailler sur des copies pour que la modification du JSONB soit détectée
+        now = datetime.utcnow().isoformat()
+        cryptos_updated = []
+        for crypto in profile.cryptomonnaies_data:
+            crypto_copy = dict(crypto)
+            details = valorisations.get(id(crypto))
+            if details:
+                crypto_copy['current_price'] = float(details['price'])
+                crypto_copy['calculated_value'] = float(details['value'])
+                crypto_copy['last_updated'] = now
+            cryptos_updated.append(crypto_copy)
+        
+        # Sauvegarder immédiatement les cryptos mises à jour
+        profile.set_cryptomonnaies_data(cryptos_updated)
+        
+        return total
     
     @classmethod
     def _get_crypto_prices_from_db(cls):
-        """Récupère les prix crypto depuis la base de données."""
+        """Récupère les prix crypto depuis le cache des prix (alimenté par la base)."""
         try:
-            from app.models.crypto_price import CryptoPrice
+            from app.services.crypto_price_cache import CryptoPriceCache
             
             prix_cryptos = {}
-            crypto_prices = CryptoPrice.query.all()
+            crypto_prices = CryptoPriceCache.get_prices()
             
             # Mapping des symboles
             symbol_mapping = {
@@ -288,10 +237,7 @@ class PatrimonyCalculationEngine:
                 'usd-coin': ['usdc', 'usd-coin']
             }
             
-            for crypto_price in crypto_prices:
-                crypto_id = crypto_price.symbol
-                price_eur = crypto_price.price_eur
-                
+            for crypto_id, price_eur in crypto_prices.items():
                 # Ajouter tous les alias possibles pour cette crypto
                 if crypto_id in symbol_mapping:
                     for alias in symbol_mapping[crypto_id]:
@@ -305,26 +251,12 @@ class PatrimonyCalculationEngine:
     @classmethod
     def _calculate_total_autres_biens(cls, profile):
         """Calcule Total Autres Biens."""
-        total = Decimal('0')
-        
-        if profile.autres_biens_data:
-            for bien in profile.autres_biens_data:
-                valeur = bien.get('valeur', 0)
-                total += Decimal(str(valeur))
-        
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return PatrimoineCategoryRegistry.evaluate(profile, 'autres_biens')
     
     @classmethod
     def _calculate_total_credits(cls, profile):
-        """Calcule Total Crédits à rembourser (hors immobilier)."""
-        total = Decimal('0')
-        
-        if profile.credits_data:
-            for credit in profile.credits_data:
-                montant_restant = credit.get('montant_restant', credit.get('montant_initial', 0))
-                total += Decimal(str(montant_restant))
-        
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        """Calcule Total Crédits à rembourser (hors immobilier), capital restant dû à date."""
+        return PatrimoineCategoryRegistry.evaluate(profile, 'credits')
     
     @classmethod
     def refresh_user_totals(cls, user):
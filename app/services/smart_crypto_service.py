@@ -2,11 +2,12 @@
 Service crypto INTELLIGENT - Ne récupère QUE les prix nécessaires
 """
 
-import requests
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from app import db
 from app.models.crypto_price import CryptoPrice
+from app.services.crypto_price_cache import CryptoPriceCache
+from app.services.http_client import HttpClient
 
 
 class SmartCryptoService:
@@ -35,7 +36,7 @@ class SmartCryptoService:
     def get_usd_to_eur_rate(cls) -> float:
         """Récupère le taux USD->EUR en temps réel."""
         try:
-            response = requests.get(cls.EXCHANGE_RATE_API, timeout=3)
+            response = HttpClient.session().get(cls.EXCHANGE_RATE_API, timeout=3)
             response.raise_for_status()
             return response.json()['rates']['EUR']
         except:
@@ -61,7 +62,7 @@ class SmartCryptoService:
         try:
             # Appel API pour UN SEUL symbole
             url = f"{cls.BINANCE_API_URL}?symbol={binance_symbol}"
-            response = requests.get(url, timeout=5)
+            response = HttpClient.session().get(url, timeout=5)
             response.raise_for_status()
             
             data = response.json()
@@ -91,18 +92,20 @@ class SmartCryptoService:
             Prix EUR ou None si pas trouvé/trop ancien
         """
         try:
-            crypto_price = CryptoPrice.query.filter_by(symbol=symbol).first()
+            entry = CryptoPriceCache.get_entry(symbol)
             
-            if not crypto_price:
+            if not entry:
                 return None
+            
+            price_eur, _, updated_at = entry
                 
             # Vérifier l'âge
-            age = datetime.utcnow() - crypto_price.updated_at
+            age = datetime.utcnow() - updated_at
             if age > timedelta(minutes=max_age_minutes):
                 print(f"⏰ Prix {symbol} trop ancien: {age}")
                 return None
                 
-            return crypto_price.price_eur
+            return price_eur
             
         except Exception as e:
             print(f"❌ Erreur lecture cache {symbol}: {e}")
@@ -139,22 +142,30 @@ class SmartCryptoService:
     def save_price_to_cache(cls, symbol: str, price_eur: float):
         """Sauvegarde le prix en cache."""
         try:
+            now = datetime.utcnow()
+            price_usd = price_eur / cls.get_usd_to_eur_rate()
             crypto_price = CryptoPrice.query.filter_by(symbol=symbol).first()
             
             if crypto_price:
                 crypto_price.price_eur = price_eur
-                crypto_price.price_usd = price_eur / cls.get_usd_to_eur_rate()
-                crypto_price.updated_at = datetime.utcnow()
+                crypto_price.price_usd = price_usd
+                crypto_price.updated_at = now
             else:
                 crypto_price = CryptoPrice(
                     symbol=symbol,
                     price_eur=price_eur,
-                    price_usd=price_eur / cls.get_usd_to_eur_rate(),
-                    updated_at=datetime.utcnow()
+                    price_usd=price_usd,
+                    updated_at=now
                 )
                 db.session.add(crypto_price)
             
             db.session.commit()
+            CryptoPriceCache.store([{
+                'symbol': symbol,
+                'price_eur': price_eur,
+                'price_usd': price_usd,
+                'updated_at': now
+            }])
             print(f"💾 Prix {symbol} sauvé en cache")
             
         except Exception as e:
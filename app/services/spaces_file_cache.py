@@ -0,0 +1,245 @@
+"""
+Cache disque des objets DigitalOcean Spaces (PDF des formations).
+Chaque objet est téléchargé une seule fois par version (clé + ETag) dans un dossier partagé
+par les workers, puis servi depuis le disque avec send_file (Range / 206, ETag, Last-Modified).
+Les fichiers les moins récemment servis sont supprimés au-delà de la taille maximale.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+from urllib.parse import unquote, urlsplit
+from flask import current_app, has_app_context
+from app.services.http_client import HttpClient
+
+
+class CachedObject(NamedTuple):
+    """Objet Spaces disponible sur le disque local."""
+    path: str
+    etag: str
+    last_modified: Optional[datetime]
+    size: int
+
+
+class SpacesFileCache:
+    """
+    Cache LRU sur disque des objets Spaces, indexé par clé d'objet et ETag.
+    """
+    
+    DEFAULT_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'cache', 'spaces')
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 Go
+    
+    # Durée pendant laquelle l'ETag d'un objet est considéré à jour sans nouveau HEAD
+    DEFAULT_REVALIDATE_SECONDS = 300
+    
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    
+    _lock = threading.Lock()
+    _metadata = {}  # {clé: (etag, last_modified, size, time.monotonic() de la vérification)}
+    
+    @classmethod
+    def _config(cls, name: str, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+    
+    @classmethod
+    def get_folder(cls) -> str:
+        """Dossier du cache, configurable via SPACES_CACHE_DIR."""
+        folder = cls._config('SPACES_CACHE_DIR', None) or cls.DEFAULT_FOLDER
+        os.makedirs(folder, exist_ok=True)
+        return folder
+    
+    @classmethod
+    def key_from_url(cls, url: str) -> Optional[str]:
+        """Clé d'objet déduite d'une URL publique Spaces (https://<space>.<région>.digitaloceanspaces.com/<clé>)."""
+        if not url:
+            return None
+        spaces = cls._spaces_service()
+        if spaces:
+            # Retire aussi le segment du Space des URL d'un endpoint personnalisé
+            return spaces.key_from_url(url)
+        return unquote(urlsplit(url).path.lstrip('/')) or None
+    
+    @classmethod
+    def get(cls, key: str, public_url: Optional[str] = None) -> CachedObject:
+        """
+        Retourne l'objet depuis le cache disque, en le téléchargeant s'il est absent ou a changé.
+        
+        Args:
+            key: Clé de l'objet dans le Space
+            public_url: URL publique (utilisée si le client Spaces n'est pas configuré)
+        
+        Returns:
+            CachedObject
+        """
+        etag, last_modified, size = cls._get_metadata(key, public_url)
+        path = cls._path_for(key, etag)
+        
+        if os.path.exists(path):
+            # Accès récent : la date de modification du fichier sert d'horodatage LRU
+            os.utime(path, None)
+            return CachedObject(path, etag, last_modified, os.path.getsize(path))
+        
+        cls._download(key, public_url, path)
+        cls._remove_other_versions(key, path)
+        cls.evict()
+        return CachedObject(path, etag, last_modified, os.path.getsize(path))
+    
+    @classmethod
+    def _path_for(cls, key: str, etag: str) -> str:
+        """Chemin local d'une version d'objet : <sha1(clé)>-<etag>.bin"""
+        key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        safe_etag = re.sub(r'[^A-Za-z0-9-]', '', etag) or 'noetag'
+        return os.path.join(cls.get_folder(), f'{key_hash}-{safe_etag}.bin')
+    
+    @classmethod
+    def _get_metadata(cls, key: str, public_url: Optional[str]):
+        """
+        ETag, Last-Modified et taille de l'objet : index local des objets Spaces s'il le connaît,
+        sinon HEAD au plus toutes les SPACES_CACHE_REVALIDATE_SECONDS.
+        """
+        revalidate = int(cls._config('SPACES_CACHE_REVALIDATE_SECONDS', cls.DEFAULT_REVALIDATE_SECONDS))
+        cached = cls._metadata.get(key)
+        if cached and time.monotonic() - cached[3] <= revalidate:
+            return cached[:3]
+        
+        spaces = cls._spaces_service()
+        entry = cls._index_entry(spaces, key)
+        if entry:
+            etag = entry['etag']
+            last_modified = entry['last_modified']
+            size = entry['size'] or 0
+        elif spaces:
+            head = spaces.client.head_object(Bucket=spaces.space_name, Key=key)
+            etag = head['ETag'].strip('"')
+            last_modified = head.get('LastModified')
+            size = head.get('ContentLength', 0)
+        else:
+            response = HttpClient.session().head(public_url, timeout=10)
+            response.raise_for_status()
+            etag = response.headers.get('ETag', '').strip('"')
+            last_modified = cls._parse_http_date(response.headers.get('Last-Modified'))
+            size = int(response.headers.get('Content-Length', 0))
+        
+        if not etag:
+            # Pas d'ETag fourni : version identifiée par la date de modification et la taille
+            etag = hashlib.sha1(f'{key}|{last_modified}|{size}'.encode('utf-8')).hexdigest()
+        
+        with cls._lock:
+            cls._metadata[key] = (etag, last_modified, size, time.monotonic())
+        return etag, last_modified, size
+    
+    @classmethod
+    def _download(cls, key: str, public_url: Optional[str], path: str):
+        """Télécharge l'objet dans un fichier temporaire puis le renomme (atomique entre workers)."""
+        folder = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                spaces = cls._spaces_service()
+                if spaces:
+                    spaces.client.download_fileobj(spaces.space_name, key, f)
+                else:
+                    response = HttpClient.session().get(public_url, stream=True, timeout=(5, 60))
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=cls.DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+            print(f"📥 Spaces -> cache disque: {key} ({os.path.getsize(path)} octets)")
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    @classmethod
+    def _remove_other_versions(cls, key: str, keep_path: str):
+        """Supprime les anciennes versions (autres ETags) du même objet."""
+        key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        for path in glob.glob(os.path.join(os.path.dirname(keep_path), f'{key_hash}-*.bin')):
+            if path != keep_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    @classmethod
+    def evict(cls):
+        """Supprime les fichiers les moins récemment servis tant que le cache dépasse SPACES_CACHE_MAX_BYTES."""
+        max_bytes = int(cls._config('SPACES_CACHE_MAX_BYTES', cls.DEFAULT_MAX_BYTES))
+        entries = []
+        total = 0
+        with os.scandir(cls.get_folder()) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.bin'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        
+        if total <= max_bytes:
+            return
+        
+        # Le fichier le plus récent (celui qui vient d'être servi) est toujours conservé
+        for _, size, path in sorted(entries)[:-1]:
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            if total <= max_bytes:
+                break
+    
+    @classmethod
+    def presigned_url(cls, key: str, filename: str, expires_in: int = 300) -> Optional[str]:
+        """
+        URL pré-signée de courte durée pour lire l'objet directement depuis Spaces
+        (le Space doit autoriser l'origine de la plateforme en CORS pour PDF.js).
+        """
+        spaces = cls._spaces_service()
+        if not spaces:
+            return None
+        return spaces.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': spaces.space_name,
+                'Key': key,
+                'ResponseContentType': 'application/pdf',
+                'ResponseContentDisposition': f'inline; filename="{filename}"'
+            },
+            ExpiresIn=expires_in
+        )
+    
+    @staticmethod
+    def _index_entry(spaces, key: str) -> Optional[dict]:
+        """Métadonnées de l'index local si l'objet y figure avec son ETag."""
+        if not spaces:
+            return None
+        try:
+            entry = spaces.index.lookup(key)
+        except Exception as e:
+            print(f"⚠️ Index Spaces indisponible: {e}")
+            return None
+        if isinstance(entry, dict) and entry.get('etag'):
+            return entry
+        return None
+    
+    @staticmethod
+    def _spaces_service():
+        from app.services.digitalocean_storage import get_spaces_service
+        return get_spaces_service()
+    
+    @staticmethod
+    def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return parsedate_to_datetime(value).astimezone(timezone.utc)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,173 @@
+"""
+Index local des métadonnées des objets DigitalOcean Spaces (clé, taille, ETag, date de modification).
+Chaque préfixe indexé est rempli par un listing paginé complet, puis réconcilié avec le Space
+au-delà de son TTL ; les uploads et suppressions faits par l'application le mettent à jour directement.
+Les tests d'existence et les listings sont ainsi répondus sans aller-retour réseau.
+
+L'index vit dans la mémoire de chaque process (un par worker gunicorn) : un upload ou une suppression
+fait par un autre worker n'y apparaît qu'à la réconciliation suivante (au plus SPACES_INDEX_TTL).
+Un objet absent de l'index n'est donc qu'une présomption, à confirmer auprès du Space.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+class SpacesObjectIndex:
+    """
+    Index process-wide et thread-safe des objets d'un Space, par préfixe.
+    """
+    
+    DEFAULT_TTL_SECONDS = 900
+    
+    # Résultat de lookup() pour une clé hors de tout préfixe indexé
+    UNKNOWN = object()
+    
+    def __init__(self, lister: Callable[[str], Iterable[Dict]], ttl_seconds: Optional[int] = None,
+                 prefixes: Sequence[str] = ()):
+        """
+        Args:
+            lister: Fonction préfixe -> itérable des objets ({'key', 'size', 'etag', 'last_modified'})
+            ttl_seconds: Durée de validité d'un préfixe avant réconciliation
+            prefixes: Préfixes indexés d'office (ex: 'apprentissages/')
+        """
+        self._lister = lister
+        self.ttl_seconds = ttl_seconds or self.DEFAULT_TTL_SECONDS
+        self._lock = threading.RLock()
+        self._objects = {}  # {clé: métadonnées}
+        self._local_changes = {}  # {clé: time.monotonic() du dernier record/forget}
+        self._prefixes = {self.normalize_prefix(prefix): None for prefix in prefixes}  # {préfixe: time.monotonic() de la dernière réconciliation}
+        self._refresher = None
+        self._refresher_pid = None
+    
+    @staticmethod
+    def normalize_prefix(prefix: str) -> str:
+        """'apprentissages' -> 'apprentissages/' ('' pour tout le Space)"""
+        prefix = (prefix or '').strip('/')
+        return prefix + '/' if prefix else ''
+    
+    def reconcile(self, prefix: str = '') -> int:
+        """
+        Relit tout le préfixe depuis le Space et remplace son contenu dans l'index.
+        
+        Returns:
+            Nombre d'objets indexés sous le préfixe
+        """
+        prefix = self.normalize_prefix(prefix)
+        started_at = time.monotonic()
+        listed = {obj['key']: obj for obj in self._lister(prefix)}
+        
+        with self._lock:
+            # Les uploads/suppressions faits pendant le listing priment sur celui-ci
+            changed = {key for key, changed_at in self._local_changes.items() if changed_at >= started_at}
+            for key in [key for key in self._objects if key.startswith(prefix)]:
+                if key not in listed and key not in changed:
+                    del self._objects[key]
+            self._objects.update({key: obj for key, obj in listed.items() if key not in changed})
+            self._local_changes = {key: changed_at for key, changed_at in self._local_changes.items()
+                                   if changed_at >= started_at}
+            self._prefixes[prefix] = started_at
+        
+        print(f"🗂️ Index Spaces réconcilié: '{prefix or '/'}' ({len(listed)} objets)")
+        return len(listed)
+    
+    def reconcile_all(self) -> int:
+        """Réconcilie tous les préfixes indexés (tâche périodique)."""
+        total = 0
+        for prefix in self._top_level_prefixes():
+            try:
+                total += self.reconcile(prefix)
+            except Exception as e:
+                print(f"❌ Erreur réconciliation index Spaces '{prefix}': {e}")
+        return total
+    
+    def iter_objects(self, prefix: str = '') -> Iterator[Dict]:
+        """Objets du préfixe triés par clé, depuis l'index (réconcilié si expiré)."""
+        prefix = self.normalize_prefix(prefix)
+        self._ensure_refresher()
+        self._ensure_fresh(self._covering_prefix(prefix, register=True))
+        with self._lock:
+            objects = [obj for key, obj in self._objects.items() if key.startswith(prefix)]
+        return iter(sorted(objects, key=lambda obj: obj['key']))
+    
+    def lookup(self, key: str):
+        """
+        Métadonnées d'une clé depuis l'index.
+        
+        Returns:
+            dict si l'objet est indexé, None s'il est absent de l'index (à confirmer : il a pu
+            être créé par un autre worker depuis la dernière réconciliation),
+            SpacesObjectIndex.UNKNOWN si la clé n'est sous aucun préfixe indexé
+        """
+        prefix = self._covering_prefix(key)
+        if prefix is None:
+            return self.UNKNOWN
+        self._ensure_refresher()
+        self._ensure_fresh(prefix)
+        with self._lock:
+            return self._objects.get(key)
+    
+    def record(self, key: str, size: Optional[int] = None, etag: Optional[str] = None,
+               last_modified: Optional[datetime] = None):
+        """Ajoute ou met à jour un objet (après un upload de l'application)."""
+        with self._lock:
+            self._objects[key] = {
+                'key': key,
+                'size': size,
+                'etag': etag,
+                'last_modified': last_modified or datetime.now(timezone.utc)
+            }
+            self._local_changes[key] = time.monotonic()
+    
+    def forget(self, key: str):
+        """Retire un objet (après une suppression de l'application)."""
+        with self._lock:
+            self._objects.pop(key, None)
+            self._local_changes[key] = time.monotonic()
+    
+    def _ensure_refresher(self):
+        """
+        Démarre le thread de réconciliation de ce process s'il ne tourne pas déjà : les préfixes
+        sont relus avant l'expiration de leur TTL, les requêtes n'attendent pas de listing.
+        """
+        pid = os.getpid()
+        if self._refresher is not None and self._refresher_pid == pid and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher_pid == pid and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._run_refresher, name='spaces-index-refresher', daemon=True)
+            self._refresher_pid = pid
+            self._refresher.start()
+    
+    def _run_refresher(self):
+        interval = max(60, int(self.ttl_seconds * 0.8))
+        while True:
+            time.sleep(interval)
+            self.reconcile_all()
+    
+    def _ensure_fresh(self, prefix: str):
+        reconciled_at = self._prefixes.get(prefix)
+        if reconciled_at is None or time.monotonic() - reconciled_at > self.ttl_seconds:
+            self.reconcile(prefix)
+    
+    def _covering_prefix(self, key_or_prefix: str, register: bool = False) -> Optional[str]:
+        """Plus court préfixe indexé couvrant la clé (enregistré comme nouveau préfixe si register)."""
+        with self._lock:
+            matches = [prefix for prefix in self._prefixes if key_or_prefix.startswith(prefix)]
+            if matches:
+                return min(matches, key=len)
+            if register:
+                self._prefixes[key_or_prefix] = None
+                return key_or_prefix
+        return None
+    
+    def _top_level_prefixes(self) -> List[str]:
+        """Préfixes indexés qui ne sont pas inclus dans un autre."""
+        with self._lock:
+            prefixes = list(self._prefixes)
+        return [prefix for prefix in prefixes
+                if not any(other != prefix and prefix.startswith(other) for other in prefixes)]
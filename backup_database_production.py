@@ -2,13 +2,20 @@
 """
 Script de backup automatique de la base de données PostgreSQL de production
 vers DigitalOcean Spaces.
+
+Le dump n'est jamais écrit sur le disque : la sortie de pg_dump passe par un compresseur
+multithread (pigz, gzip en Python à défaut, ou zstd sur demande) puis directement dans un upload multipart.
 """
 
 import os
 import subprocess
 import datetime
-import gzip
+import hashlib
+import shutil
 import tempfile
+import threading
+import time
+import zlib
 import logging
 from pathlib import Path
 
@@ -50,119 +57,227 @@ def get_production_config():
     
     return config
 
-def create_database_backup(config, logger):
-    """Crée un backup de la base de données PostgreSQL"""
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"atlas_backup_{timestamp}.sql"
-    compressed_filename = f"atlas_backup_{timestamp}.sql.gz"
+# Compression : 'auto' choisit pigz, puis gzip (zlib, sans binaire externe) : toujours un .sql.gz,
+# restaurable avec gunzip. zstd (.sql.zst, restauration avec zstd -d) seulement si demandé explicitement
+COMPRESSORS = {
+    'zstd': {'extension': 'sql.zst', 'content_type': 'application/zstd'},
+    'pigz': {'extension': 'sql.gz', 'content_type': 'application/gzip'},
+    'gzip': {'extension': 'sql.gz', 'content_type': 'application/gzip'}
+}
+
+STREAM_READ_SIZE = 1024 * 1024  # Taille des lectures sur la sortie du compresseur
+
+def get_streaming_config():
+    """Réglages du pipeline pg_dump -> compression -> upload multipart"""
+    compression = os.getenv('BACKUP_COMPRESSION', 'auto').lower()
+    if compression == 'auto':
+        compression = 'pigz' if shutil.which('pigz') else 'gzip'
+    if compression not in COMPRESSORS:
+        raise ValueError(f"BACKUP_COMPRESSION inconnu: {compression} (zstd, pigz, gzip ou auto)")
+    
+    return {
+        'compression': compression,
+        'compression_threads': int(os.getenv('BACKUP_COMPRESSION_THREADS', 0)),  # 0 = tous les cœurs
+        'compression_level': os.getenv('BACKUP_COMPRESSION_LEVEL'),  # défaut de l'outil si vide
+        'chunk_size': int(os.getenv('BACKUP_MULTIPART_CHUNK_SIZE', 16 * 1024 * 1024)),
+        'upload_concurrency': int(os.getenv('BACKUP_UPLOAD_CONCURRENCY', 4)),
+        'timeout': int(os.getenv('BACKUP_TIMEOUT_SECONDS', 3600))
+    }
+
+def build_compressor_command(streaming):
+    """Commande du compresseur multithread lisant stdin et écrivant stdout (None pour gzip en Python)"""
+    compression = streaming['compression']
+    threads = streaming['compression_threads']
+    level = streaming['compression_level']
     
-    logger.info(f"Début du backup de la base de données: {config['db_name']}")
+    if compression == 'zstd':
+        cmd = ['zstd', '-q', '-c', f'-T{threads}']
+        if level:
+            cmd.append(f'-{level}')
+        return cmd
+    if compression == 'pigz':
+        cmd = ['pigz', '-c']
+        if threads:
+            cmd += ['-p', str(threads)]
+        if level:
+            cmd.append(f'-{level}')
+        return cmd
+    return None
+
+class BackupStream:
+    """
+    Flux lisible de la sortie compressée de pg_dump, passé tel quel à upload_fileobj.
+    Calcule le SHA-256 et la taille au fil de la lecture ; à la fin du flux, vérifie les codes
+    de retour de pg_dump et du compresseur et lève une erreur (l'upload multipart est alors annulé).
+    """
     
-    # Créer un fichier temporaire pour le backup
-    with tempfile.TemporaryDirectory() as temp_dir:
-        backup_path = Path(temp_dir) / backup_filename
-        compressed_path = Path(temp_dir) / compressed_filename
+    def __init__(self, dump_process, compressor_process, streaming, logger):
+        self.dump_process = dump_process
+        self.compressor_process = compressor_process
+        self.logger = logger
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.raw_size = 0
+        self._buffer = bytearray()
+        self._eof = False
         
-        # Commande pg_dump
-        env = os.environ.copy()
-        env['PGPASSWORD'] = config['db_password']
+        if compressor_process:
+            self._source = compressor_process.stdout
+            self._zlib = None
+        else:
+            # gzip en Python (wbits=31 : en-tête gzip)
+            self._source = dump_process.stdout
+            level = streaming['compression_level']
+            self._zlib = zlib.compressobj(int(level) if level else 6, zlib.DEFLATED, 31)
+    
+    def readable(self):
+        return True
+    
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            chunk = self._source.read(STREAM_READ_SIZE)
+            if chunk:
+                if self._zlib:
+                    self.raw_size += len(chunk)
+                    self._buffer += self._zlib.compress(chunk)
+                else:
+                    self._buffer += chunk
+            else:
+                if self._zlib:
+                    self._buffer += self._zlib.flush()
+                self._eof = True
+                self._check_processes()
         
-        cmd = [
-            'pg_dump',
-            '-h', config['db_host'],
-            '-p', config['db_port'],
-            '-U', config['db_user'],
-            '-d', config['db_name'],
-            '--verbose',
-            '--no-owner',
-            '--no-privileges',
-            '-f', str(backup_path)
-        ]
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
         
-        try:
-            result = subprocess.run(
-                cmd,
-                env=env,
-                capture_output=True,
-                text=True,
-                check=True,
-                timeout=3600  # Timeout de 1 heure
-            )
-            
-            logger.info(f"Backup SQL créé: {backup_path}")
-            
-            # Compresser le fichier
-            with open(backup_path, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb') as f_out:
-                    f_out.writelines(f_in)
-            
-            logger.info(f"Backup compressé: {compressed_path}")
-            
-            # Vérifier la taille du fichier compressé
-            file_size = compressed_path.stat().st_size
-            file_size_mb = file_size / (1024 * 1024)
-            logger.info(f"Taille du backup compressé: {file_size_mb:.2f} MB")
-            
-            return compressed_path, compressed_filename
-            
-        except subprocess.TimeoutExpired:
-            logger.error("Timeout lors du backup de la base de données")
-            raise
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Erreur lors du backup: {e}")
-            logger.error(f"Sortie d'erreur: {e.stderr}")
-            raise
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+    
+    def _check_processes(self):
+        """Fin du flux : pg_dump et le compresseur doivent s'être terminés sans erreur"""
+        if self.compressor_process and self.compressor_process.wait() != 0:
+            raise RuntimeError(f"Compresseur terminé avec le code {self.compressor_process.returncode}")
+        if self.dump_process.wait() != 0:
+            raise RuntimeError(f"pg_dump terminé avec le code {self.dump_process.returncode}")
 
-def upload_to_spaces(backup_path, backup_filename, config, logger):
-    """Upload le backup vers DigitalOcean Spaces"""
-    try:
-        import boto3
-        from botocore.exceptions import ClientError
-        
-        logger.info("Début de l'upload vers DigitalOcean Spaces")
-        
-        # Configuration du client S3 pour DigitalOcean Spaces
-        session = boto3.session.Session()
-        client = session.client(
-            's3',
-            region_name='fra1',  # ou votre région
-            endpoint_url=config['spaces_endpoint'],
-            aws_access_key_id=config['spaces_key'],
-            aws_secret_access_key=config['spaces_secret']
-        )
+def stream_backup_to_spaces(config, logger):
+    """
+    Sauvegarde la base en un seul passage, sans fichier temporaire :
+    pg_dump (stdout) -> compresseur multithread (zstd/pigz) -> upload multipart vers Spaces.
+    Le SHA-256 du fichier compressé est calculé pendant l'upload et publié dans <clé>.sha256.
+    """
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.client import Config
+    
+    streaming = get_streaming_config()
+    compressor = COMPRESSORS[streaming['compression']]
+    
+    now = datetime.datetime.now()
+    backup_filename = f"atlas_backup_{now.strftime('%Y%m%d_%H%M%S')}.{compressor['extension']}"
+    spaces_key = f"backups/database/{now.strftime('%Y/%m/%d')}/{backup_filename}"
+    
+    logger.info(f"Début du backup de la base de données: {config['db_name']} "
+                f"(compression {streaming['compression']}, parties de {streaming['chunk_size'] // (1024 * 1024)} MB)")
+    
+    session = boto3.session.Session()
+    client = session.client(
+        's3',
+        region_name='fra1',
+        endpoint_url=config['spaces_endpoint'],
+        aws_access_key_id=config['spaces_key'],
+        aws_secret_access_key=config['spaces_secret'],
+        config=Config(max_pool_connections=max(10, streaming['upload_concurrency']))
+    )
+    transfer_config = TransferConfig(
+        multipart_threshold=streaming['chunk_size'],
+        multipart_chunksize=streaming['chunk_size'],
+        max_concurrency=streaming['upload_concurrency'],
+        use_threads=True
+    )
+    
+    env = os.environ.copy()
+    env['PGPASSWORD'] = config['db_password']
+    dump_cmd = [
+        'pg_dump',
+        '-h', config['db_host'],
+        '-p', config['db_port'],
+        '-U', config['db_user'],
+        '-d', config['db_name'],
+        '--verbose',
+        '--no-owner',
+        '--no-privileges'
+    ]
+    
+    # stderr de pg_dump (--verbose) dans un fichier anonyme : pas de blocage du pipe, dernières lignes loguées en cas d'erreur
+    with tempfile.TemporaryFile() as dump_stderr:
+        dump_process = subprocess.Popen(dump_cmd, env=env, stdout=subprocess.PIPE, stderr=dump_stderr)
+        compressor_process = None
+        compressor_cmd = build_compressor_command(streaming)
+        if compressor_cmd:
+            compressor_process = subprocess.Popen(compressor_cmd, stdin=dump_process.stdout, stdout=subprocess.PIPE)
+            # Le compresseur est seul lecteur de la sortie de pg_dump
+            dump_process.stdout.close()
+        processes = [p for p in (dump_process, compressor_process) if p]
         
-        # Chemin de destination dans Spaces
-        date_folder = datetime.datetime.now().strftime('%Y/%m/%d')
-        spaces_key = f"backups/database/{date_folder}/{backup_filename}"
+        # Timeout global : les processus sont arrêtés, l'upload échoue et est annulé
+        timer = threading.Timer(streaming['timeout'], lambda: [p.kill() for p in processes if p.poll() is None])
+        timer.start()
         
-        # Upload du fichier
-        with open(backup_path, 'rb') as file_data:
+        stream = BackupStream(dump_process, compressor_process, streaming, logger)
+        started_at = time.monotonic()
+        try:
             client.upload_fileobj(
-                file_data,
+                stream,
                 config['spaces_bucket'],
                 spaces_key,
                 ExtraArgs={
-                    'ContentType': 'application/gzip',
+                    'ContentType': compressor['content_type'],
                     'Metadata': {
-                        'backup-date': datetime.datetime.now().isoformat(),
+                        'backup-date': now.isoformat(),
                         'database': config['db_name'],
-                        'type': 'postgresql-dump'
+                        'type': 'postgresql-dump',
+                        'compression': streaming['compression']
                     }
-                }
+                },
+                Config=transfer_config
             )
-        
-        # Construire l'URL publique
-        spaces_url = f"{config['spaces_endpoint']}/{config['spaces_bucket']}/{spaces_key}"
-        
-        logger.info(f"Backup uploadé avec succès: {spaces_url}")
-        return spaces_key, spaces_url
-        
-    except ImportError:
-        logger.error("Module boto3 non disponible. Installez-le avec: pip install boto3")
-        raise
-    except ClientError as e:
-        logger.error(f"Erreur lors de l'upload vers Spaces: {e}")
-        raise
+        except Exception:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+            dump_stderr.seek(0)
+            stderr_tail = dump_stderr.read().decode('utf-8', errors='replace').strip().splitlines()[-20:]
+            if stderr_tail:
+                logger.error("Sortie d'erreur pg_dump:\n" + '\n'.join(stderr_tail))
+            raise
+        finally:
+            timer.cancel()
+            for process in processes:
+                if process.stdout:
+                    process.stdout.close()
+                process.wait()
+    
+    # Somme de contrôle publiée à côté du backup (format sha256sum)
+    checksum = stream.sha256.hexdigest()
+    client.put_object(
+        Bucket=config['spaces_bucket'],
+        Key=f"{spaces_key}.sha256",
+        Body=f"{checksum}  {backup_filename}\n".encode('utf-8'),
+        ContentType='text/plain'
+    )
+    
+    elapsed = time.monotonic() - started_at
+    logger.info(f"Backup compressé et uploadé: {stream.size / (1024 * 1024):.2f} MB en {elapsed:.1f} s")
+    logger.info(f"SHA-256: {checksum}")
+    
+    spaces_url = f"{config['spaces_endpoint']}/{config['spaces_bucket']}/{spaces_key}"
+    logger.info(f"Backup uploadé avec succès: {spaces_url}")
+    return backup_filename, spaces_key, spaces_url
 
 def cleanup_old_backups(config, logger, retention_days=30):
     """Supprime les anciens backups (garde les backups des X derniers jours)"""
@@ -184,15 +299,16 @@ def cleanup_old_backups(config, logger, retention_days=30):
         # Date limite pour la suppression
         cutoff_date = datetime.datetime.now() - datetime.timedelta(days=retention_days)
         
-        # Lister les objets dans le dossier backups/database/
-        response = client.list_objects_v2(
+        # Lister tous les objets du dossier backups/database/ (page par page, au-delà de 1000 objets)
+        paginator = client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
             Bucket=config['spaces_bucket'],
             Prefix='backups/database/'
         )
         
         deleted_count = 0
-        if 'Contents' in response:
-            for obj in response['Contents']:
+        for page in pages:
+            for obj in page.get('Contents', []):
                 # Vérifier la date de modification
                 if obj['LastModified'].replace(tzinfo=None) < cutoff_date:
                     try:
@@ -231,11 +347,8 @@ def main():
         config = get_production_config()
         logger.info(f"Configuration chargée - Base: {config['db_name']}@{config['db_host']}")
         
-        # Création du backup
-        backup_path, backup_filename = create_database_backup(config, logger)
-        
-        # Upload vers DigitalOcean Spaces
-        spaces_key, spaces_url = upload_to_spaces(backup_path, backup_filename, config, logger)
+        # Backup en flux : pg_dump -> compression -> upload multipart vers DigitalOcean Spaces
+        backup_filename, spaces_key, spaces_url = stream_backup_to_spaces(config, logger)
         
         # Nettoyage des anciens backups (garde 30 jours)
         cleanup_old_backups(config, logger, retention_days=30)
@@ -246,7 +359,7 @@ def main():
         logger.info("=" * 50)
         logger.info("BACKUP TERMINÉ AVEC SUCCÈS")
         logger.info("=" * 50)
-        
+    
     except Exception as e:
         error_message = f"Erreur lors du backup: {str(e)}"
         logger.error(error_message, exc_info=True)
@@ -0,0 +1,7 @@
+-- Migration pour le recalcul incrémental des totaux patrimoniaux
+-- Stocke l'empreinte des entrées de chaque catégorie et le total associé
+
+ALTER TABLE investor_profiles
+ADD COLUMN IF NOT EXISTS calculation_hashes JSONB;
+
+COMMENT ON COLUMN investor_profiles.calculation_hashes IS 'Empreintes des entrées par catégorie {catégorie: [hash, total]} pour ne recalculer que les catégories modifiées';
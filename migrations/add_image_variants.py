@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Migration pour ajouter le champ image_variants à la table apprentissages.
+Les miniatures (WebP/JPEG) sont générées à l'upload ; --backfill les génère pour les images existantes.
+
+Commandes :
+- Pour appliquer la migration : python migrations/add_image_variants.py
+- Pour générer les miniatures des images existantes : python migrations/add_image_variants.py --backfill
+- Pour vérifier l'état : python migrations/add_image_variants.py --check
+"""
+
+import io
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.apprentissage import Apprentissage
+import argparse
+from sqlalchemy import inspect, text
+
+def add_image_variants_column():
+    """Ajouter la colonne image_variants"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            if not inspector.has_table('apprentissages'):
+                print("❌ La table 'apprentissages' n'existe pas.")
+                return False
+            
+            columns = [col['name'] for col in inspector.get_columns('apprentissages')]
+            if 'image_variants' in columns:
+                print("✅ La colonne 'image_variants' existe déjà.")
+                return True
+            
+            print("📦 Ajout de la colonne 'image_variants'...")
+            with db.engine.connect() as conn:
+                with conn.begin():
+                    conn.execute(text("ALTER TABLE apprentissages ADD COLUMN image_variants JSON"))
+            
+            print("✅ Colonne 'image_variants' ajoutée avec succès.")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Erreur lors de l'ajout de la colonne : {e}")
+            return False
+
+def backfill_image_variants():
+    """Générer les miniatures des formations qui n'en ont pas encore"""
+    from app.services.digitalocean_storage import get_spaces_service
+    from app.services.http_client import HttpClient
+    from app.services.image_variants import ImageVariantService
+    
+    app = create_app()
+    
+    with app.app_context():
+        spaces_service = get_spaces_service()
+        upload_dir = os.path.join(app.root_path, 'static', 'uploads', 'apprentissages')
+        apprentissages = Apprentissage.query.filter(
+            Apprentissage.image.isnot(None),
+            Apprentissage.image_variants.is_(None)
+        ).all()
+        
+        done = 0
+        for apprentissage in apprentissages:
+            try:
+                if apprentissage.storage_type == 'digitalocean' and apprentissage.image_url:
+                    if not spaces_service:
+                        print(f"⚠️ {apprentissage.nom}: Spaces non configuré")
+                        continue
+                    response = HttpClient.session().get(apprentissage.image_url, timeout=30)
+                    response.raise_for_status()
+                    variants = ImageVariantService.store_in_spaces(
+                        io.BytesIO(response.content), apprentissage.image, spaces_service
+                    )
+                else:
+                    path = os.path.join(upload_dir, apprentissage.image)
+                    if not os.path.exists(path):
+                        print(f"⚠️ {apprentissage.nom}: image introuvable ({path})")
+                        continue
+                    with open(path, 'rb') as f:
+                        variants = ImageVariantService.store_locally(
+                            f, apprentissage.image, upload_dir, '/static/uploads/apprentissages'
+                        )
+                
+                if variants:
+                    apprentissage.image_variants = variants
+                    db.session.commit()
+                    done += 1
+                    print(f"✅ {apprentissage.nom}: miniatures générées")
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ {apprentissage.nom}: {e}")
+        
+        print(f"📊 {done}/{len(apprentissages)} formation(s) traitée(s)")
+        return True
+
+def check_column_status():
+    """Vérifier l'état de la colonne image_variants"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('apprentissages')]
+            
+            if 'image_variants' not in columns:
+                print("❌ Colonne 'image_variants' : N'EXISTE PAS")
+                return False
+            
+            count_total = Apprentissage.query.filter(Apprentissage.image.isnot(None)).count()
+            count_with_variants = Apprentissage.query.filter(Apprentissage.image_variants.isnot(None)).count()
+            print("✅ Colonne 'image_variants' : EXISTE")
+            print(f"📊 {count_with_variants}/{count_total} image(s) avec miniatures")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Erreur lors de la vérification : {e}")
+            return False
+
+def main():
+    parser = argparse.ArgumentParser(description='Migration pour la colonne image_variants')
+    parser.add_argument('--check', action='store_true', help='Vérifier l\'état de la colonne')
+    parser.add_argument('--backfill', action='store_true', help='Générer les miniatures des images existantes')
+    
+    args = parser.parse_args()
+    
+    print("🚀 Migration de la colonne 'image_variants'")
+    print("=" * 50)
+    
+    if args.check:
+        print("🔍 Vérification de l'état de la colonne...")
+        check_column_status()
+    else:
+        print("📦 Ajout de la colonne...")
+        success = add_image_variants_column()
+        
+        if success and args.backfill:
+            print("🖼️ Génération des miniatures...")
+            success = backfill_image_variants()
+        
+        if success:
+            print("\n🎉 Migration terminée avec succès !")
+            print("\nPour vérifier l'état :")
+            print("python migrations/add_image_variants.py --check")
+        else:
+            print("\n❌ La migration a échoué.")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
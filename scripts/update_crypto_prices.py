@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Script de mise à jour des prix crypto via l'API Binance.
+Script de mise à jour des prix crypto via l'API Binance, suivi du recalcul des patrimoines
+(colonnes calculated_* et historique quotidien patrimoine_snapshots) avec ces mêmes prix.
 À lancer régulièrement (cron, scheduler, etc.) pour maintenir les prix à jour.
 
 Usage:
@@ -16,6 +17,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
 from app.services.binance_price_service import BinancePriceService
+from app.services.patrimoine_bulk_recalculation import BulkPatrimoineRecalculationService
 
 
 def main():
@@ -31,10 +33,10 @@ def main():
         try:
             print("📡 Récupération des prix depuis l'API Binance...")
             
-            # Lancer la mise à jour
-            success = BinancePriceService.update_crypto_prices_in_db()
+            # Lancer la mise à jour (snapshot conservé pour le recalcul, sans nouvel appel API)
+            price_snapshot = BinancePriceService.refresh_price_snapshot()
             
-            if success:
+            if price_snapshot:
                 print("✅ Succès ! Prix crypto mis à jour en base de données")
                 
                 # Afficher quelques exemples pour vérification
@@ -50,6 +52,11 @@ def main():
                 supported = BinancePriceService.get_supported_symbols()
                 print(f"\n📈 Total cryptomonnaies supportées : {len(supported)}")
                 
+                # Recalcul de tous les patrimoines avec ces prix (enregistre aussi le snapshot du jour)
+                print("\n🧮 Recalcul des patrimoines...")
+                stats = BulkPatrimoineRecalculationService.recalculate_all(price_snapshot=price_snapshot)
+                print(f"📊 {stats['profiles']} profils recalculés ({stats['errors']} erreurs)")
+                
                 print(f"\n🕐 Mise à jour terminée : {datetime.now().strftime('%H:%M:%S')}")
                 return 0
                 
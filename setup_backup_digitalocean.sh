@@ -155,6 +155,10 @@ if [[ $? -eq 0 ]]; then
         echo "   Décompression..."
         gunzip $TEMP_FILE
         TEMP_FILE="${TEMP_FILE%.gz}"
+    elif [[ $BACKUP_FILE == *.zst ]]; then
+        echo "   Décompression (zstd)..."
+        zstd -d --rm -q $TEMP_FILE
+        TEMP_FILE="${TEMP_FILE%.zst}"
     fi
     
     # Restaurer la base
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test de /plateforme/api/chat/stream contre une API chat-completions locale (serveur SSE de test
+sur OPENAI_API_URL) : les tokens sont relayés un par un, et les erreurs de l'API deviennent
+une réponse JSON ou un événement 'error'.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_as_json(type_, compiler, **kw):
+    return 'JSON'
+
+from app import create_app, db
+from app.models.user import User
+
+TOKENS = ['Bonjour', ' !', ' Le', ' PER', ' est', ' un', ' plan', ' retraite.']
+
+class StubUpstream:
+    """API chat-completions locale : flux SSE token par token, erreur HTTP ou flux corrompu"""
+    
+    def __init__(self):
+        self.mode = 'stream'
+        self.release = threading.Event()  # Le reste du flux n'est envoyé qu'une fois le premier token relayé
+        self.release_timed_out = False
+        self.requests = []
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            # Comme l'API OpenAI : HTTP/1.1 avec Transfer-Encoding: chunked
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                stub.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                if stub.mode == 'http_error':
+                    self.send_response(500)
+                    body = b'{"error": {"message": "upstream down"}}'
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for i, token in enumerate(TOKENS):
+                    self.send_chunk(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n")
+                    if i == 0 and not stub.release.wait(5):
+                        stub.release_timed_out = True
+                    if stub.mode == 'broken_stream' and i == 1:
+                        self.send_chunk('data: {"choices": [\n\n')
+                        break
+                else:
+                    self.send_chunk('data: [DONE]\n\n')
+                self.send_chunk('')
+            
+            def send_chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+                self.wfile.flush()
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def reset(self, mode):
+        self.mode = mode
+        self.release.clear()
+        self.release_timed_out = False
+
+class StubRagService:
+    def get_system_prompt(self):
+        return "Tu es l'assistant Atlas."
+    
+    def get_context_for_query(self, query, max_context_length=1500):
+        return ''
+
+def make_client(upstream):
+    """Client de test connecté en tant que client récent (accès plateforme sans abonnement)"""
+    test_env = {
+        'DATABASE_URL': f"sqlite:///{tempfile.mkdtemp()}/atlas_test.db",
+        'ATLAS_DIRECT_LAUNCH': '1',
+        'OPENAI_API_URL': upstream.url
+    }
+    with mock.patch.dict(os.environ, test_env):
+        app = create_app()
+    app.config['TESTING'] = True
+    
+    with app.app_context():
+        db.create_all()
+        user = User(email='client@test.fr', first_name='Client', last_name='Test', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def parse_events(body):
+    """'event: x\\ndata: {...}\\n\\n' -> [(x, {...})]"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def post_chat(client):
+    return client.post('/plateforme/api/chat/stream', json={'message': "C'est quoi un PER ?"}, buffered=False)
+
+def test_chat_stream():
+    upstream = StubUpstream()
+    client = make_client(upstream)
+    
+    with mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}), \
+         mock.patch('app.services.atlas_rag_service.get_atlas_rag_service', return_value=StubRagService()):
+        
+        print("🧪 Tokens relayés un par un")
+        upstream.reset('stream')
+        response = post_chat(client)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+        assert upstream.requests[-1]['stream'] is True
+        
+        chunks = iter(response.response)
+        first = next(chunks).decode('utf-8')
+        # Le premier token est reçu alors que l'API attend encore pour envoyer la suite
+        assert parse_events(first) == [('delta', {'content': TOKENS[0]})]
+        upstream.release.set()
+        assert not upstream.release_timed_out, "La réponse a attendu la fin du flux de l'API"
+        
+        events = [parse_events(chunk.decode('utf-8'))[0] for chunk in chunks]
+        response.close()
+        assert [data['content'] for event, data in events if event == 'delta'] == TOKENS[1:]
+        assert events[-1][0] == 'done'
+        print(f"✅ {len(TOKENS)} tokens relayés, un événement par token")
+        
+        print("🧪 Erreur HTTP de l'API")
+        upstream.reset('http_error')
+        response = post_chat(client)
+        assert response.status_code == 500
+        assert response.get_json() == {'error': 'Erreur API OpenAI: 500'}
+        print("✅ Erreur renvoyée en JSON")
+        
+        print("🧪 Flux interrompu")
+        upstream.reset('broken_stream')
+        upstream.release.set()
+        response = post_chat(client)
+        assert response.status_code == 200
+        events = parse_events(b''.join(response.response).decode('utf-8'))
+        response.close()
+        assert [event for event, _ in events] == ['delta', 'delta', 'error']
+        assert 'interrompue' in events[-1][1]['error']
+        print("✅ Événement 'error' après les tokens déjà relayés")
+    
+    upstream.server.shutdown()
+
+if __name__ == '__main__':
+    test_chat_stream()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test du moteur d'amortissement vectorisé : mensualités, capital restant dû et tableaux
+d'amortissement identiques au centime aux calculs de CreditCalculationService.
+"""
+
+import os
+import sys
+from datetime import date
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.credit_amortization_engine import CreditAmortizationEngine
+from app.services.credit_calculation import CreditCalculationService
+
+# (capital, taux annuel %, durée en mois, date de début)
+LOANS = [
+    (215000.0, 3.35, 300, date(2024, 10, 1)),  # Prêt immobilier de l'interface
+    (350000.0, 1.2, 240, date(2019, 3, 15)),
+    (15000.0, 5.9, 60, date(2023, 1, 31)),  # Crédit conso, début en fin de mois
+    (50000.0, 12.0, 84, date(2022, 6, 1)),
+    (8000.0, 0.0, 48, date(2024, 2, 1)),  # Taux zéro : amortissement linéaire
+    (1200.0, 4.5, 1, date(2025, 5, 1))
+]
+
+CURRENT_DATES = [date(2019, 1, 1), date(2024, 12, 28), date(2026, 10, 17), date(2060, 1, 1)]
+
+def reference_schedule(principal, annual_rate, duration_months, start_date):
+    """Calcul mois par mois de CreditCalculationService avant le moteur vectorisé"""
+    schedule = []
+    monthly_payment = CreditCalculationService.calculate_monthly_payment(principal, annual_rate, duration_months)
+    monthly_rate = annual_rate / 100 / 12
+    remaining_capital = principal
+    
+    for month in range(1, duration_months + 1):
+        interest_payment = remaining_capital * monthly_rate
+        capital_payment = monthly_payment - interest_payment
+        remaining_capital -= capital_payment
+        
+        if remaining_capital < 0:
+            capital_payment += remaining_capital
+            remaining_capital = 0
+        
+        schedule.append({
+            'month': month,
+            'date': CreditCalculationService._add_months(start_date, month - 1),
+            'monthly_payment': round(monthly_payment, 2),
+            'interest_payment': round(interest_payment, 2),
+            'capital_payment': round(capital_payment, 2),
+            'remaining_capital': round(remaining_capital, 2)
+        })
+        
+        if remaining_capital <= 0:
+            break
+    
+    return schedule
+
+def assert_cents_equal(actual, expected, label):
+    assert abs(actual - expected) < 0.005, f"{label}: {actual} != {expected}"
+
+def test_monthly_payments():
+    """Mensualités de tous les prêts en un calcul"""
+    print("🧪 Mensualités vectorisées")
+    
+    principals, annual_rates, durations, _ = zip(*LOANS)
+    payments = CreditAmortizationEngine.monthly_payments(principals, annual_rates, durations)
+    for loan, payment in zip(LOANS, payments.tolist()):
+        expected = CreditCalculationService.calculate_monthly_payment(*loan[:3])
+        assert_cents_equal(payment, expected, f"Mensualité {loan}")
+    print(f"✅ {len(LOANS)} mensualités identiques")
+
+def test_remaining_capitals():
+    """Capital restant dû avant le début, en cours et après la fin des prêts"""
+    print("🧪 Capital restant dû vectorisé")
+    
+    for current_date in CURRENT_DATES:
+        lookup = CreditAmortizationEngine.remaining_capital_lookup(LOANS, current_date)
+        for loan in LOANS:
+            expected = CreditCalculationService.calculate_remaining_capital(*loan, current_date=current_date)
+            assert_cents_equal(lookup[loan], expected, f"Capital restant {loan} au {current_date}")
+    print(f"✅ Capital restant identique à {len(CURRENT_DATES)} dates")
+
+def test_schedules():
+    """Tableaux d'amortissement complets, échéance par échéance"""
+    print("🧪 Tableaux d'amortissement vectorisés")
+    
+    schedules = CreditAmortizationEngine.schedules(LOANS)
+    for loan, schedule in zip(LOANS, schedules):
+        actual = schedule.to_list()
+        expected = reference_schedule(*loan)
+        assert len(actual) == len(expected), f"{loan}: {len(actual)} échéances au lieu de {len(expected)}"
+        for row, expected_row in zip(actual, expected):
+            assert row['month'] == expected_row['month'] and row['date'] == expected_row['date'], (row, expected_row)
+            for column in ('monthly_payment', 'interest_payment', 'capital_payment', 'remaining_capital'):
+                assert_cents_equal(row[column], expected_row[column], f"{loan} échéance {row['month']} {column}")
+        
+        assert CreditCalculationService.calculate_amortization_schedule(*loan) == actual
+    print(f"✅ {sum(len(schedule) for schedule in schedules)} échéances identiques")
+
+if __name__ == '__main__':
+    test_monthly_payments()
+    test_remaining_capitals()
+    test_schedules()
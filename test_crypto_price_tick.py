@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test du nombre d'appels sortants d'un tick de mise à jour crypto : un seul appel Binance
+et un seul appel de taux de change, quel que soit le nombre de profils recalculés
+(session HTTP simulée, base SQLite temporaire).
+"""
+
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_as_json(type_, compiler, **kw):
+    return 'JSON'
+
+from app import create_app, db
+from app.models.investor_profile import InvestorProfile
+from app.models.user import User
+from app.services.binance_price_service import BinancePriceService
+from app.services.http_client import HttpClient
+
+PROFILE_COUNT = 5
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.status_code = 200
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    """Session HTTP qui répond comme Binance et l'API de taux de change"""
+    
+    def __init__(self):
+        self.urls = []
+    
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if url == BinancePriceService.BINANCE_API_URL:
+            return FakeResponse([
+                {'symbol': 'BTCUSDT', 'price': '60000.0'},
+                {'symbol': 'ETHUSDT', 'price': '3000.0'}
+            ])
+        if url == BinancePriceService.EXCHANGE_RATE_API:
+            return FakeResponse({'rates': {'EUR': 0.9}})
+        raise AssertionError(f"Appel HTTP inattendu: {url}")
+
+def make_app_with_profiles():
+    """App de test avec PROFILE_COUNT clients détenant des cryptos"""
+    # Base SQLite jetable, sans chargement initial des prix au démarrage de l'app
+    test_env = {
+        'DATABASE_URL': f"sqlite:///{tempfile.mkdtemp()}/atlas_test.db",
+        'ATLAS_DIRECT_LAUNCH': '1'
+    }
+    with mock.patch.dict(os.environ, test_env):
+        app = create_app()
+    with app.app_context():
+        db.create_all()
+        for i in range(PROFILE_COUNT):
+            user = User(email=f'client{i}@test.fr', first_name='Client', last_name=str(i), password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            profile = InvestorProfile(
+                user_id=user.id, monthly_net_income=3000, current_savings=0, monthly_savings_capacity=0,
+                risk_tolerance='modere', investment_experience='debutant', investment_goals='epargne',
+                investment_horizon='long', family_situation='celibataire', professional_situation='salarie'
+            )
+            profile.cryptomonnaies_data_json = [
+                {'symbol': 'bitcoin', 'quantity': 0.1 * (i + 1)},
+                {'symbol': 'ethereum', 'quantity': 1}
+            ]
+            db.session.add(profile)
+        db.session.commit()
+    return app
+
+def test_scheduler_tick_makes_one_binance_and_one_fx_call():
+    """Un tick du scheduler recalcule tous les profils avec un seul snapshot de prix"""
+    print(f"🧪 Tick crypto sur {PROFILE_COUNT} profils")
+    
+    from app.scheduler import update_crypto_prices
+    
+    app = make_app_with_profiles()
+    session = FakeSession()
+    BinancePriceService.reset_outbound_calls()
+    
+    with app.app_context(), mock.patch.object(HttpClient, 'session', return_value=session):
+        update_crypto_prices()
+        
+        assert BinancePriceService.outbound_calls == {'binance': 1, 'fx': 1}, BinancePriceService.outbound_calls
+        assert len(session.urls) == 2, session.urls
+        
+        totals = sorted(profile.calculated_total_cryptomonnaies for profile in InvestorProfile.query.all())
+        expected = [0.1 * (i + 1) * 60000 * 0.9 + 3000 * 0.9 for i in range(PROFILE_COUNT)]
+        assert all(abs(total - value) < 0.01 for total, value in zip(totals, expected)), totals
+    
+    print(f"✅ {PROFILE_COUNT} profils recalculés avec {sum(BinancePriceService.outbound_calls.values())} appels sortants")
+
+if __name__ == '__main__':
+    test_scheduler_tick_makes_one_binance_and_one_fx_call()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test du rendu des emails de bienvenue et de réinitialisation du mot de passe
+(templates Jinja de app/templates/emails/, sans envoi).
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.email_templates import EmailTemplateRenderer
+
+def make_user(first_name='Camille'):
+    return SimpleNamespace(first_name=first_name, last_name='Martin', email='camille@test.fr')
+
+def test_bienvenue():
+    """Prénom et lien du profil dans les deux versions, texte sans indentation"""
+    print("🧪 Rendu de l'email de bienvenue")
+    
+    profile_url = 'https://atlas-invest.fr/plateforme/profil-investisseur'
+    html, text = EmailTemplateRenderer.render('bienvenue', user=make_user(), profile_url=profile_url)
+    
+    assert 'Bonjour Camille,' in html
+    assert f'href="{profile_url}"' in html
+    assert html.rstrip().endswith('</html>')
+    
+    lines = text.splitlines()
+    assert lines[0] == 'Bonjour Camille,'
+    assert f'Compléter ton profil investisseur : {profile_url}' in lines
+    assert lines[-1] == "L'équipe Atlas"
+    assert not any(line.startswith((' ', '\t')) for line in lines), "Lignes indentées dans la version texte"
+    print("✅ Email de bienvenue rendu")
+
+def test_reinitialisation_mot_de_passe():
+    """Lien de réinitialisation dans les deux versions (échappé en HTML seulement)"""
+    print("🧪 Rendu de l'email de réinitialisation du mot de passe")
+    
+    reset_url = 'https://atlas-invest.fr/reset?token=abc123&user=42'
+    html, text = EmailTemplateRenderer.render('reinitialisation_mot_de_passe', user=make_user(), reset_url=reset_url)
+    
+    assert 'Bonjour Camille,' in html
+    assert 'href="https://atlas-invest.fr/reset?token=abc123&amp;user=42"' in html
+    assert reset_url not in html
+    
+    lines = text.splitlines()
+    assert lines[0] == 'Bonjour Camille,'
+    assert reset_url in lines
+    assert '- Ce lien expire dans 24 heures' in lines
+    assert not any(line.startswith((' ', '\t')) for line in lines), "Lignes indentées dans la version texte"
+    print("✅ Email de réinitialisation rendu")
+
+def test_user_fields_escaped_in_html_only():
+    """Les champs saisis par l'utilisateur sont échappés en HTML, laissés tels quels en texte"""
+    print("🧪 Échappement des champs utilisateur")
+    
+    user = make_user('<b>Zoé</b> & Co')
+    html, text = EmailTemplateRenderer.render('bienvenue', user=user, profile_url='https://atlas-invest.fr/profil')
+    assert 'Bonjour &lt;b&gt;Zoé&lt;/b&gt; &amp; Co,' in html
+    assert '<b>Zoé</b>' not in html
+    assert text.startswith('Bonjour <b>Zoé</b> & Co,\n')
+    
+    # Rendu groupé identique au rendu unitaire
+    batch = EmailTemplateRenderer.render_batch('bienvenue', [{'user': user}], profile_url='https://atlas-invest.fr/profil')
+    assert batch == [(html, text)]
+    print("✅ Champs utilisateur échappés dans la version HTML")
+
+if __name__ == '__main__':
+    test_bienvenue()
+    test_reinitialisation_mot_de_passe()
+    test_user_fields_escaped_in_html_only()
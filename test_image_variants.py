@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test des miniatures des images de formation uploadées vers DigitalOcean Spaces
+(client S3 simulé : aucun appel réseau).
+"""
+
+import io
+import os
+import sys
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from app.models.apprentissage import Apprentissage
+from app.services.digitalocean_storage import DigitalOceanSpacesService
+from app.services.image_variants import ImageVariantService
+
+def make_spaces_service():
+    """Service Spaces dont le client S3 garde les objets en mémoire"""
+    service = DigitalOceanSpacesService('test-key', 'test-secret', space_name='atlas-test')
+    service.objects = {}
+    
+    def fake_api_call(operation, params):
+        if operation == 'PutObject':
+            body = params['Body']
+            service.objects[params['Key']] = body if isinstance(body, bytes) else body.read()
+            return {'ETag': '"test"'}
+        if operation == 'HeadObject':
+            return {}
+        raise AssertionError(f"Appel S3 inattendu: {operation}")
+    
+    service.client._make_api_call = fake_api_call
+    return service
+
+def make_image_upload(size=(1200, 800)):
+    """Image PNG telle que reçue par le formulaire admin"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (30, 90, 160)).save(buffer, 'PNG')
+    buffer.seek(0)
+    return FileStorage(stream=buffer, filename='formation.png', content_type='image/png')
+
+def test_spaces_upload_fills_image_variants():
+    """Même séquence que apprentissage_create : upload de l'original puis miniatures"""
+    print("🧪 Upload image vers Spaces + miniatures")
+    
+    spaces_service = make_spaces_service()
+    image_file = make_image_upload()
+    
+    result = spaces_service.upload_file(file=image_file, folder_path='apprentissages/images')
+    assert result['success'], result['error']
+    assert not image_file.stream.closed, "Le flux de l'image ne doit pas être fermé par l'upload"
+    
+    image_variants = ImageVariantService.store_in_spaces(image_file, result['key'], spaces_service)
+    apprentissage = Apprentissage(
+        nom='Test',
+        image=result['key'],
+        image_url=result['url'],
+        image_variants=image_variants or None,
+        storage_type='digitalocean'
+    )
+    
+    assert apprentissage.image_variants, "Aucune miniature générée"
+    assert set(apprentissage.image_variants) == {str(size) for size in ImageVariantService.DEFAULT_SIZES}
+    for size, urls in apprentissage.image_variants.items():
+        assert set(urls) == set(ImageVariantService.FORMATS)
+        for fmt, url in urls.items():
+            key = url.split('.digitaloceanspaces.com/', 1)[1]
+            thumbnail = Image.open(io.BytesIO(spaces_service.objects[key]))
+            assert thumbnail.size == (int(size), int(size)), (key, thumbnail.size)
+    
+    assert apprentissage.get_image_variant_url(160) != apprentissage.get_image_url()
+    assert '160w' in apprentissage.get_image_srcset('webp')
+    print(f"✅ {sum(len(urls) for urls in apprentissage.image_variants.values())} miniatures envoyées")
+
+if __name__ == '__main__':
+    test_spaces_upload_fills_image_variants()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test du recalcul patrimonial en masse (base SQLite temporaire) :
+un profil dont le calcul échoue garde ses totaux et est compté en erreur, et l'historique
+n'a qu'une ligne par profil et par jour même quand un autre calcul l'a déjà écrite ;
+des demandes de recalcul simultanées ne lancent qu'un seul job.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_as_json(type_, compiler, **kw):
+    return 'JSON'
+
+from app import create_app, db
+from app.models.investor_profile import InvestorProfile
+from app.models.patrimoine_snapshot import PatrimoineSnapshot
+from app.models.recalculation_job import RecalculationJob
+from app.models.user import User
+from app.services.binance_price_service import PriceSnapshot
+from app.services.patrimoine_bulk_recalculation import BulkPatrimoineRecalculationService
+from app.services.patrimoine_recalculation_jobs import PatrimoineRecalculationJobService
+from app.services.patrimoine_snapshot_service import PatrimoineSnapshotService
+
+def make_app():
+    """App de test sur une base SQLite jetable"""
+    test_env = {
+        'DATABASE_URL': f"sqlite:///{tempfile.mkdtemp()}/atlas_test.db",
+        'ATLAS_DIRECT_LAUNCH': '1'
+    }
+    with mock.patch.dict(os.environ, test_env):
+        app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+def add_profile(index, livret_a, **data):
+    """Client avec un Livret A (et des listes JSON optionnelles)"""
+    user = User(email=f'client{index}@test.fr', first_name='Client', last_name=str(index), password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    profile = InvestorProfile(
+        user_id=user.id, monthly_net_income=3000, current_savings=0, monthly_savings_capacity=0,
+        risk_tolerance='modere', investment_experience='debutant', investment_goals='epargne',
+        investment_horizon='long', family_situation='celibataire', professional_situation='salarie',
+        has_livret_a=True, livret_a_value=livret_a
+    )
+    for attribute, value in data.items():
+        setattr(profile, attribute, value)
+    db.session.add(profile)
+    db.session.flush()
+    return profile.id
+
+def test_failed_profile_keeps_its_totals():
+    """Un montant non numérique n'écrase pas les totaux du profil par des zéros"""
+    print("🧪 Recalcul en masse avec un profil en erreur")
+    
+    app = make_app()
+    with app.app_context():
+        ok_ids = [add_profile(i, 1000.0 * (i + 1)) for i in range(3)]
+        broken_id = add_profile(99, 5000.0, autres_biens_data_json=[{'valeur': 'abc'}])
+        db.session.get(InvestorProfile, broken_id).calculated_patrimoine_total_net = 9999.0
+        db.session.commit()
+        
+        stats = BulkPatrimoineRecalculationService.recalculate_all(chunk_size=2, price_snapshot=PriceSnapshot({}, 0.9))
+        
+        assert stats['profiles'] == 4, stats
+        assert stats['errors'] == 1, stats
+        broken = db.session.get(InvestorProfile, broken_id)
+        assert broken.calculated_patrimoine_total_net == 9999.0, broken.calculated_patrimoine_total_net
+        for i, profile_id in enumerate(ok_ids):
+            profile = db.session.get(InvestorProfile, profile_id)
+            assert profile.calculated_total_liquidites == 1000.0 * (i + 1)
+            assert profile.calculated_patrimoine_total_net == 1000.0 * (i + 1)
+        
+        # Pas de journée à zéro dans l'historique du profil en erreur
+        assert PatrimoineSnapshot.query.filter_by(investor_profile_id=broken_id).count() == 0
+        assert PatrimoineSnapshot.query.count() == len(ok_ids)
+    
+    print("✅ Profil en erreur inchangé et compté dans les erreurs")
+
+def test_snapshot_written_concurrently_is_updated():
+    """Une ligne du jour écrite par un autre processus après la lecture est mise à jour, sans IntegrityError"""
+    print("🧪 Snapshot du jour déjà écrit par un autre calcul")
+    
+    app = make_app()
+    with app.app_context():
+        profile_id = add_profile(1, 1000.0)
+        db.session.commit()
+        
+        # Le calcul à la demande écrit la ligne du jour entre la lecture et l'écriture du recalcul en masse
+        original_upsert = PatrimoineSnapshotService._bulk_upsert_snapshots.__func__
+        def upsert_after_concurrent_write(cls, rows, latest):
+            db.session.add(PatrimoineSnapshot(
+                investor_profile_id=profile_id, snapshot_date=rows[0]['snapshot_date'],
+                totals=PatrimoineSnapshot.pack([1.0] * len(PatrimoineSnapshot.TOTAL_COLUMNS))
+            ))
+            db.session.flush()
+            return original_upsert(cls, rows, latest)
+        
+        with mock.patch.object(PatrimoineSnapshotService, '_bulk_upsert_snapshots', classmethod(upsert_after_concurrent_write)):
+            stats = BulkPatrimoineRecalculationService.recalculate_all(price_snapshot=PriceSnapshot({}, 0.9))
+        
+        assert stats['errors'] == 0, stats
+        snapshots = PatrimoineSnapshot.query.filter_by(investor_profile_id=profile_id).all()
+        assert len(snapshots) == 1
+        assert snapshots[0].to_dict()['calculated_patrimoine_total_net'] == 1000.0
+    
+    print("✅ Une seule ligne du jour, avec les derniers totaux")
+
+def test_concurrent_start_creates_one_job():
+    """Deux clics simultanés sur « recalculer » renvoient le même job"""
+    print("🧪 Démarrages de job simultanés")
+    
+    app = make_app()
+    barrier = threading.Barrier(4)
+    job_ids = []
+    
+    def click():
+        with app.app_context():
+            barrier.wait()
+            job_ids.append(PatrimoineRecalculationJobService.start_job(app).id)
+    
+    # Le recalcul lui-même n'est pas lancé : seul le démarrage est testé
+    with mock.patch.object(PatrimoineRecalculationJobService, '_run_job'):
+        threads = [threading.Thread(target=click) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    assert len(job_ids) == 4 and len(set(job_ids)) == 1, job_ids
+    with app.app_context():
+        assert RecalculationJob.query.count() == 1
+    
+    print("✅ Un seul job créé")
+
+if __name__ == '__main__':
+    test_failed_profile_keeps_its_totals()
+    test_snapshot_written_concurrently_is_updated()
+    test_concurrent_start_creates_one_job()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test du listing paginé DigitalOcean Spaces et de l'index local des objets
+(Space simulé en mémoire à la place du client S3 : aucun appel réseau).
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# Ajouter le path de l'application
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from botocore.exceptions import ClientError
+from app.services.digitalocean_storage import DigitalOceanSpacesService
+from app.services.image_variants import ImageVariantService
+
+def make_spaces_service(**kwargs):
+    """Service Spaces branché sur un Space en mémoire (ListObjectsV2 paginé comme S3 : 1000 clés max par page)"""
+    service = DigitalOceanSpacesService('test-key', 'test-secret', space_name='atlas-test', **kwargs)
+    service.objects = {}
+    service.calls = []
+    
+    def fake_api_call(operation, params):
+        service.calls.append(operation)
+        if operation == 'ListObjectsV2':
+            keys = sorted(key for key in service.objects if key.startswith(params.get('Prefix', '')))
+            start = int(params.get('ContinuationToken', 0))
+            end = start + min(params.get('MaxKeys', 1000), 1000)
+            response = {
+                'Contents': [
+                    {'Key': key, 'Size': len(service.objects[key]), 'ETag': f'"{key}"',
+                     'LastModified': datetime(2026, 1, 1, tzinfo=timezone.utc)}
+                    for key in keys[start:end]
+                ],
+                'IsTruncated': end < len(keys)
+            }
+            if end < len(keys):
+                response['NextContinuationToken'] = str(end)
+            return response
+        if operation == 'PutObject':
+            service.objects[params['Key']] = params['Body']
+            return {'ETag': f'"{params["Key"]}"'}
+        if operation == 'DeleteObject':
+            service.objects.pop(params['Key'], None)
+            return {}
+        if operation == 'HeadObject':
+            if params['Key'] not in service.objects:
+                raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+            return {'ContentLength': len(service.objects[params['Key']]), 'ETag': f'"{params["Key"]}"'}
+        raise AssertionError(f"Appel S3 inattendu: {operation}")
+    
+    service.client._make_api_call = fake_api_call
+    return service
+
+def expire(service, prefix):
+    """Fait comme si le TTL du préfixe était dépassé"""
+    service.index._prefixes[prefix] = time.monotonic() - service.index.ttl_seconds - 1
+
+def test_listing_paginates_past_1000_keys():
+    """Tous les objets sont listés, au-delà de la limite de 1000 clés par requête"""
+    print("🧪 Listing paginé de 2500 objets")
+    
+    spaces_service = make_spaces_service()
+    for i in range(2500):
+        spaces_service.objects[f'backups/db_{i:05d}.sql.gz'] = b'x'
+    spaces_service.objects['apprentissages/autre.pdf'] = b'x'
+    
+    files = spaces_service.list_files('backups', use_index=False)
+    assert len(files) == 2500, len(files)
+    assert spaces_service.calls.count('ListObjectsV2') == 3
+    assert files[-1]['key'] == 'backups/db_02499.sql.gz'
+    
+    assert len(spaces_service.list_files('backups', max_keys=10)) == 10
+    print("✅ 2500 objets listés en 3 pages")
+
+def test_index_record_forget_reconcile():
+    """Uploads et suppressions de l'application, objets modifiés par un autre worker, réconciliation"""
+    print("🧪 Index local : record / forget / reconcile")
+    
+    spaces_service = make_spaces_service(index_prefixes=['apprentissages/'])
+    for i in range(1200):
+        spaces_service.objects[f'apprentissages/pdfs/{i:04d}.pdf'] = b'pdf'
+    
+    # Premier accès : un listing complet du préfixe, puis plus aucun appel réseau
+    assert len(spaces_service.list_files('apprentissages/pdfs')) == 1200
+    assert spaces_service.calls.count('ListObjectsV2') == 2
+    spaces_service.calls.clear()
+    assert spaces_service.file_exists('apprentissages/pdfs/0042.pdf')
+    assert spaces_service.calls == []
+    
+    # Upload et suppression par l'application : l'index est mis à jour directement
+    result = spaces_service.upload_bytes(b'webp', 'apprentissages/images/variants/a-160.webp', 'image/webp')
+    assert result['success'], result['error']
+    assert spaces_service.file_exists(result['key'])
+    assert spaces_service.delete_file('apprentissages/pdfs/0000.pdf')['success']
+    assert spaces_service.calls == ['PutObject', 'DeleteObject']
+    assert len(spaces_service.list_files('apprentissages/pdfs')) == 1199
+    
+    # Objet uploadé par un autre worker : absent de l'index, confirmé par un HEAD puis indexé
+    spaces_service.objects['apprentissages/pdfs/autre-worker.pdf'] = b'pdf'
+    spaces_service.calls.clear()
+    assert spaces_service.file_exists('apprentissages/pdfs/autre-worker.pdf')
+    assert spaces_service.file_exists('apprentissages/pdfs/autre-worker.pdf')
+    assert spaces_service.calls == ['HeadObject']
+    assert not spaces_service.file_exists('apprentissages/pdfs/inexistant.pdf')
+    
+    # Objet supprimé par un autre worker : encore indexé jusqu'à la réconciliation
+    del spaces_service.objects['apprentissages/pdfs/0001.pdf']
+    assert spaces_service.file_exists('apprentissages/pdfs/0001.pdf')
+    expire(spaces_service, 'apprentissages/')
+    spaces_service.calls.clear()
+    assert not spaces_service.file_exists('apprentissages/pdfs/0001.pdf')
+    assert spaces_service.calls.count('ListObjectsV2') == 2
+    assert len(spaces_service.list_files('apprentissages/pdfs')) == 1199
+    
+    # Un upload fait pendant un listing prime sur ce listing
+    def listing_with_concurrent_upload(prefix):
+        objects = list(spaces_service.iter_files(prefix))
+        spaces_service.index.record('apprentissages/pdfs/pendant-listing.pdf', size=3)
+        return objects
+    spaces_service.index._lister = listing_with_concurrent_upload
+    spaces_service.index.reconcile('apprentissages/')
+    assert spaces_service.index.lookup('apprentissages/pdfs/pendant-listing.pdf')['size'] == 3
+    print("✅ Index cohérent avec le Space")
+
+def test_keys_from_custom_endpoint_urls():
+    """Avec un endpoint S3 personnalisé, le nom du Space n'est pas repris dans la clé"""
+    print("🧪 Clés déduites des URL d'un endpoint personnalisé")
+    
+    spaces_service = make_spaces_service(endpoint_url='http://localhost:9000')
+    result = spaces_service.upload_bytes(b'webp', 'apprentissages/images/variants/a-160.webp', 'image/webp')
+    assert result['url'] == 'http://localhost:9000/atlas-test/apprentissages/images/variants/a-160.webp'
+    assert spaces_service.key_from_url(result['url']) == result['key']
+    
+    ImageVariantService.delete({'160': {'webp': result['url']}}, spaces_service=spaces_service)
+    assert result['key'] not in spaces_service.objects
+    
+    default_service = make_spaces_service()
+    url = default_service.get_file_url('apprentissages/pdfs/cours%201.pdf')
+    assert default_service.key_from_url(url) == 'apprentissages/pdfs/cours 1.pdf'
+    print("✅ Clés correctes")
+
+if __name__ == '__main__':
+    test_listing_paginates_past_1000_keys()
+    test_index_record_forget_reconcile()
+    test_keys_from_custom_endpoint_urls()